@@ -2,6 +2,7 @@ import pandas as pd
 import tkinter as tk
 from tkinter import filedialog, messagebox, Listbox, Scrollbar, Button
 import os
+from 样品档案库 import read_table, read_columns, FILE_TYPES
 
 
 def select_file():
@@ -10,7 +11,7 @@ def select_file():
     root.withdraw()
     file_path = filedialog.askopenfilename(
         title="选择Excel文件",
-        filetypes=[("Excel files", "*.xlsx"), ("All files", "*.*")]
+        filetypes=FILE_TYPES
     )
     if not file_path:
         messagebox.showerror("错误", "未选择文件，程序终止。")
@@ -18,9 +19,13 @@ def select_file():
     return file_path
 
 
-def load_data(file_path):
-    """加载Excel文件数据"""
-    data = pd.read_excel(file_path)
+def load_data(file_path, sample_columns=None, compound_column=None):
+    """
+    加载Excel文件数据，也可以是样品档案库（样品档案库.json）。
+    给出样本列和化合物列时只读取这两部分，档案库不载入其余样品。
+    """
+    columns = None if compound_column is None else [compound_column]
+    data = read_table(file_path, samples=sample_columns, columns=columns)
     return data
 
 
@@ -93,15 +98,17 @@ def main():
     # 文件选择与加载
     print("请选择用于转换的Excel文件...")
     file_path = select_file()
-    data = load_data(file_path)
+    # 先只读取列名，选好列后只加载选中的样本列和化合物列
+    columns = read_columns(file_path)
 
     # 选择样本列
     print("\n请选择样本列（多选，代表不同样本浓度列）：")
-    sample_columns = select_columns_gui(data.columns.tolist(), title="选择样本列", select_mode="multiple")
+    sample_columns = select_columns_gui(columns, title="选择样本列", select_mode="multiple")
 
     # 选择化合物列
     print("\n请选择化合物列（单选，代表化合物信息）：")
-    compound_column = select_columns_gui(data.columns.tolist(), title="选择化合物列", select_mode="single")[0]
+    compound_column = select_columns_gui(columns, title="选择化合物列", select_mode="single")[0]
+    data = load_data(file_path, sample_columns, compound_column)
 
     # 数据转换
     transformed_data = transform_data(data, sample_columns, compound_column)
@@ -1,118 +1,151 @@
 import os
+import numpy as np
 import pandas as pd
 import tkinter as tk
 from tkinter import filedialog, messagebox, simpledialog
-from openpyxl.styles import PatternFill
-import string  # 用于生成字母序列
-
-
-def process_file(file_path, output_folder, ri_threshold):
-    """处理单个CSV文件，符合流程图逻辑"""
-    global unprocessed_rows
-    try:
-        # 尝试使用 utf-8 编码读取
-        df = pd.read_csv(file_path, encoding='utf-8')
-    except UnicodeDecodeError:
-        # 如果 utf-8 编码失败，则使用 gbk 编码重新读取
-        df = pd.read_csv(file_path, encoding='gbk')
-
-    # 确保列名中没有多余空格，避免匹配失败
-    df.columns = df.columns.str.strip()
-
-    # 填充“估计的浓度.”中的空值为 0，确保后续计算不会报错
-    if '估计的浓度.' in df.columns:
-        df['估计的浓度.'] = df['估计的浓度.'].fillna(0)
+from 运行报告 import RunReport
+from 异构体规则 import load_rules
+from 保留指数校准 import load_alkane_series
+from 转换核心 import convert_file, prepare_table, read_peak_table
+
+
+def process_file(file_path, output_folder, ri_threshold, report=None, rules=None, alkanes=None):
+    """
+    处理单个CSV文件，符合流程图逻辑，处理过程记录到 report 中。
+    rules 为同分异构体规则表，未传入时读取“异构体规则.json”（不存在则使用默认规则）。
+    alkanes 为正构烷烃标准 (碳数, 保留时间)，传入时先按“组分 RT”重新计算“组分 RI”，再做 RI 差值筛选。
+    转换本身由 转换核心.convert_file 完成，这里只负责记录和提示。
+    :return: (输出文件路径, 诊断信息)；文件被跳过时输出路径为 None
+    """
+    report = RunReport.ensure(report)
+    rules = rules if rules is not None else load_rules()
+    with report.stage("转换", file=os.path.basename(file_path)) as stage:
+        output_path, diagnostics = convert_file(file_path, output_folder, rules, ri_threshold, alkanes, stage=stage)
+    if output_path is None:
+        print(f"文件 {file_path} {diagnostics['skipped']}，跳过处理")
     else:
-        messagebox.showwarning("警告", f"文件 {file_path} 中缺少 '估计的浓度.' 列，跳过处理")
-        return
-
-    # 提取 CAS 编号为 38818-55-2 的数据，并保留不处理
-    if 'CAS 编号' in df.columns:
-        unprocessed_rows = df[df['CAS 编号'].str.strip() == '38818-55-2']
-        # 排除 38818-55-2 后的剩余数据
-        df = df[df['CAS 编号'].str.strip() != '38818-55-2']
-
-        # 如果存在未处理的 38818-55-2 行，则按照要求处理
-        if not unprocessed_rows.empty:
-            # 按“组分 RI”从小到大排序
-            unprocessed_rows = unprocessed_rows.sort_values(by='组分 RI')
-
-            # 生成字母序列 A, B, C, ...
-            letters = list(string.ascii_uppercase)[:len(unprocessed_rows)]
-
-            # 按顺序修改“用户定义的谱库化合物”列的值
-            for idx, letter in enumerate(letters):
-                unprocessed_rows.loc[unprocessed_rows.index[idx], '用户定义的谱库化合物'] = f"巨豆三烯酮{letter}"
-
-    # 计算“组分 RI”和“谱库 RI”的差值，并创建新列“RI 差值”
-    if '组分 RI' in df.columns and '谱库 RI' in df.columns:
-        df['RI 差值'] = abs(df['组分 RI'] - df['谱库 RI'])
-        # 根据用户输入的 RI 差值阈值过滤数据
-        df = df[df['RI 差值'] <= ri_threshold]
-    else:
-        messagebox.showwarning("警告", f"文件 {file_path} 中缺少 '组分 RI' 或 '谱库 RI' 列，跳过处理")
-        return
-
-    # 查找并处理剩余的 "CAS 编号"
-    unique_cas = df['CAS 编号'].unique()
-    result_df = pd.DataFrame()
-    highlight_rows = []  # 用于存储需要高亮的行索引
-
-    for cas in unique_cas:
-        # 显式复制 cas_group，避免 SettingWithCopyWarning
-        cas_group = df[df['CAS 编号'] == cas].copy()
-
-        if len(cas_group) > 1:
-            # 找到差值最小的那一行
-            min_diff_row = cas_group.loc[cas_group['RI 差值'].idxmin()].copy()
-            # 将所有“估计的浓度.”相加后填入
-            min_diff_row['估计的浓度.'] = cas_group['估计的浓度.'].sum()
-            # 标记这行需要高亮
-            highlight_rows.append(len(result_df))
-            # 将处理后的行加入结果
-            result_df = pd.concat([result_df, min_diff_row.to_frame().T], ignore_index=True)
-        else:
-            # 如果没有重复，直接加入结果
-            result_df = pd.concat([result_df, cas_group], ignore_index=True)
-
-    # 将未处理的 38818-55-2 数据追加到结果
-    result_df = pd.concat([result_df, unprocessed_rows], ignore_index=True)
-
-    # 保存结果为 XLSX 文件，保持原文件名，仅更改后缀
-    base_name = os.path.splitext(os.path.basename(file_path))[0]
-    output_path = os.path.join(output_folder, f"转换后_{base_name}.xlsx")
-
-    # 使用 ExcelWriter 保存并高亮特定行
-    with pd.ExcelWriter(output_path, engine='openpyxl') as writer:
-        result_df.to_excel(writer, index=False, sheet_name='结果')
-
-        # 获取 openpyxl 的工作表
-        workbook = writer.book
-        worksheet = writer.sheets['结果']
-
-        # 定义高亮样式（黄色填充）
-        fill = PatternFill(start_color="FFFF00", end_color="FFFF00", fill_type="solid")
-
-        # 遍历需要高亮的行，并高亮“RI 差值”列
-        for row_idx in highlight_rows:
-            excel_row = row_idx + 2  # DataFrame 的行索引对应 Excel 的行，需加 2
-            worksheet.cell(row=excel_row, column=result_df.columns.get_loc('RI 差值') + 1).fill = fill
-
-    print(f"文件 {file_path} 处理完成，结果保存为 {output_path}")
-def process_files(input_folder, output_folder, ri_threshold):
-    """处理输入文件夹中的所有CSV文件"""
+        print(f"文件 {file_path} 处理完成，结果保存为 {output_path}")
+    return output_path, diagnostics
+
+
+def read_and_prepare(file_path, rules, stage, alkanes=None):
+    """
+    读取CSV文件并完成筛选前的准备：填充浓度空值、（可选）校准保留指数、分离同分异构体、计算“RI 差值”。
+    :return: (待筛选的 DataFrame, 同分异构体行)；文件缺少必要的列时返回 None，原因记在 stage["skipped"]
+    """
+    prepared = prepare_table(read_peak_table(file_path), rules, stage, alkanes)
+    if prepared is None:
+        print(f"文件 {file_path} {stage['skipped']}，跳过处理")
+    return prepared
+
+
+def process_files(input_folder, output_folder, ri_threshold, alkane_file=None):
+    """
+    处理输入文件夹中的所有CSV文件。
+    给出 alkane_file（正构烷烃标准的保留时间表）时，所有文件先用同一组烷烃重新校准保留指数。
+    """
     if not os.path.exists(output_folder):
         os.makedirs(output_folder)
 
+    report = RunReport("RI差值筛选转换")
+    rules = load_rules()
+    alkanes = load_alkane_series(alkane_file) if alkane_file else None
+    skipped = []
     for file_name in os.listdir(input_folder):
         if file_name.endswith('.csv'):
             file_path = os.path.join(input_folder, file_name)
-            process_file(file_path, output_folder, ri_threshold)
+            output_path, diagnostics = process_file(file_path, output_folder, ri_threshold, report=report,
+                                                    rules=rules, alkanes=alkanes)
+            if output_path is None:
+                skipped.append(f"{file_name}：{diagnostics['skipped']}")
 
+    report.save(output_folder)
     print("所有文件处理完成。")
+    # 跳过的文件在全部处理完后一起提示，处理过程中不弹窗
+    if skipped:
+        messagebox.showwarning("警告", "以下文件已跳过：\n" + "\n".join(skipped))
     messagebox.showinfo("完成", "所有文件已处理完成！")
 
 
+def sweep_thresholds(df, isomer_rows, thresholds):
+    """
+    对一个文件同时评估多个 RI 差值阈值，结果与逐个阈值运行 转换核心.convert_table 的统计一致。
+    RI 差值和每个 CAS 编号的最小 RI 差值各排序一次，每个阈值的计数都由 searchsorted 得到：
+    保留峰数为 RI 差值 ≤ 阈值的行数；CAS 编号的最小差值 ≤ 阈值时该化合物保留，
+    其余保留的同 CAS 峰被合并；筛选前存在、筛选后没有任何峰的 CAS 编号为剔除的化合物。
+    :param df: read_and_prepare 返回的待筛选 DataFrame
+    :return: 每个阈值一行的 DataFrame
+    """
+    thresholds = np.sort(np.asarray(thresholds, dtype=np.float64))
+    diff = pd.to_numeric(df['RI 差值'], errors='coerce')
+    has_cas = df['CAS 编号'].notna()
+    # NaN 的 RI 差值在任何阈值下都被剔除，排序后位于末尾，searchsorted 不会计入
+    retained = np.searchsorted(np.sort(diff.to_numpy()), thresholds, side='right')
+    retained_with_cas = np.searchsorted(np.sort(diff[has_cas].to_numpy()), thresholds, side='right')
+    cas_min_diff = diff[has_cas].groupby(df.loc[has_cas, 'CAS 编号']).min()
+    kept_compounds = np.searchsorted(np.sort(cas_min_diff.to_numpy()), thresholds, side='right')
+    return pd.DataFrame({
+        'RI 差值阈值': thresholds,
+        '保留峰数': retained,
+        '合并的重复峰数': retained_with_cas - kept_compounds,
+        '剔除的化合物数': len(cas_min_diff) - kept_compounds,
+        '输出行数': kept_compounds + len(isomer_rows),
+    })
+
+
+def sweep_files(input_folder, thresholds, output_folder=None, alkane_file=None):
+    """
+    阈值扫描：每个CSV文件只读取一次，一次评估所有阈值，不写出转换后的文件。
+    结果保存为输出文件夹中的“RI阈值扫描.xlsx”：“汇总”表为每个阈值在所有文件上的合计，“明细”表为每个文件每个阈值一行。
+    :return: (汇总 DataFrame, 明细 DataFrame)
+    """
+    report = RunReport("RI阈值扫描")
+    rules = load_rules()
+    alkanes = load_alkane_series(alkane_file) if alkane_file else None
+    details = []
+    for file_name in sorted(os.listdir(input_folder)):
+        if not file_name.endswith('.csv'):
+            continue
+        file_path = os.path.join(input_folder, file_name)
+        with report.stage("扫描", file=file_name, thresholds=len(thresholds)) as stage:
+            prepared = read_and_prepare(file_path, rules, stage, alkanes)
+            if prepared is None:
+                continue
+            result = sweep_thresholds(*prepared, thresholds)
+            result.insert(0, '文件', file_name)
+            details.append(result)
+
+    if not details:
+        raise ValueError("输入文件夹中没有可处理的CSV文件")
+    detail = pd.concat(details, ignore_index=True)
+    summary = detail.drop(columns='文件').groupby('RI 差值阈值', as_index=False).sum()
+    summary.insert(1, '文件数', len(details))
+
+    output_folder = output_folder or input_folder
+    if not os.path.exists(output_folder):
+        os.makedirs(output_folder)
+    output_path = os.path.join(output_folder, "RI阈值扫描.xlsx")
+    with pd.ExcelWriter(output_path) as writer:
+        summary.to_excel(writer, index=False, sheet_name='汇总')
+        detail.to_excel(writer, index=False, sheet_name='明细')
+    report.save(output_folder)
+    print(f"阈值扫描完成，结果保存为 {output_path}")
+    return summary, detail
+
+
+def parse_thresholds(text):
+    """
+    解析阈值列表：逗号分隔的数值（如 5, 10, 20），或 起始:终止:步长（如 5:50:5，包含终止值）。
+    """
+    text = text.replace('，', ',').replace('：', ':').strip()
+    if ':' in text:
+        start, stop, step = (float(v) for v in text.split(':'))
+        if step <= 0:
+            raise ValueError("步长必须大于 0")
+        return np.arange(start, stop + step / 2, step).round(6).tolist()
+    return [float(v) for v in text.split(',') if v.strip()]
+
+
 # 图形界面的创建
 def create_gui():
     def select_input_folder():
@@ -125,6 +158,11 @@ def create_gui():
         if folder:
             output_folder_var.set(folder)
 
+    def select_alkane_file():
+        file_path = filedialog.askopenfilename(title="选择正构烷烃标准（可选）",
+                                               filetypes=[("CSV 或 Excel", "*.csv *.xlsx"), ("所有文件", "*.*")])
+        alkane_file_var.set(file_path or "")
+
     def run_processing():
         input_folder = input_folder_var.get()
         output_folder = output_folder_var.get()
@@ -143,12 +181,15 @@ def create_gui():
             messagebox.showerror("错误", "请输入有效的数字")
             return
 
-        process_files(input_folder, output_folder, ri_threshold)  # 调用批量处理函数
+        try:
+            process_files(input_folder, output_folder, ri_threshold, alkane_file_var.get() or None)  # 调用批量处理函数
+        except ValueError as e:
+            messagebox.showerror("错误", str(e))
 
     # 创建窗口
     root = tk.Tk()
     root.title("CSV 转换与去重工具")
-    root.geometry("500x300")
+    root.geometry("500x420")
 
     # 输入文件夹选择
     tk.Label(root, text="选择输入文件夹:").pack(pady=10)
@@ -162,8 +203,34 @@ def create_gui():
     tk.Entry(root, textvariable=output_folder_var, width=50).pack(pady=5)
     tk.Button(root, text="选择文件夹", command=select_output_folder).pack(pady=5)
 
+    # 正构烷烃标准（可选），用于重新计算保留指数
+    tk.Label(root, text="正构烷烃标准（可选，碳数 + 保留时间）:").pack(pady=10)
+    alkane_file_var = tk.StringVar()
+    tk.Entry(root, textvariable=alkane_file_var, width=50).pack(pady=5)
+    tk.Button(root, text="选择文件", command=select_alkane_file).pack(pady=5)
+
+    def run_sweep():
+        input_folder = input_folder_var.get()
+        if not os.path.exists(input_folder):
+            messagebox.showerror("错误", "输入文件夹不存在，请重新选择！")
+            return
+        text = simpledialog.askstring("RI 差值阈值扫描", "请输入要比较的阈值，逗号分隔（如 5,10,20）\n或 起始:终止:步长（如 5:50:5）：")
+        if not text:
+            return
+        try:
+            thresholds = parse_thresholds(text)
+            summary, _ = sweep_files(input_folder, thresholds, output_folder_var.get() or None,
+                                     alkane_file_var.get() or None)
+        except ValueError as e:
+            messagebox.showerror("错误", str(e))
+            return
+        messagebox.showinfo("阈值扫描完成", summary.to_string(index=False))
+
     # 运行按钮
-    tk.Button(root, text="开始处理", command=run_processing, bg="green", fg="white").pack(pady=20)
+    buttons = tk.Frame(root)
+    buttons.pack(pady=20)
+    tk.Button(buttons, text="开始处理", command=run_processing, bg="green", fg="white").pack(side="left", padx=10)
+    tk.Button(buttons, text="阈值扫描", command=run_sweep).pack(side="left", padx=10)
 
     root.mainloop()
 
@@ -0,0 +1,52 @@
+import importlib.util
+import os
+import numpy as np
+import pandas as pd
+from 化合物注册表 import CompoundRegistry
+
+OUTPUT_NAME = "化合物合并处理数据_按RI排序_用户定义谱库化合物匹配.xlsx"
+
+
+def load_merge_script():
+    path = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "按中文名合并excel的浓度列.py")
+    spec = importlib.util.spec_from_file_location("按中文名合并", path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def write_samples(folder):
+    """三个样品：化合物部分重叠，名称含空格和大小写差异，其中一行名称和 CAS 编号都为空，一个浓度为空"""
+    rng = np.random.default_rng(4)
+    compounds = [("乙醇", "ethanol", "64-17-5"), ("丙醇", "propanol", "71-23-8"), ("乙酸乙酯", "Ethyl acetate", "141-78-6"),
+                 ("丁醇", "butanol", "71-36-3"), ("己醛", "hexanal", "66-25-1"), ("芳樟醇", "linalool", "78-70-6"),
+                 ("柠檬烯", "limonene", "138-86-3"), ("香叶醇", "geraniol", "106-24-1")]
+    for s, picked in enumerate([[0, 1, 2, 3, 5], [1, 2, 4, 6, 7], [0, 2, 3, 6, 7]]):
+        rows = [compounds[i] for i in picked]
+        names = [cn if s != 1 else f" {cn} " for cn, _, _ in rows] + [None]
+        frame = pd.DataFrame({
+            "CAS 编号": [cas for _, _, cas in rows] + [None],
+            "化合物名称": [en if s != 2 else en.upper() for _, en, _ in rows] + [None],
+            "用户定义的谱库化合物": names,
+            "组分 RI": [900.0 + 37 * i for i in picked] + [1500.0],
+            "谱库 RI": [901.0 + 37 * i for i in picked] + [1501.0],
+            "谱库化合物描述": ["" for _ in picked] + [""],
+            "估计的浓度.": np.r_[rng.random(len(picked)).astype(np.float32), 1.0],
+        })
+        frame.loc[1, "估计的浓度."] = np.nan if s == 0 else frame.loc[1, "估计的浓度."]
+        frame.to_excel(os.path.join(folder, f"样品{s}.xlsx"), index=False)
+
+
+def test_out_of_core_merge_matches_in_memory(tmp_path):
+    # 外存合并（内存上限很小，输出分成多块）与内存中合并的输出文件相同
+    merge = load_merge_script()
+    folders = [tmp_path / "memory", tmp_path / "out_of_core"]
+    for folder in folders:
+        folder.mkdir()
+        write_samples(folder)
+    merge.merge_excel_files_in_folder(str(folders[0]), registry=CompoundRegistry(None), max_workers=1)
+    merge.merge_excel_files_in_folder(str(folders[1]), registry=CompoundRegistry(None), max_workers=1,
+                                      memory_limit_mb=0.001)
+    in_memory, out_of_core = (pd.read_excel(folder / OUTPUT_NAME) for folder in folders)
+    assert len(in_memory) == 8
+    pd.testing.assert_frame_equal(out_of_core, in_memory)
@@ -0,0 +1,41 @@
+import numpy as np
+from 批量对比 import pls_vip, run_contrasts
+from 稀疏矩阵 import SparseFeatureMatrix
+from 数据预处理 import preprocess
+
+
+def make_data(seed=0):
+    """两组各 10 个样品，化合物的浓度量级相差很大，前 3 个化合物在两组间有差异"""
+    rng = np.random.default_rng(seed)
+    X = rng.lognormal(mean=0, sigma=1, size=(20, 30)) * np.logspace(0, 3, 30)
+    y = np.repeat([0.0, 1.0], 10)
+    X[y == 1, :3] *= 3
+    return X, y
+
+
+def vip_for(scaling, X, y):
+    options = {"impute": "zero", "scaling": scaling}
+    return pls_vip(preprocess(X, options), y, 2)[1]
+
+
+def test_scaling_options_change_vip():
+    # PLS 拟合不能再自动标度，否则 Pareto 和仅中心化的结果与自动标度相同
+    X, y = make_data()
+    auto, pareto, none = (vip_for(scaling, X, y) for scaling in ("auto", "pareto", "none"))
+    assert not np.allclose(auto, pareto)
+    assert not np.allclose(auto, none)
+    assert not np.allclose(pareto, none)
+
+
+def test_dense_and_sparse_contrasts_agree():
+    # 稠密矩阵先按整批样品自动标度，稀疏子矩阵也须按整批样品的标准差标度，两条路径的 VIP 相同
+    rng = np.random.default_rng(1)
+    X = rng.lognormal(size=(24, 40)) * (rng.random((24, 40)) < 0.4)
+    samples = [f"S{i}" for i in range(24)]
+    compounds = [f"C{j}" for j in range(40)]
+    groups = {s: f"G{i % 3}" for i, s in enumerate(samples)}
+    dense, _ = run_contrasts(preprocess(X), samples, compounds, groups, 2, max_workers=1)
+    sparse, _ = run_contrasts(SparseFeatureMatrix(X, samples, compounds), samples, compounds, groups, 2,
+                              max_workers=1)
+    assert dense.shape == (40, 3)
+    np.testing.assert_allclose(sparse.to_numpy(), dense.to_numpy(), atol=1e-6)
@@ -0,0 +1,20 @@
+import numpy as np
+from 数据预处理 import impute_knn
+
+
+def test_impute_knn_matches_sklearn():
+    # 与 KNNImputer 相同：没有检出该化合物的近邻时使用检出值的均值；整列缺失时记为 0（KNNImputer 删除该列）
+    from sklearn.impute import KNNImputer
+
+    rng = np.random.default_rng(5)
+    X = rng.lognormal(size=(25, 30))
+    X[rng.random(X.shape) < 0.6] = np.nan
+    X[:, 0] = np.nan
+    X[1:, 1] = np.nan
+    # 第 3 个样品只检出第 3 个化合物，其他样品都没有检出，与任何样品都没有共同检出的化合物
+    X[2] = np.nan
+    X[:, 2] = np.nan
+    X[2, 2] = 1.0
+    result = impute_knn(X, 3)
+    np.testing.assert_allclose(result[:, 1:], KNNImputer(n_neighbors=3).fit_transform(X), rtol=1e-12)
+    assert (result[:, 0] == 0).all()
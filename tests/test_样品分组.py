@@ -0,0 +1,10 @@
+from 样品分组 import load_grouping, save_grouping
+
+
+def test_save_grouping_keeps_other_samples(tmp_path):
+    # 再次保存时只更新本次的样品，文件中其他样品的分组保留
+    path = tmp_path / "样品分组.json"
+    save_grouping({"A-1_浓度": "A", "B-1_浓度": "B"}, path)
+    save_grouping({"B-1_浓度": "C", "D-1_浓度": "D"}, path)
+    saved, _ = load_grouping(path)
+    assert saved == {"A-1_浓度": "A", "B-1_浓度": "C", "D-1_浓度": "D"}
@@ -0,0 +1,60 @@
+import numpy as np
+import pandas as pd
+import pytest
+from 异构体规则 import DEFAULT_RULES, split_isomers
+from 转换核心 import convert_table
+
+
+def peak_table():
+    """含重复 CAS 编号（其中一组 RI 差值相同）、空 CAS 编号、空浓度和巨豆三烯酮同分异构体的峰表"""
+    rng = np.random.default_rng(3)
+    cas = ["64-17-5", "71-23-8", "64-17-5", None, "123-51-3", "71-23-8", "38818-55-2", "64-17-5",
+           "38818-55-2", "110-43-0", "123-51-3", "71-23-8"]
+    n = len(cas)
+    library_ri = rng.integers(900, 1500, n).astype(float)
+    offsets = np.array([3, 15, 1, 2, 4, 15, 5, 8, 2, 30, 4, 6], dtype=float)
+    return pd.DataFrame({
+        "用户定义的谱库化合物": [f"化合物{i}" for i in range(n)],
+        "CAS 编号": cas,
+        "组分 RI": library_ri + offsets,
+        "谱库 RI": library_ri,
+        "估计的浓度.": np.r_[rng.random(n - 1), np.nan],
+    })
+
+
+def old_convert(df, ri_threshold):
+    """重构前两个转换脚本的处理方式：逐个 CAS 编号筛选、拼接"""
+    df = df.copy()
+    if ri_threshold is not None:
+        df['估计的浓度.'] = df['估计的浓度.'].fillna(0)
+    df, isomer_rows = split_isomers(df, DEFAULT_RULES)
+    if ri_threshold is not None:
+        df['RI 差值'] = abs(df['组分 RI'] - df['谱库 RI'])
+        df = df[df['RI 差值'] <= ri_threshold]
+    result_df = pd.DataFrame()
+    highlight_rows = []
+    for cas in df['CAS 编号'].unique():
+        cas_group = df[df['CAS 编号'] == cas].copy()
+        if len(cas_group) > 1:
+            if ri_threshold is None:
+                cas_group['RI 差值'] = abs(cas_group['组分 RI'] - cas_group['谱库 RI'])
+            min_diff_row = cas_group.loc[cas_group['RI 差值'].idxmin()].copy()
+            min_diff_row['估计的浓度.'] = cas_group['估计的浓度.'].sum()
+            highlight_rows.append(len(result_df))
+            result_df = pd.concat([result_df, min_diff_row.to_frame().T], ignore_index=True)
+        else:
+            result_df = pd.concat([result_df, cas_group], ignore_index=True)
+    return pd.concat([result_df, isomer_rows], ignore_index=True), highlight_rows
+
+
+@pytest.mark.parametrize("ri_threshold", [None, 10, 5])
+def test_convert_table_matches_old_conversion(ri_threshold):
+    df = peak_table()
+    original = df.copy()
+    result, highlight, diagnostics = convert_table(df, DEFAULT_RULES, ri_threshold)
+    expected, highlight_rows = old_convert(df, ri_threshold)
+    pd.testing.assert_frame_equal(result, expected.infer_objects(), check_dtype=False)
+    assert np.flatnonzero(highlight).tolist() == highlight_rows
+    assert diagnostics["rows_out"] == len(expected)
+    # convert_table 不修改传入的表格
+    pd.testing.assert_frame_equal(df, original)
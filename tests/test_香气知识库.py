@@ -0,0 +1,15 @@
+from 香气知识库 import AromaKnowledgeBase, FAILED
+
+
+def test_lookup_treats_missing_descriptors_as_miss():
+    # 缺少香气描述的记录不算命中，检索脚本才会联网补全
+    kb = AromaKnowledgeBase(":memory:")
+    kb.add_records([{"CAS 编号": "64-17-5", "化合物名称 (英文)": "ethanol", "香气描述 (英文)": "alcoholic"},
+                    {"CAS 编号": "71-23-8", "化合物名称 (英文)": "propanol", "香气描述 (中文)": "酒香",
+                     "香气描述 (英文)": "alcoholic"}])
+    assert kb.lookup("64-17-5") is None
+    assert kb.lookup("64-17-5", complete=False)["香气描述 (中文)"] == FAILED
+    assert kb.lookup("71-23-8")["香气描述 (中文)"] == "酒香"
+
+    kb.add_records([{"CAS 编号": "64-17-5", "香气描述 (中文)": "酒香", "香气描述 (英文)": FAILED}])
+    assert kb.lookup("64-17-5")["香气描述 (英文)"] == "alcoholic"
@@ -0,0 +1,28 @@
+from 香气轮廓 import incidence_matrix
+
+
+def categories_of(description):
+    matrix, names = incidence_matrix([description])
+    return {names[j] for j in matrix.indices}
+
+
+def test_prefix_matching():
+    assert categories_of("smoky, nutty") == {"烟熏", "坚果烘烤"}
+    assert categories_of("pineapple") == {"果香"}
+
+
+def test_excluded_words_do_not_match_prefix():
+    # nut 不能按前缀匹配 nutmeg，nutmeg 只属于辛香
+    assert categories_of("nutmeg") == {"辛香"}
+    assert categories_of("warm nutmeg") == {"辛香"}
+    assert categories_of("mustard") == set()
+
+
+def test_compound_words_and_inflections():
+    # 复合词和词形变化：各种浆果、cheesy、rosy 也归入对应的类别
+    assert categories_of("raspberry, sweet") == {"果香", "甜香"}
+    for fruit in ("strawberry", "blackberry", "blueberries", "berries", "cherries"):
+        assert categories_of(fruit) == {"果香"}, fruit
+    assert categories_of("cheesy") == {"酸味"}
+    assert categories_of("rosy") == {"花香"}
+    assert categories_of("vanillin") == {"甜香"}
@@ -0,0 +1,375 @@
+import os
+import re
+import sys
+import json
+import time
+import shutil
+import hashlib
+import argparse
+import threading
+import importlib.util
+import urllib.error
+import urllib.request
+from datetime import datetime
+from concurrent.futures import ProcessPoolExecutor
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from 异构体规则 import DEFAULT_RULES_PATH
+from 化合物注册表 import CompoundRegistry, DEFAULT_REGISTRY_PATH
+
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_JOB_FOLDER = os.path.join(SCRIPT_DIR, "任务结果")
+DEFAULT_PORT = 8765
+RESULT_NAME = "result.json"
+
+
+# ---------- 在工作进程中运行的处理阶段 ----------
+
+_scripts = {}
+
+
+def load_script(file_name):
+    """按文件路径加载脚本模块（脚本文件名含空格，无法直接 import），每个工作进程只加载一次"""
+    if file_name not in _scripts:
+        path = os.path.join(SCRIPT_DIR, file_name)
+        spec = importlib.util.spec_from_file_location(os.path.splitext(file_name)[0].replace(" ", "_"), path)
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+        _scripts[file_name] = module
+    return _scripts[file_name]
+
+
+def input_files(folder, extension):
+    """文件夹中参与处理的文件（按文件名排序，排除 Excel 的 ~$ 临时文件）"""
+    return sorted(os.path.join(folder, f) for f in os.listdir(folder)
+                  if f.endswith(extension) and not f.startswith("~$"))
+
+
+def run_convert(input_folder, output_folder, params):
+    from 运行报告 import RunReport
+    from 异构体规则 import load_rules
+    from 转换核心 import convert_file
+
+    report = RunReport("csv转换")
+    rules = load_rules()
+    for file_path in input_files(input_folder, ".csv"):
+        with report.stage("转换", file=os.path.basename(file_path)) as stage:
+            convert_file(file_path, output_folder, rules, stage=stage)
+    report.save(output_folder)
+
+
+def run_convert_ri(input_folder, output_folder, params):
+    from 运行报告 import RunReport
+    from 异构体规则 import load_rules
+    from 保留指数校准 import load_alkane_series
+    from 转换核心 import convert_file
+
+    report = RunReport("RI差值筛选转换")
+    rules = load_rules()
+    alkanes = load_alkane_series(params["alkane_file"]) if params.get("alkane_file") else None
+    for file_path in input_files(input_folder, ".csv"):
+        with report.stage("转换", file=os.path.basename(file_path)) as stage:
+            convert_file(file_path, output_folder, rules, float(params.get("ri_threshold", 10)), alkanes, stage=stage)
+    report.save(output_folder)
+
+
+def _copy_workbooks(input_folder, output_folder):
+    # 合并脚本把结果写回所在文件夹，先把输入复制到任务文件夹，不改动用户的文件夹
+    for file_path in input_files(input_folder, ".xlsx"):
+        shutil.copy2(file_path, output_folder)
+
+
+def run_merge_cas(input_folder, output_folder, params):
+    _copy_workbooks(input_folder, output_folder)
+    # 工作进程数已由任务服务器限制，合并时不再另开进程池
+    load_script("按CAS编号合并excel中的浓度列.py").merge_excel_files_in_folder(output_folder, max_workers=1)
+
+
+def run_merge_name(input_folder, output_folder, params):
+    _copy_workbooks(input_folder, output_folder)
+    # 以共享的化合物注册表为起点，新登记的化合物只写入任务文件夹中的副本，不改动共享的注册表
+    registry_path = os.path.join(output_folder, os.path.basename(DEFAULT_REGISTRY_PATH))
+    if os.path.exists(DEFAULT_REGISTRY_PATH):
+        shutil.copy2(DEFAULT_REGISTRY_PATH, registry_path)
+    load_script("按中文名合并excel的浓度列.py").merge_excel_files_in_folder(
+        output_folder, registry=CompoundRegistry(registry_path), max_workers=1)
+
+
+# 任务类型，值为 (处理函数, 名称, 输入文件扩展名, 会影响结果的其他文件)
+JOB_TYPES = {
+    "convert": (run_convert, "CSV 转换为 Excel", ".csv", []),
+    "convert_ri": (run_convert_ri, "CSV 转换（RI 差值筛选）", ".csv", []),
+    "merge_cas": (run_merge_cas, "按 CAS 编号合并浓度列", ".xlsx", []),
+    "merge_name": (run_merge_name, "按中文名合并浓度列", ".xlsx", [DEFAULT_REGISTRY_PATH]),
+}
+
+
+def run_job(job_type, input_folder, output_folder, params):
+    """
+    在工作进程中运行一个任务，输出写入 output_folder。
+    完成后写入 result.json（先写临时文件再改名），之后相同输入的任务直接使用这份结果。
+    """
+    start = time.perf_counter()
+    if os.path.exists(output_folder):
+        shutil.rmtree(output_folder)
+    os.makedirs(output_folder)
+    JOB_TYPES[job_type][0](input_folder, output_folder, params)
+    result = {
+        "type": job_type,
+        "input": input_folder,
+        "params": params,
+        "output_folder": output_folder,
+        "files": sorted(f for f in os.listdir(output_folder) if f != RESULT_NAME),
+        "seconds": round(time.perf_counter() - start, 3),
+        "finished": datetime.now().isoformat(timespec="seconds"),
+    }
+    temp_path = os.path.join(output_folder, RESULT_NAME + ".tmp")
+    with open(temp_path, "w", encoding="utf-8") as f:
+        json.dump(result, f, ensure_ascii=False, indent=1)
+    os.replace(temp_path, os.path.join(output_folder, RESULT_NAME))
+    return result
+
+
+# ---------- 任务队列 ----------
+
+def input_hash(job_type, input_folder, params):
+    """
+    任务的缓存键：任务类型、参数、输入文件（文件名和内容）以及会影响结果的规则表、烷烃标准和化合物注册表的 SHA-1。
+    不同分析人员提交同一批数据时得到相同的键，只处理一次。
+    """
+    digest = hashlib.sha1(json.dumps([job_type, params], sort_keys=True, ensure_ascii=False).encode())
+    files = input_files(input_folder, JOB_TYPES[job_type][2])
+    extra = [p for p in (DEFAULT_RULES_PATH, params.get("alkane_file"), *JOB_TYPES[job_type][3])
+             if p and os.path.exists(p)]
+    for path in files + extra:
+        digest.update(os.path.basename(path).encode())
+        with open(path, "rb") as f:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                digest.update(block)
+    return digest.hexdigest()[:16]
+
+
+class JobQueue:
+    """
+    有界的任务队列：任务在进程池（最多 workers 个进程）中运行，排队和运行中的任务最多 max_pending 个。
+    任务编号即输入的哈希，相同输入的任务不会重复运行：排队或运行中时返回同一任务，
+    已完成时直接返回 job_folder/<编号>/result.json 中的结果（服务器重启后仍然有效）。
+    """
+
+    def __init__(self, job_folder=DEFAULT_JOB_FOLDER, workers=2, max_pending=100):
+        self.job_folder = job_folder
+        self.max_pending = max_pending
+        self.pool = ProcessPoolExecutor(max_workers=workers)
+        self.workers = workers
+        self.jobs = {}
+        self.lock = threading.Lock()
+
+    def pending(self):
+        return sum(1 for job in self.jobs.values() if not job["future"].done())
+
+    def submit(self, job_type, input_folder, params=None):
+        """
+        提交任务。
+        :return: (任务状态字典, 是否直接使用了已有的任务或结果)
+        """
+        params = params or {}
+        if job_type not in JOB_TYPES:
+            raise ValueError(f"未知的任务类型 {job_type!r}，可选 {', '.join(JOB_TYPES)}")
+        if not os.path.isdir(input_folder):
+            raise ValueError(f"输入文件夹不存在：{input_folder}")
+        job_id = input_hash(job_type, input_folder, params)
+        output_folder = os.path.join(self.job_folder, job_id)
+        with self.lock:
+            job = self.jobs.get(job_id)
+            if job is not None and not (job["future"].done() and job["future"].exception()):
+                return self.status(job_id), True
+            if os.path.exists(os.path.join(output_folder, RESULT_NAME)):
+                return self._cached_status(job_id), True
+            if self.pending() >= self.max_pending:
+                raise OverflowError(f"任务队列已满（{self.max_pending} 个），请稍后再提交")
+            self.jobs[job_id] = {
+                "type": job_type,
+                "input": input_folder,
+                "submitted": datetime.now().isoformat(timespec="seconds"),
+                "future": self.pool.submit(run_job, job_type, input_folder, output_folder, params),
+            }
+            return self.status(job_id), False
+
+    def _cached_status(self, job_id):
+        with open(os.path.join(self.job_folder, job_id, RESULT_NAME), encoding="utf-8") as f:
+            result = json.load(f)
+        return {"id": job_id, "type": result["type"], "input": result["input"], "status": "done", "result": result}
+
+    def status(self, job_id):
+        """任务状态：queued（排队）、running（运行中）、done（完成，含结果）或 failed（失败，含错误信息）"""
+        job = self.jobs.get(job_id)
+        if job is None:
+            # 任务编号为 16 位十六进制数，其他字符串不能用来拼接文件路径
+            if not re.fullmatch(r"[0-9a-f]{16}", job_id):
+                return None
+            if os.path.exists(os.path.join(self.job_folder, job_id, RESULT_NAME)):
+                return self._cached_status(job_id)
+            return None
+        future = job["future"]
+        state = {"id": job_id, "type": job["type"], "input": job["input"], "submitted": job["submitted"]}
+        if future.done():
+            error = future.exception()
+            if error is None:
+                state.update(status="done", result=future.result())
+            else:
+                state.update(status="failed", error=f"{type(error).__name__}: {error}")
+        else:
+            state["status"] = "running" if future.running() else "queued"
+        return state
+
+    def summary(self):
+        with self.lock:
+            states = [self.status(job_id) for job_id in self.jobs]
+        return {
+            "job_types": {key: value[1] for key, value in JOB_TYPES.items()},
+            "workers": self.workers,
+            "counts": {s: sum(1 for state in states if state["status"] == s)
+                       for s in ("queued", "running", "done", "failed")},
+            "jobs": states,
+        }
+
+    def shutdown(self):
+        self.pool.shutdown(cancel_futures=True)
+
+
+# ---------- HTTP/JSON 接口 ----------
+
+class JobHandler(BaseHTTPRequestHandler):
+    """
+    POST /jobs        提交任务，JSON 为 {"type": "merge_cas", "input": "输入文件夹", "params": {...}}
+    GET  /jobs/<编号>  查询任务状态
+    GET  /jobs        全部任务及各状态的数量
+    """
+    queue = None
+
+    def _send(self, code, body):
+        data = json.dumps(body, ensure_ascii=False).encode("utf-8")
+        self.send_response(code)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        path = self.path.rstrip("/")
+        if path in ("", "/jobs"):
+            self._send(200, self.queue.summary())
+        elif path.startswith("/jobs/"):
+            state = self.queue.status(path[len("/jobs/"):])
+            if state is None:
+                self._send(404, {"error": "没有这个任务"})
+            else:
+                self._send(200, state)
+        else:
+            self._send(404, {"error": "未知的地址"})
+
+    def do_POST(self):
+        if self.path.rstrip("/") != "/jobs":
+            self._send(404, {"error": "未知的地址"})
+            return
+        try:
+            length = int(self.headers.get("Content-Length", 0))
+            request = json.loads(self.rfile.read(length).decode("utf-8"))
+            state, cached = self.queue.submit(request.get("type"), request.get("input", ""), request.get("params"))
+        except OverflowError as e:
+            self._send(503, {"error": str(e)})
+        except (ValueError, TypeError, AttributeError) as e:
+            self._send(400, {"error": str(e)})
+        else:
+            self._send(200 if cached else 202, dict(state, cached=cached))
+
+    def log_message(self, format, *args):
+        print(f"[{datetime.now():%H:%M:%S}] {self.address_string()} {format % args}")
+
+
+def serve(host="127.0.0.1", port=DEFAULT_PORT, job_folder=DEFAULT_JOB_FOLDER, workers=2, max_pending=100):
+    """启动任务服务器，默认只接受本机连接；--host 0.0.0.0 时实验室其他电脑也可以提交任务"""
+    queue = JobQueue(job_folder, workers=workers, max_pending=max_pending)
+    handler = type("Handler", (JobHandler,), {"queue": queue})
+    server = ThreadingHTTPServer((host, port), handler)
+    print(f"任务服务器已启动：http://{host}:{server.server_port}/jobs（{workers} 个工作进程，结果保存在 {job_folder}）")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        queue.shutdown()
+
+
+# ---------- 客户端 ----------
+
+def _request(url, body=None):
+    data = json.dumps(body, ensure_ascii=False).encode("utf-8") if body is not None else None
+    request = urllib.request.Request(url, data=data, headers={"Content-Type": "application/json"})
+    try:
+        with urllib.request.urlopen(request) as response:
+            return json.loads(response.read().decode("utf-8"))
+    except urllib.error.HTTPError as e:
+        raise RuntimeError(json.loads(e.read().decode("utf-8")).get("error", str(e))) from None
+
+
+def submit_job(server, job_type, input_folder, params=None):
+    """向任务服务器提交任务，返回任务状态（含任务编号 id）"""
+    return _request(f"{server.rstrip('/')}/jobs",
+                    {"type": job_type, "input": os.path.abspath(input_folder), "params": params or {}})
+
+
+def wait_for_job(server, job_id, interval=1.0, timeout=None):
+    """轮询任务状态直到完成或失败"""
+    start = time.monotonic()
+    while True:
+        state = _request(f"{server.rstrip('/')}/jobs/{job_id}")
+        if state["status"] in ("done", "failed"):
+            return state
+        if timeout is not None and time.monotonic() - start > timeout:
+            raise TimeoutError(f"任务 {job_id} 在 {timeout} 秒内没有完成")
+        time.sleep(interval)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="本地任务服务器：多人共用一台工作站处理转换和合并，相同输入只处理一次")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    serve_parser = subparsers.add_parser("serve", help="启动任务服务器")
+    serve_parser.add_argument("--host", default="127.0.0.1", help="监听地址，默认只接受本机连接")
+    serve_parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    serve_parser.add_argument("--workers", type=int, default=max(1, (os.cpu_count() or 2) // 2), help="工作进程数")
+    serve_parser.add_argument("--max-pending", type=int, default=100, help="排队和运行中的任务数上限")
+    serve_parser.add_argument("--folder", default=DEFAULT_JOB_FOLDER, help="任务结果文件夹")
+    submit_parser = subparsers.add_parser("submit", help="提交任务")
+    submit_parser.add_argument("type", choices=list(JOB_TYPES))
+    submit_parser.add_argument("input", help="输入文件夹（服务器能访问的路径）")
+    submit_parser.add_argument("--ri-threshold", type=float, default=None, help="convert_ri 的 RI 差值阈值")
+    submit_parser.add_argument("--alkane-file", default=None, help="convert_ri 的正构烷烃标准文件")
+    submit_parser.add_argument("--server", default=f"http://127.0.0.1:{DEFAULT_PORT}")
+    submit_parser.add_argument("--wait", action="store_true", help="等待任务完成")
+    status_parser = subparsers.add_parser("status", help="查询任务状态")
+    status_parser.add_argument("id", nargs="?", help="任务编号，不指定时列出全部任务")
+    status_parser.add_argument("--server", default=f"http://127.0.0.1:{DEFAULT_PORT}")
+    args = parser.parse_args()
+
+    if args.command == "serve":
+        serve(args.host, args.port, args.folder, args.workers, args.max_pending)
+    elif args.command == "submit":
+        job_params = {}
+        if args.ri_threshold is not None:
+            job_params["ri_threshold"] = args.ri_threshold
+        if args.alkane_file:
+            job_params["alkane_file"] = os.path.abspath(args.alkane_file)
+        job = submit_job(args.server, args.type, args.input, job_params)
+        print(f"任务 {job['id']}：{job['status']}{'（使用已有的结果）' if job['cached'] else ''}")
+        if args.wait:
+            job = wait_for_job(args.server, job["id"])
+        if job["status"] == "done":
+            print(f"结果保存在 {job['result']['output_folder']}")
+        elif job["status"] == "failed":
+            print(f"任务失败：{job['error']}")
+            sys.exit(1)
+    else:
+        url = f"{args.server.rstrip('/')}/jobs" + (f"/{args.id}" if args.id else "")
+        print(json.dumps(_request(url), ensure_ascii=False, indent=1))
@@ -0,0 +1,63 @@
+import os
+import numpy as np
+import pandas as pd
+
+
+def load_alkane_series(path):
+    """
+    读取正构烷烃标准品的保留时间表（CSV 或 Excel），包含“碳数”和“保留时间”两列，
+    没有这两个列名时取前两列。保留时间单位需与 MassHunter 导出的“组分 RT”一致（分钟）。
+    :return: (碳数数组, 保留时间数组)，按保留时间从小到大排列
+    """
+    if os.path.splitext(path)[1].lower() in (".xlsx", ".xls"):
+        table = pd.read_excel(path)
+    else:
+        try:
+            table = pd.read_csv(path, encoding="utf-8-sig")
+        except UnicodeDecodeError:
+            table = pd.read_csv(path, encoding="gbk")
+    table.columns = table.columns.astype(str).str.strip()
+    carbon_column = "碳数" if "碳数" in table.columns else table.columns[0]
+    rt_column = "保留时间" if "保留时间" in table.columns else table.columns[1]
+
+    # 碳数可以写成 7 或 C7
+    carbons = pd.to_numeric(table[carbon_column].astype(str).str.upper().str.lstrip("C"), errors="coerce")
+    rts = pd.to_numeric(table[rt_column], errors="coerce")
+    valid = carbons.notna() & rts.notna()
+    series = pd.DataFrame({"carbon": carbons[valid], "rt": rts[valid]}).sort_values("rt")
+    if len(series) < 2:
+        raise ValueError(f"正构烷烃标准 {path} 中至少需要两个有效的碳数和保留时间")
+    if not (np.diff(series["carbon"].to_numpy()) > 0).all():
+        raise ValueError(f"正构烷烃标准 {path} 中碳数应随保留时间递增")
+    return series["carbon"].to_numpy(dtype=np.float64), series["rt"].to_numpy(dtype=np.float64)
+
+
+def retention_index(rt, carbons, alkane_rts):
+    """
+    按 van den Dool–Kratz 公式（程序升温线性保留指数）计算保留指数：
+    RI = 100 × [n + (N - n) × (t - t_n) / (t_N - t_n)]，t_n ≤ t < t_N 为相邻两个正构烷烃。
+    整列保留时间用一次 searchsorted 找到所在区间，超出烷烃范围的峰返回 NaN。
+    """
+    rt = np.asarray(rt, dtype=np.float64)
+    # 找到每个峰左侧最近的正构烷烃，最后一个烷烃本身归入最后一个区间
+    left = np.clip(np.searchsorted(alkane_rts, rt, side="right") - 1, 0, len(alkane_rts) - 2)
+    t_n, t_next = alkane_rts[left], alkane_rts[left + 1]
+    n, n_next = carbons[left], carbons[left + 1]
+    ri = 100 * (n + (n_next - n) * (rt - t_n) / (t_next - t_n))
+    in_range = (rt >= alkane_rts[0]) & (rt <= alkane_rts[-1])
+    return np.where(in_range, ri, np.nan)
+
+
+def recalibrate(df, carbons, alkane_rts, rt_column="组分 RT", ri_column="组分 RI"):
+    """
+    用正构烷烃标准重新计算 df 中每个峰的“组分 RI”，原值保存在“原始组分 RI”列。
+    超出烷烃保留时间范围的峰无法校准，保留原值。
+    :return: (新的 DataFrame, 超出范围的峰数)
+    """
+    df = df.copy()
+    original = pd.to_numeric(df[ri_column], errors="coerce") if ri_column in df.columns else np.nan
+    calibrated = retention_index(pd.to_numeric(df[rt_column], errors="coerce"), carbons, alkane_rts)
+    out_of_range = np.isnan(calibrated)
+    df["原始组分 RI"] = original
+    df[ri_column] = np.where(out_of_range, original, np.round(calibrated, 1))
+    return df, int(out_of_range.sum())
@@ -0,0 +1,88 @@
+import numpy as np
+from multiprocessing import shared_memory
+from 稀疏矩阵 import SparseFeatureMatrix
+
+
+class SharedArrays:
+    """
+    把一组 numpy 数组复制到共享内存中（只复制一次），工作进程用 handle 连接后得到不复制的只读视图。
+    handle 只含共享内存块的名称、形状和数据类型，传给工作进程的数据量与数组大小无关：
+        with SharedArrays({"X": X}) as shared:
+            ProcessPoolExecutor(initializer=..., initargs=(shared.handle,))
+    退出 with 时释放共享内存，此后工作进程中的视图不可再用。
+    """
+
+    def __init__(self, arrays):
+        self.blocks = []
+        self.handle = {}
+        try:
+            for name, array in arrays.items():
+                array = np.ascontiguousarray(array)
+                if array.dtype.hasobject:
+                    raise ValueError(f"数组 {name} 含 Python 对象，无法放入共享内存")
+                # 大小为 0 的共享内存块无法创建，空数组也至少占 1 字节
+                block = shared_memory.SharedMemory(create=True, size=max(1, array.nbytes))
+                self.blocks.append(block)
+                np.ndarray(array.shape, dtype=array.dtype, buffer=block.buf)[...] = array
+                self.handle[name] = (block.name, array.shape, array.dtype.str)
+        except Exception:
+            self.close()
+            raise
+
+    def close(self):
+        """释放全部共享内存块"""
+        for block in self.blocks:
+            block.close()
+            block.unlink()
+        self.blocks = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def attach(handle):
+    """
+    在工作进程中按 handle 连接共享内存。
+    :return: (共享内存块列表, {名称: 只读数组视图})；视图使用期间须保持对共享内存块的引用
+    """
+    blocks, arrays = [], {}
+    for name, (block_name, shape, dtype) in handle.items():
+        block = shared_memory.SharedMemory(name=block_name)
+        blocks.append(block)
+        view = np.ndarray(shape, dtype=np.dtype(dtype), buffer=block.buf)
+        view.flags.writeable = False
+        arrays[name] = view
+    return blocks, arrays
+
+
+def publish_matrix(matrix, **arrays):
+    """
+    把预处理后的样品×化合物矩阵放入共享内存：稠密矩阵直接共享，SparseFeatureMatrix 共享 CSR 的三个数组。
+    arrays 为一并共享的其他数组（如各任务的行号和分组标签）。
+    :return: (SharedArrays, 连接所需的其余信息)；两者一起传给 attach_matrix
+    """
+    if isinstance(matrix, SparseFeatureMatrix):
+        csr = matrix.matrix
+        shared = SharedArrays(dict(arrays, _data=csr.data, _indices=csr.indices, _indptr=csr.indptr))
+        return shared, {"shape": csr.shape, "samples": matrix.samples, "features": matrix.features}
+    return SharedArrays(dict(arrays, _X=np.asarray(matrix, dtype=np.float64))), None
+
+
+def attach_matrix(handle, meta):
+    """
+    在工作进程中连接 publish_matrix 发布的矩阵。两种矩阵都直接使用共享内存中的数据，不复制。
+    :return: (共享内存块列表, 稠密数组或 SparseFeatureMatrix, {名称: 一并共享的其他数组})
+    """
+    from scipy import sparse
+
+    blocks, arrays = attach(handle)
+    if meta is None:
+        matrix = arrays.pop("_X")
+    else:
+        csr = sparse.csr_matrix((arrays.pop("_data"), arrays.pop("_indices"), arrays.pop("_indptr")),
+                                shape=meta["shape"], copy=False)
+        matrix = SparseFeatureMatrix(csr, meta["samples"], meta["features"])
+    return blocks, matrix, arrays
@@ -0,0 +1,161 @@
+import os
+import re
+import json
+import unicodedata
+import pandas as pd
+from 异构体规则 import load_rules, labeled_cas
+
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_REGISTRY_PATH = os.path.join(SCRIPT_DIR, "化合物注册表.json")
+
+CAS_PATTERN = re.compile(r"^(\d{2,7})-(\d{2})-(\d)$")
+
+
+def normalize_name(name):
+    """
+    规范化化合物名称：全角转半角（NFKC）、去掉首尾空格、合并连续空白、英文统一小写。
+    空值返回空字符串。
+    """
+    if name is None or (isinstance(name, float) and name != name):
+        return ""
+    text = unicodedata.normalize("NFKC", str(name))
+    text = re.sub(r"\s+", " ", text).strip()
+    return text.casefold()
+
+
+def normalize_cas(cas):
+    """
+    规范化 CAS 编号：全角转半角、去掉空白、去掉第一段的前导 0。
+    不符合 CAS 编号格式的返回空字符串。
+    """
+    if cas is None or (isinstance(cas, float) and cas != cas):
+        return ""
+    text = re.sub(r"\s+", "", unicodedata.normalize("NFKC", str(cas)))
+    match = CAS_PATTERN.match(text)
+    if not match:
+        return ""
+    return f"{int(match.group(1))}-{match.group(2)}-{match.group(3)}"
+
+
+class CompoundRegistry:
+    """
+    化合物注册表：把规范化后的中文名、英文名和 CAS 编号映射到同一个化合物 ID。
+    三个哈希索引分别对应三种名称，查询均为 O(1)。注册表保存为 JSON，多次运行共用。
+    """
+
+    def __init__(self, path=DEFAULT_REGISTRY_PATH, shared_cas=None):
+        self.path = path
+        # 同一 CAS 编号对应多个需要分开统计的化合物（同分异构体），不能按 CAS 编号归并，默认取自异构体规则表
+        shared_cas = shared_cas if shared_cas is not None else labeled_cas(load_rules())
+        self.shared_cas = {normalize_cas(cas) for cas in shared_cas}
+        self.compounds = {}
+        self.by_name_cn = {}
+        self.by_name_en = {}
+        self.by_cas = {}
+        self._next_id = 1
+        if path and os.path.exists(path):
+            self.load(path)
+
+    def __len__(self):
+        return len(self.compounds)
+
+    def load(self, path):
+        """从 JSON 文件加载注册表并重建索引"""
+        with open(path, encoding="utf-8") as f:
+            records = json.load(f)
+        for record in records:
+            self.compounds[record["id"]] = record
+            for name in record.get("names_cn", []):
+                self.by_name_cn[normalize_name(name)] = record["id"]
+            for name in record.get("names_en", []):
+                self.by_name_en[normalize_name(name)] = record["id"]
+            for cas in record.get("cas", []):
+                self._index_cas(normalize_cas(cas), record["id"])
+            self._next_id = max(self._next_id, int(record["id"][1:]) + 1)
+
+    def save(self, path=None):
+        """把注册表保存为 JSON 文件，path 为 None 时（仅在内存中使用的注册表）不保存"""
+        path = path or self.path
+        if not path:
+            return
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(list(self.compounds.values()), f, ensure_ascii=False, indent=1)
+
+    def _index_cas(self, cas, compound_id):
+        if cas and cas not in self.shared_cas:
+            self.by_cas.setdefault(cas, compound_id)
+
+    def lookup(self, cas=None, name_cn=None, name_en=None):
+        """
+        查找化合物 ID，依次按中文名、英文名、CAS 编号匹配，找不到返回 None。
+        同分异构体共用 CAS 编号和英文名，只能按中文名（巨豆三烯酮A、B…）区分。
+        """
+        key = normalize_name(name_cn)
+        if key and key in self.by_name_cn:
+            return self.by_name_cn[key]
+        if normalize_cas(cas) in self.shared_cas:
+            return None
+        key = normalize_name(name_en)
+        if key and key in self.by_name_en:
+            return self.by_name_en[key]
+        key = normalize_cas(cas)
+        if key and key in self.by_cas:
+            return self.by_cas[key]
+        return None
+
+    def register(self, cas=None, name_cn=None, name_en=None):
+        """
+        查找化合物 ID，找不到时新建一条记录。
+        新出现的名称或 CAS 编号会作为同义名加入已有记录，下次可直接匹配。
+        名称和 CAS 编号都为空时无法识别化合物，返回 None，不新建记录。
+        """
+        if not (normalize_cas(cas) or normalize_name(name_cn) or normalize_name(name_en)):
+            return None
+        compound_id = self.lookup(cas, name_cn, name_en)
+        if compound_id is None:
+            compound_id = f"C{self._next_id:06d}"
+            self._next_id += 1
+            self.compounds[compound_id] = {"id": compound_id, "names_cn": [], "names_en": [], "cas": []}
+        record = self.compounds[compound_id]
+        shared = normalize_cas(cas) in self.shared_cas
+
+        key = normalize_name(name_cn)
+        if key and key not in self.by_name_cn:
+            self.by_name_cn[key] = compound_id
+            record["names_cn"].append(str(name_cn).strip())
+        key = normalize_name(name_en)
+        if key and not shared and key not in self.by_name_en:
+            self.by_name_en[key] = compound_id
+            record["names_en"].append(str(name_en).strip())
+        key = normalize_cas(cas)
+        if key and key not in record["cas"]:
+            record["cas"].append(key)
+            self._index_cas(key, compound_id)
+        return compound_id
+
+    def add_synonym(self, compound_id, name_cn=None, name_en=None):
+        """手动为已有化合物添加同义名（例如俗名），已被占用的名称会改为指向该化合物"""
+        record = self.compounds[compound_id]
+        if normalize_name(name_cn):
+            self.by_name_cn[normalize_name(name_cn)] = compound_id
+            record["names_cn"].append(str(name_cn).strip())
+        if normalize_name(name_en):
+            self.by_name_en[normalize_name(name_en)] = compound_id
+            record["names_en"].append(str(name_en).strip())
+
+    def assign_ids(self, df, cas_column="CAS 编号", name_cn_column="用户定义的谱库化合物",
+                   name_en_column="化合物名称"):
+        """
+        为 DataFrame 的每一行分配化合物 ID，返回与 df 同索引的 Series。
+        相同的（规范化后的）(CAS, 中文名, 英文名) 组合只查一次注册表；名称和 CAS 编号都为空的行 ID 为 None。
+        """
+        columns = [c if c in df.columns else None for c in (cas_column, name_cn_column, name_en_column)]
+        rows = list(zip(*[df[c] if c else [None] * len(df) for c in columns]))
+        # 先规范化再作为键：NaN 互不相等，直接用原值做键时每个空行都会各查一次
+        keys = [(normalize_cas(cas), normalize_name(cn), normalize_name(en)) for cas, cn, en in rows]
+        resolved = {}
+        for key, row in zip(keys, rows):
+            if key not in resolved:
+                resolved[key] = self.register(*row)
+        return pd.Series([resolved[key] for key in keys], index=df.index, name="化合物ID", dtype=object)
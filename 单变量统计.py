@@ -0,0 +1,166 @@
+import numpy as np
+import pandas as pd
+
+
+# 单变量检验方法，键为保存在设置中的值，值为界面上显示的名称
+TEST_METHODS = {"welch": "Welch t 检验", "mannwhitney": "Mann-Whitney U 检验"}
+
+# 稀疏矩阵做秩检验时每次展开的单元格数（样品数×化合物数）上限
+RANK_BLOCK_CELLS = 1 << 20
+
+
+def column_moments(X):
+    """
+    每列的均值和方差（ddof=1）。X 为稠密数组或 scipy 稀疏矩阵，稀疏矩阵只用列和与平方和计算，不展开。
+    :return: (均值, 方差)
+    """
+    if isinstance(X, np.ndarray):
+        return X.mean(axis=0), X.var(axis=0, ddof=1)
+    n = X.shape[0]
+    mean = np.asarray(X.sum(axis=0)).ravel() / n
+    mean_square = np.asarray(X.multiply(X).sum(axis=0)).ravel() / n
+    variance = np.maximum(mean_square - mean ** 2, 0)
+    # E[x²] - E[x]² 存在舍入误差，相对误差范围内的视为常数列（方差为 0），与稠密矩阵的结果一致
+    variance = np.where(variance > 1e-10 * mean_square, variance, 0.0)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return mean, variance * n / (n - 1)
+
+
+def welch_t_test(a, b):
+    """
+    对每一列（化合物）同时做 Welch t 检验（不假设方差相等，双侧）。
+    :param a: 对比组 样品×化合物（稠密数组或 scipy 稀疏矩阵）
+    :param b: 参照组 样品×化合物
+    :return: (t 统计量, p 值)，方差均为 0 的列 p 值为 NaN
+    """
+    from scipy import stats
+
+    n1, n2 = a.shape[0], b.shape[0]
+    (mean1, var1), (mean2, var2) = column_moments(a), column_moments(b)
+    v1 = var1 / n1
+    v2 = var2 / n2
+    se2 = v1 + v2
+    with np.errstate(divide="ignore", invalid="ignore"):
+        t = (mean1 - mean2) / np.sqrt(se2)
+        df = se2 ** 2 / (v1 ** 2 / (n1 - 1) + v2 ** 2 / (n2 - 1))
+    p = 2 * stats.t.sf(np.abs(t), df)
+    return t, np.where(se2 > 0, p, np.nan)
+
+
+def mann_whitney_u(a, b):
+    """
+    对每一列同时做 Mann-Whitney U 检验（双侧，正态近似，含结校正和连续性校正，
+    与 scipy.stats.mannwhitneyu(method="asymptotic") 相同）。
+    a、b 为 scipy 稀疏矩阵时每次只展开不超过 RANK_BLOCK_CELLS 个单元格的一组列。
+    :return: (对比组的 U 统计量, p 值)，所有值都相同的列 p 值为 NaN
+    """
+    from scipy import stats
+
+    if not isinstance(a, np.ndarray):
+        a, b = a.tocsc(), b.tocsc()
+        width = max(1, RANK_BLOCK_CELLS // max(1, a.shape[0] + b.shape[0]))
+        blocks = [mann_whitney_u(a[:, j:j + width].toarray(), b[:, j:j + width].toarray())
+                  for j in range(0, a.shape[1], width)]
+        return np.concatenate([u for u, _ in blocks]), np.concatenate([p for _, p in blocks])
+
+    n1, n2 = len(a), len(b)
+    combined = np.vstack([a, b])
+    ranks = stats.rankdata(combined, axis=0)
+    u1 = ranks[:n1].sum(axis=0) - n1 * (n1 + 1) / 2
+
+    # 结校正：每列中每组相同值的个数 t，修正项为 Σ(t³ - t)
+    ordered = np.sort(combined, axis=0)
+    n = n1 + n2
+    boundaries = np.vstack([np.ones((1, ordered.shape[1]), bool), ordered[1:] != ordered[:-1]])
+    group_id = np.cumsum(boundaries, axis=0) - 1
+    tie_counts = np.zeros_like(ordered, dtype=np.float64)
+    np.add.at(tie_counts, (group_id, np.broadcast_to(np.arange(ordered.shape[1]), ordered.shape)), 1)
+    tie_term = (tie_counts ** 3 - tie_counts).sum(axis=0)
+
+    mu = n1 * n2 / 2
+    sigma = np.sqrt(n1 * n2 / 12 * ((n + 1) - tie_term / (n * (n - 1))))
+    with np.errstate(divide="ignore", invalid="ignore"):
+        z = (np.abs(u1 - mu) - 0.5) / sigma
+    p = np.minimum(2 * stats.norm.sf(z), 1.0)
+    return u1, np.where(sigma > 0, p, np.nan)
+
+
+def benjamini_hochberg(p_values):
+    """Benjamini-Hochberg 校正，返回与输入同序的 q 值（FDR），NaN 保持为 NaN"""
+    p = np.asarray(p_values, dtype=np.float64)
+    q = np.full(p.shape, np.nan)
+    valid = np.flatnonzero(~np.isnan(p))
+    if valid.size == 0:
+        return q
+    order = valid[np.argsort(p[valid])]
+    ranked = p[order] * valid.size / np.arange(1, valid.size + 1)
+    # 从大到小取累计最小值，保证 q 值单调
+    q[order] = np.minimum(np.minimum.accumulate(ranked[::-1])[::-1], 1.0)
+    return q
+
+
+def contrast_statistics(X, case_mask, compound_names, test="welch"):
+    """
+    一次计算所有化合物在对比组与参照组之间的倍数变化、检验 p 值和 FDR。
+    X 应为填充缺失值（和归一化）后、未做 log 变换和标度的浓度矩阵。
+    :param X: 样品×化合物矩阵（稠密数组或 scipy 稀疏矩阵；稀疏矩阵不整体展开）
+    :param case_mask: 布尔数组，True 为对比组样品，False 为参照组样品
+    :param compound_names: 与 X 的列对应的化合物名称
+    :param test: welch 或 mannwhitney
+    :return: 以化合物名称为索引的 DataFrame
+    """
+    from scipy import sparse
+
+    X = sparse.csr_matrix(X, dtype=np.float64) if sparse.issparse(X) else np.asarray(X, dtype=np.float64)
+    case_mask = np.asarray(case_mask, dtype=bool)
+    a, b = X[case_mask], X[~case_mask]
+    if test == "welch":
+        _, p = welch_t_test(a, b)
+    elif test == "mannwhitney":
+        _, p = mann_whitney_u(a, b)
+    else:
+        raise ValueError(f"检验方法必须是 {list(TEST_METHODS)} 之一，而不是 {test!r}")
+
+    mean_case, mean_control = column_moments(a)[0], column_moments(b)[0]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        fold_change = mean_case / mean_control
+        log2_fc = np.log2(fold_change)
+    return pd.DataFrame({
+        "对比组均值": mean_case,
+        "参照组均值": mean_control,
+        "倍数变化 FC": fold_change,
+        "log2 FC": log2_fc,
+        "p 值": p,
+        "FDR q 值": benjamini_hochberg(p),
+    }, index=pd.Index(compound_names, name="化合物名称"))
+
+
+def volcano_plot(statistics, output_file, title="火山图", fc_threshold=2.0, q_threshold=0.05):
+    """
+    绘制火山图并保存为图片（不弹出窗口）：横轴 log2 FC，纵轴 -log10(FDR q 值)，
+    上调/下调且 q 值低于阈值的化合物分别标为红色/蓝色。
+    """
+    import matplotlib.pyplot as plt
+
+    log2_fc = statistics["log2 FC"].replace([np.inf, -np.inf], np.nan)
+    neg_log_q = -np.log10(statistics["FDR q 值"].clip(lower=1e-300))
+    significant = statistics["FDR q 值"] < q_threshold
+    up = significant & (log2_fc >= np.log2(fc_threshold))
+    down = significant & (log2_fc <= -np.log2(fc_threshold))
+    other = ~(up | down)
+
+    fig = plt.figure(figsize=(8, 6))
+    plt.scatter(log2_fc[other], neg_log_q[other], c="lightgrey", s=12, label="不显著")
+    plt.scatter(log2_fc[up], neg_log_q[up], c="tab:red", s=16, label=f"上调 ({int(up.sum())})")
+    plt.scatter(log2_fc[down], neg_log_q[down], c="tab:blue", s=16, label=f"下调 ({int(down.sum())})")
+    plt.axhline(-np.log10(q_threshold), color="k", linestyle="--", linewidth=0.8)
+    plt.axvline(np.log2(fc_threshold), color="k", linestyle="--", linewidth=0.8)
+    plt.axvline(-np.log2(fc_threshold), color="k", linestyle="--", linewidth=0.8)
+    plt.title(title)
+    plt.xlabel("log2 FC")
+    plt.ylabel("-log10 (FDR q 值)")
+    plt.legend()
+    plt.grid(True, alpha=0.3)
+    fig.savefig(output_file, dpi=150)
+    plt.close(fig)
+    return output_file
@@ -1,14 +1,25 @@
 import pandas as pd
 import numpy as np
-from sklearn.cross_decomposition import PLSRegression
-from sklearn.preprocessing import StandardScaler, LabelEncoder
-import matplotlib.pyplot as plt
 import os
-from tkinter import Tk, filedialog, Button, Label, Entry, Text, Toplevel, Listbox, MULTIPLE, SINGLE, END, messagebox
-
-# 设置中文字体
-plt.rcParams['font.sans-serif'] = ['SimHei']
-plt.rcParams['axes.unicode_minus'] = False
+import re
+from tkinter import Tk, filedialog, Button, Label, Entry, Text, Toplevel, Listbox, MULTIPLE, SINGLE, END, messagebox, \
+    StringVar, OptionMenu
+from 运行报告 import RunReport
+from 稀疏矩阵 import SparseFeatureMatrix, should_use_sparse
+from 模型缓存 import cached_pls_vip, cached_sparse_pls_vip, default_cache
+from 数据预处理 import DEFAULT_OPTIONS, preprocess, is_default, preprocessing_dialog
+from 批量对比 import CONTRAST_MODES, build_contrasts, run_contrasts, summarize_vip
+from 单变量统计 import TEST_METHODS, contrast_statistics, volcano_plot
+from 样品分组 import grouping_dialog, summarize_groups
+from 样品档案库 import read_table, read_columns, MANIFEST_NAME
+
+
+def pyplot():
+    """按需载入 matplotlib.pyplot 并设置中文字体；pyplot 载入较慢，只在作图时调用"""
+    import matplotlib.pyplot as plt
+    plt.rcParams['font.sans-serif'] = ['SimHei']
+    plt.rcParams['axes.unicode_minus'] = False
+    return plt
 
 
 class OPLSDA_GUI:
@@ -48,23 +59,43 @@ class OPLSDA_GUI:
         self.select_compound_button = Button(root, text="选择化合物种类列", command=self.select_compound)
         self.select_compound_button.grid(row=4, column=1, padx=5, pady=5)
 
-        self.add_groups_button = Button(root, text="手动添加分组", command=self.add_groups)
-        self.add_groups_button.grid(row=5, column=0, columnspan=2, padx=5, pady=5)
+        self.add_groups_button = Button(root, text="样品分组", command=self.add_groups)
+        self.add_groups_button.grid(row=5, column=0, padx=5, pady=5)
+
+        self.preprocessing_button = Button(root, text="数据预处理设置", command=self.select_preprocessing)
+        self.preprocessing_button.grid(row=5, column=1, padx=5, pady=5)
+
+        # 对比方式：全部分组一起建一个模型，或按分组两两对比 / 一对其余批量建模
+        self.label_mode = Label(root, text="对比方式：")
+        self.label_mode.grid(row=6, column=0, padx=5, pady=5, sticky='w')
+
+        self.contrast_mode = StringVar(root, value=CONTRAST_MODES["all"])
+        self.mode_menu = OptionMenu(root, self.contrast_mode, *CONTRAST_MODES.values())
+        self.mode_menu.grid(row=6, column=1, padx=5, pady=5, sticky='w')
+
+        # 单变量检验：两个分组之间的倍数变化、p 值和 FDR，与 VIP 结果合并输出
+        self.label_test = Label(root, text="单变量检验：")
+        self.label_test.grid(row=7, column=0, padx=5, pady=5, sticky='w')
+
+        self.test_method = StringVar(root, value=TEST_METHODS["welch"])
+        self.test_menu = OptionMenu(root, self.test_method, *TEST_METHODS.values())
+        self.test_menu.grid(row=7, column=1, padx=5, pady=5, sticky='w')
 
         # 执行按钮
         self.run_button = Button(root, text="开始分析", command=self.run_analysis)
-        self.run_button.grid(row=6, column=0, padx=5, pady=10)
+        self.run_button.grid(row=8, column=0, padx=5, pady=10)
 
         self.quit_button = Button(root, text="退出", command=root.quit)
-        self.quit_button.grid(row=6, column=1, padx=5, pady=10)
+        self.quit_button.grid(row=8, column=1, padx=5, pady=10)
 
         # 数据选择变量
         self.selected_samples = None
         self.selected_compound = None
         self.sample_groups = {}
+        self.preprocessing = dict(DEFAULT_OPTIONS)
 
     def load_file(self):
-        file_paths = filedialog.askopenfilenames(title="选择Excel文件", filetypes=(("Excel文件", "*.xlsx"), ("所有文件", "*.*")))
+        file_paths = filedialog.askopenfilenames(title="选择Excel文件", filetypes=(("Excel文件", "*.xlsx"), ("样品档案库", MANIFEST_NAME), ("所有文件", "*.*")))
         self.file_text.delete(1.0, END)
         self.file_text.insert(END, "\n".join(file_paths))
 
@@ -74,8 +105,7 @@ class OPLSDA_GUI:
             messagebox.showwarning("警告", "请先选择文件！")
             return
 
-        data = pd.read_excel(file_path)
-        columns = data.columns.tolist()
+        columns = read_columns(file_path)
 
         select_window = Toplevel(self.root)
         select_window.title("选择样品列")
@@ -102,8 +132,7 @@ class OPLSDA_GUI:
             messagebox.showwarning("警告", "请先选择文件！")
             return
 
-        data = pd.read_excel(file_path)
-        columns = data.columns.tolist()
+        columns = read_columns(file_path)
 
         select_window = Toplevel(self.root)
         select_window.title("选择化合物种类列")
@@ -128,6 +157,19 @@ class OPLSDA_GUI:
             messagebox.showwarning("警告", "请先选择样品列！")
             return
 
+        # 从元数据 CSV、正则表达式规则或已保存的分组中得到分组，分组保存在数据文件夹中
+        file_path = self.file_text.get(1.0, END).strip().split("\n")[0]
+        groups = grouping_dialog(self.root, self.selected_samples, file_path or None)
+        if groups is None:
+            self.enter_groups_manually()
+            return
+        if groups:
+            # 未分组的样品不参与建模
+            self.selected_samples = [s for s in self.selected_samples if s in groups]
+            self.sample_groups = groups
+            messagebox.showinfo("成功", f"分组已设置：{summarize_groups(groups)}")
+
+    def enter_groups_manually(self):
         group_window = Toplevel(self.root)
         group_window.title("样本分组")
 
@@ -162,6 +204,9 @@ class OPLSDA_GUI:
             group_window.destroy()
 
         Button(group_window, text="确定", command=confirm_groups).pack(pady=10)
+    def select_preprocessing(self):
+        self.preprocessing = preprocessing_dialog(self.root, self.preprocessing)
+
     def run_analysis(self):
         # 验证是否完成设置
         if not self.selected_samples or not self.selected_compound or not self.sample_groups:
@@ -180,30 +225,120 @@ class OPLSDA_GUI:
             messagebox.showerror("错误", "VIP 阈值或主成分数量输入有误！")
             return
 
+        mode = next(key for key, label in CONTRAST_MODES.items() if label == self.contrast_mode.get())
+        test = next(key for key, label in TEST_METHODS.items() if label == self.test_method.get())
+        report = RunReport("OPLS-DA分析")
         for file_path in files:
             try:
-                self.process_file(file_path, vip_threshold, n_components)
+                if mode == "all":
+                    self.process_file(file_path, vip_threshold, n_components, report=report, test=test)
+                else:
+                    self.process_file_batch(file_path, vip_threshold, n_components, mode, report=report, test=test)
             except Exception as e:
                 messagebox.showerror("错误", f"处理文件 {file_path} 时出错：{e}")
                 continue
 
+        report.save(os.path.dirname(files[0]))
         messagebox.showinfo("完成", "所有文件处理完成！")
 
-    def process_file(self, file_path, vip_threshold, n_components):
+    def process_file(self, file_path, vip_threshold, n_components, report=None, test="welch"):
+        report = RunReport.ensure(report)
+        file_name = os.path.basename(file_path)
+
         # 加载数据
-        data = pd.read_excel(file_path)
+        # 只读取选中的样品列和化合物列，档案库不载入其余样品
+        with report.stage("读取", file=file_name, samples=len(self.selected_samples)) as stage:
+            data = read_table(file_path, samples=self.selected_samples, columns=[self.selected_compound])
+            stage["rows_in"] = len(data)
         print(f"正在处理文件：{file_path}")
 
-        # 转换数据格式
-        reshaped_data = self.reshape_data(data, self.selected_compound, self.selected_samples, file_path)
-        reshaped_data["分组"] = reshaped_data["样品"].map(self.sample_groups)
+        # 转换数据格式：使用默认预处理、化合物很多且大多未检出时直接从合并表构建稀疏矩阵
+        with report.stage("转置", file=file_name) as stage:
+            if is_default(self.preprocessing) and should_use_sparse(data, self.selected_samples):
+                reshaped_data = SparseFeatureMatrix.from_merged(data, self.selected_samples, self.selected_compound)
+                stage["sparse_density"] = round(reshaped_data.density, 4)
+                print(f"化合物较多且大多未检出（非零比例 {reshaped_data.density:.1%}），使用稀疏矩阵进行分析。")
+            else:
+                reshaped_data = self.reshape_data(data, self.selected_compound, self.selected_samples, file_path)
+                reshaped_data["分组"] = reshaped_data["样品"].map(self.sample_groups)
+            stage["rows_out"] = len(self.selected_samples)
 
         # 执行 OPLS-DA 分析
-        important_compounds_df = self.opls_da_analysis(reshaped_data, vip_threshold, n_components)
+        with report.stage("OPLS-DA", file=file_name, n_components=n_components,
+                          preprocessing=self.preprocessing) as stage:
+            important_compounds_df = self.opls_da_analysis(reshaped_data, vip_threshold, n_components,
+                                                           groups=self.sample_groups, preprocessing=self.preprocessing)
+            stage["rows_out"] = len(important_compounds_df)
+
+        # 只有两个分组时做单变量统计，结果并入 VIP 表并绘制火山图
+        contrasts = build_contrasts({s: self.sample_groups[s] for s in self.selected_samples}, "pairs")
+        if len(contrasts) == 1:
+            name, case, _ = contrasts[0]
+            with report.stage("单变量统计", file=file_name, test=test) as stage:
+                X, sample_names, compound_names = self.statistics_matrix(reshaped_data)
+                statistics = contrast_statistics(X, [s in case for s in sample_names], compound_names, test)
+                important_compounds_df = important_compounds_df.join(statistics, on="化合物名称")
+                stage["significant"] = int((statistics["FDR q 值"] < 0.05).sum())
+            base_name = os.path.splitext(file_path)[0]
+            volcano_plot(statistics, f"{base_name}_火山图.png", title=f"火山图 ({name})")
+            print(f"火山图已保存到: {base_name}_火山图.png")
 
         # 保存结果
         self.save_results(important_compounds_df, file_path)
 
+    def process_file_batch(self, file_path, vip_threshold, n_components, mode, report=None, max_workers=None,
+                           test="welch"):
+        """
+        批量对比：按 mode（pairs 两两对比 / one_vs_rest 一对其余）为每个对比分别建模，
+        所有对比共用同一个预处理后的矩阵，结果汇总为一张每个对比一列的 VIP 表。
+        每个对比另做单变量统计（test），VIP 与统计结果保存在该对比的工作表中。
+        """
+        report = RunReport.ensure(report)
+        file_name = os.path.basename(file_path)
+
+        # 只读取选中的样品列和化合物列，档案库不载入其余样品
+        with report.stage("读取", file=file_name, samples=len(self.selected_samples)) as stage:
+            data = read_table(file_path, samples=self.selected_samples, columns=[self.selected_compound])
+            stage["rows_in"] = len(data)
+        print(f"正在处理文件：{file_path}")
+
+        # 预处理只做一次，各对比从中取出自己的样品
+        with report.stage("转置", file=file_name) as stage:
+            if is_default(self.preprocessing) and should_use_sparse(data, self.selected_samples):
+                matrix = SparseFeatureMatrix.from_merged(data, self.selected_samples, self.selected_compound)
+                sample_names, compound_names = matrix.samples, matrix.features
+                stage["sparse_density"] = round(matrix.density, 4)
+                statistics_source = matrix
+            else:
+                reshaped_data = self.reshape_data(data, self.selected_compound, self.selected_samples, file_path)
+                sample_names = reshaped_data["样品"].tolist()
+                compound_names = reshaped_data.columns[1:].tolist()
+                matrix = preprocess(reshaped_data.drop(columns=["样品"]), self.preprocessing)
+                statistics_source = reshaped_data
+            stage["rows_out"] = len(sample_names)
+
+        with report.stage("OPLS-DA批量对比", file=file_name, mode=mode, n_components=n_components,
+                          preprocessing=self.preprocessing) as stage:
+            vip_table, scores = run_contrasts(matrix, sample_names, compound_names, self.sample_groups,
+                                              n_components, mode=mode, max_workers=max_workers,
+                                              cache=default_cache(), settings=self.preprocessing)
+            stage["contrasts"] = vip_table.shape[1]
+            stage["rows_out"] = len(vip_table)
+
+        # 每个对比的单变量统计，一次向量化计算全部化合物
+        with report.stage("单变量统计", file=file_name, test=test) as stage:
+            X, _, _ = self.statistics_matrix(statistics_source)
+            row_index = {sample: i for i, sample in enumerate(sample_names)}
+            contrast_tables = {}
+            for name, (contrast_samples, _, y) in scores.items():
+                rows = [row_index[s] for s in contrast_samples]
+                statistics = contrast_statistics(X[rows], y == 1, compound_names, test)
+                contrast_tables[name] = statistics.join(vip_table[name].rename("VIP 值"))
+            stage["contrasts"] = len(contrast_tables)
+
+        self.save_batch_results(summarize_vip(vip_table, vip_threshold), scores, file_path, contrast_tables)
+        return vip_table
+
     def reshape_data(self, data, cas_column, sample_columns, file_path):
         melted_data = data.melt(id_vars=[cas_column], value_vars=sample_columns, var_name="样品", value_name="浓度")
         reshaped_data = melted_data.pivot(index="样品", columns=cas_column, values="浓度").reset_index()
@@ -215,29 +350,37 @@ class OPLSDA_GUI:
 
         return reshaped_data
 
-    def opls_da_analysis(self, reshaped_data, vip_threshold, n_components):
-        X = reshaped_data.drop(columns=["样品", "分组"]).values
-        y = LabelEncoder().fit_transform(reshaped_data["分组"])
-
-        scaler = StandardScaler()
-        X_scaled = scaler.fit_transform(X)
-
-        pls = PLSRegression(n_components=n_components)
-        pls.fit(X_scaled, y)
-
-        T = pls.x_scores_
-        P = pls.x_loadings_
-        num_features = X_scaled.shape[1]
-        weights_squared = np.square(pls.x_weights_)
-        explained_variance = np.var(T, axis=0)
-        vip_scores = np.sqrt(num_features * np.sum(weights_squared * explained_variance / explained_variance.sum(), axis=1))
-
-        compound_names = reshaped_data.columns[1:-1]
+    def opls_da_analysis(self, reshaped_data, vip_threshold, n_components, groups=None, preprocessing=None):
+        """
+        reshaped_data 为 reshape_data 得到的 DataFrame（含“分组”列），
+        或 SparseFeatureMatrix（此时按 groups 字典取每个样品的分组，只支持默认预处理）。
+        preprocessing 为数据预处理选项（见 数据预处理.DEFAULT_OPTIONS）。
+        模型按数据和预处理设置缓存（见 模型缓存），只改变 VIP 阈值或主成分数量时不重新拟合。
+        """
+        from sklearn.preprocessing import LabelEncoder
+
+        if isinstance(reshaped_data, SparseFeatureMatrix):
+            # 稀疏矩阵：隐式标准化的 NIPALS，不展开为稠密矩阵
+            sample_names = reshaped_data.samples
+            y = LabelEncoder().fit_transform([groups[sample] for sample in sample_names])
+            T, _, vip_scores = cached_sparse_pls_vip(reshaped_data, y, n_components)
+            compound_names = pd.Index(reshaped_data.features)
+        else:
+            sample_names = reshaped_data["样品"]
+            y = LabelEncoder().fit_transform(reshaped_data["分组"])
+
+            # 缺失值填充、归一化、变换和标度
+            X_scaled = preprocess(reshaped_data.drop(columns=["样品", "分组"]), preprocessing)
+
+            T, vip_scores = cached_pls_vip(X_scaled, y, n_components, preprocessing)
+
+            compound_names = reshaped_data.columns[1:-1]
         important_compounds = compound_names[vip_scores > vip_threshold]
         important_vips = vip_scores[vip_scores > vip_threshold]
         important_compounds_df = pd.DataFrame({'化合物名称': important_compounds, 'VIP 值': important_vips})
 
         # 绘制得分图
+        plt = pyplot()
         plt.figure(figsize=(10, 6))
         scatter = plt.scatter(T[:, 0], T[:, 1], c=y, cmap='viridis', edgecolor='k', s=100)
         plt.title('OPLS-DA Score Plot')
@@ -247,19 +390,69 @@ class OPLSDA_GUI:
         plt.grid(True)
 
         # 为每个样品添加标注
-        for i, sample_name in enumerate(reshaped_data["样品"]):
+        for i, sample_name in enumerate(sample_names):
             plt.annotate(sample_name, (T[i, 0], T[i, 1]), fontsize=8, ha='right')
 
         plt.show()
 
         return important_compounds_df
 
+    def statistics_matrix(self, data):
+        """
+        单变量统计使用的矩阵：只按预处理设置填充缺失值和归一化，不做 log 变换和标度，
+        倍数变化仍是浓度之比。data 为 reshape_data 的结果或 SparseFeatureMatrix。
+        :return: (样品×化合物矩阵, 样品名称, 化合物名称)；SparseFeatureMatrix 返回其 CSR 矩阵，统计时不整体展开
+        """
+        if isinstance(data, SparseFeatureMatrix):
+            return data.matrix, data.samples, data.features
+        values = data.drop(columns=[c for c in ("样品", "分组") if c in data.columns])
+        options = dict(self.preprocessing, transform="none", scaling="none")
+        return preprocess(values, options), data["样品"].tolist(), values.columns.tolist()
+
     def save_results(self, important_compounds_df, file_path):
         base_name = os.path.splitext(os.path.basename(file_path))[0]
         save_path = os.path.join(os.path.dirname(file_path), f"{base_name}_opls-da分析.xlsx")
         important_compounds_df.to_excel(save_path, index=False)
         print(f"VIP 分析结果已保存到: {save_path}")
 
+    def save_batch_results(self, vip_summary, scores, file_path, contrast_tables=None):
+        """
+        保存 VIP 汇总表和每个对比的 VIP 与单变量统计（各占一个工作表），
+        得分图和火山图保存为图片（批量对比时不逐个弹出窗口）。
+        """
+        contrast_tables = contrast_tables or {}
+        base_name = os.path.splitext(os.path.basename(file_path))[0]
+        save_path = os.path.join(os.path.dirname(file_path), f"{base_name}_opls-da批量对比.xlsx")
+        with pd.ExcelWriter(save_path) as writer:
+            vip_summary.to_excel(writer, sheet_name="VIP 汇总")
+            for name, table in contrast_tables.items():
+                # 工作表名称最长 31 个字符，且不能含有 []:*?/\
+                table.to_excel(writer, sheet_name=re.sub(r'[\[\]:*?/\\]', "_", name)[:31])
+        print(f"VIP 汇总表已保存到: {save_path}")
+
+        plot_folder = os.path.join(os.path.dirname(file_path), f"{base_name}_opls-da得分图")
+        if not os.path.exists(plot_folder):
+            os.makedirs(plot_folder)
+        plt = pyplot()
+        for name, (sample_names, T, y) in scores.items():
+            fig = plt.figure(figsize=(10, 6))
+            plt.scatter(T[:, 0], T[:, 1] if T.shape[1] > 1 else np.zeros(len(T)), c=y, cmap='viridis',
+                        edgecolor='k', s=100)
+            plt.title(f'OPLS-DA Score Plot ({name})')
+            plt.xlabel('Component 1')
+            plt.ylabel('Component 2')
+            plt.grid(True)
+            for i, sample_name in enumerate(sample_names):
+                plt.annotate(sample_name, (T[i, 0], T[i, 1] if T.shape[1] > 1 else 0), fontsize=8, ha='right')
+            # 分组名称中可能含有不能用于文件名的字符
+            file_stem = re.sub(r'[\\/:*?"<>|]', "_", name)
+            fig.savefig(os.path.join(plot_folder, file_stem + ".png"), dpi=150)
+            plt.close(fig)
+            if name in contrast_tables:
+                volcano_plot(contrast_tables[name], os.path.join(plot_folder, f"{file_stem}_火山图.png"),
+                             title=f"火山图 ({name})")
+        print(f"得分图已保存到: {plot_folder}")
+
 
 # 主程序入口
 if __name__ == "__main__":
@@ -0,0 +1,129 @@
+import os
+import time
+import importlib.util
+from collections import deque
+from itertools import islice
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pandas as pd
+
+
+# 包含基本化合物信息的列
+COMPOUND_INFO_COLUMNS = ["CAS 编号", "化合物名称", "用户定义的谱库化合物", "组分 RI", "谱库 RI", "谱库化合物描述"]
+
+# 合并时需要从每个文件读取的列，其余列（匹配因子等）不解析
+READ_COLUMNS = COMPOUND_INFO_COLUMNS + ["估计的浓度."]
+
+# 在各文件中大量重复出现的字符串列
+KEY_COLUMNS = ["CAS 编号", "化合物名称", "用户定义的谱库化合物", "谱库化合物描述"]
+
+# 浓度统一使用 float32 保存，未检出记为 NaN，只在导出 Excel 时显示为 "--"
+CONCENTRATION_DTYPE = np.float32
+MISSING_PLACEHOLDER = "--"
+
+
+class KeyInterner:
+    """
+    跨文件共享的字符串池：同一个 CAS 编号或化合物名称在所有文件中只保留一个 Python 字符串对象，
+    合并完成后再统一转为共享同一组类别的 category 类型。
+    """
+
+    def __init__(self):
+        self.pools = {}
+
+    def intern_frame(self, df, columns=KEY_COLUMNS):
+        """把 df 中的字符串列替换为字符串池中的对象（原地修改），只对每列的不重复值做一次查找"""
+        for column in columns:
+            if column not in df.columns:
+                continue
+            pool = self.pools.setdefault(column, {})
+            mapping = {value: pool.setdefault(value, value) for value in df[column].dropna().unique()}
+            df[column] = df[column].map(mapping)
+        return df
+
+    def categorize(self, df, columns=KEY_COLUMNS):
+        """把 df 中的字符串列转为 category 类型，类别取自整个字符串池，所有结果表共用同一组类别"""
+        for column in columns:
+            if column in df.columns and column in self.pools:
+                categories = pd.Index(list(self.pools[column])).dropna().unique()
+                df[column] = pd.Categorical(df[column], categories=categories)
+        return df
+
+
+def to_concentration(series):
+    """把浓度列转为 float32，无法解析的值（如 "--"）记为 NaN"""
+    return pd.to_numeric(series, errors="coerce").astype(CONCENTRATION_DTYPE)
+
+
+def compact_frame(df, concentration_columns, interner, keep_columns=COMPOUND_INFO_COLUMNS):
+    """
+    只保留合并需要的列，字符串列放入共享字符串池，浓度列转为 float32。
+    :return: 精简后的新 DataFrame
+    """
+    columns = [c for c in keep_columns if c in df.columns] + [c for c in concentration_columns if c in df.columns]
+    df = df[columns].copy()
+    for column in concentration_columns:
+        if column in df.columns:
+            df[column] = to_concentration(df[column])
+    return interner.intern_frame(df)
+
+
+def export_excel(df, output_file, concentration_columns):
+    """导出合并结果，缺失的浓度只在这里显示为 "--"，内存中的数据保持数值类型"""
+    output = df.copy()
+    for column in concentration_columns:
+        # float32 先按最短十进制表示还原（12.5555 而不是 12.555500030517578），再填入占位符
+        values = pd.Series(output[column].to_numpy().astype(str).astype(np.float64), index=output.index)
+        output[column] = values.astype(object).where(values.notna(), MISSING_PLACEHOLDER)
+    output.to_excel(output_file, index=False)
+
+
+def excel_engine(preferred=None):
+    """
+    选择读取 Excel 的引擎：默认使用更快的 calamine（需安装 python-calamine），未安装时使用 openpyxl。
+    也可用环境变量 GCMS_EXCEL_ENGINE 指定。
+    """
+    engine = preferred or os.environ.get("GCMS_EXCEL_ENGINE") or "calamine"
+    if engine == "calamine" and importlib.util.find_spec("python_calamine") is None:
+        return "openpyxl"
+    return engine
+
+
+def read_workbook(file_path, columns=READ_COLUMNS, engine=None):
+    """读取一个 Excel 文件，只解析 columns 中的列（文件中没有的列直接忽略）"""
+    wanted = set(columns)
+    return pd.read_excel(file_path, usecols=lambda column: column in wanted, engine=excel_engine(engine))
+
+
+def timed_read_workbook(file_path, columns=READ_COLUMNS, engine=None):
+    """读取一个 Excel 文件并返回 (DataFrame, 读取耗时 秒)，耗时在读取的进程中测得，不含进程间传输和排队等待"""
+    start = time.perf_counter()
+    df = read_workbook(file_path, columns, engine)
+    return df, time.perf_counter() - start
+
+
+def read_workbooks(file_paths, columns=READ_COLUMNS, engine=None, max_workers=None):
+    """
+    并行读取多个 Excel 文件，按 file_paths 的顺序逐个返回 (文件路径, DataFrame, 读取耗时 秒)。
+    解析在进程池中进行（openpyxl 为纯 Python 实现，多线程受 GIL 限制），
+    只有一个 CPU 或只有一个文件时在当前进程中顺序读取。
+    结果逐个返回，调用方可以边读边精简，不必同时保留所有原始表格；
+    同时提交的文件不超过 2×进程数，调用方处理较慢时已读取的表格也不会在内存中积压。
+    """
+    engine = excel_engine(engine)
+    max_workers = min(max_workers or os.cpu_count() or 1, len(file_paths))
+    if max_workers <= 1:
+        for file_path in file_paths:
+            yield (file_path, *timed_read_workbook(file_path, columns, engine))
+        return
+
+    remaining = iter(file_paths)
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        pending = deque((file_path, executor.submit(timed_read_workbook, file_path, columns, engine))
+                        for file_path in islice(remaining, max_workers * 2))
+        while pending:
+            file_path, future = pending.popleft()
+            next_path = next(remaining, None)
+            if next_path is not None:
+                pending.append((next_path, executor.submit(timed_read_workbook, next_path, columns, engine)))
+            yield (file_path, *future.result())
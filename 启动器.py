@@ -0,0 +1,144 @@
+import os
+import re
+import sys
+import runpy
+import argparse
+import subprocess
+
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# 全部工具：键为命令行中使用的名称，值为 (脚本文件名, 界面上显示的名称, 是否可直接从窗口打开)。
+# 需要命令行参数的工具（如 香气活度值.py 文件名）只能用 python 启动器.py <工具> <参数> 运行
+TOOLS = {
+    "convert": ("csv转化为xlsx格式.py", "CSV 转换为 Excel", True),
+    "ri": ("csv转化为xlsx格式_RI 差值筛选.py", "CSV 转换（RI 差值筛选）", True),
+    "merge_cas": ("按CAS编号合并excel中的浓度列.py", "按 CAS 编号合并浓度列", True),
+    "merge_name": ("按中文名合并excel的浓度列.py", "按中文名合并浓度列", True),
+    "reshape": ("PCA_OPLS-DA分析excel格式转换器.py", "PCA/OPLS-DA 格式转换", True),
+    "pca": ("对Excel文件进行PCA分析.py", "PCA 分析", True),
+    "opls": ("原始excel经转换后进行OPLS-DA分析 自设vip值.py", "OPLS-DA 分析", True),
+    "aroma": ("自动按cas号检索香气描述-优化最终版.py", "香气描述检索", True),
+    "oav": ("香气活度值.py", "香气活度值", False),
+    "profile": ("香气轮廓.py", "香气轮廓", False),
+    "knowledge": ("香气知识库.py", "香气知识库", False),
+    "archive": ("样品档案库.py", "样品档案库", False),
+    "heatmap": ("聚类热图.py", "聚类热图", False),
+    "drift": ("漂移校正.py", "QC 漂移校正", False),
+    "server": ("任务服务器.py", "任务服务器", False),
+}
+
+# 在控制台中交互（input()）的工具，从窗口打开时在 Windows 下需要新的控制台窗口
+CONSOLE_TOOLS = {"aroma"}
+
+# 冷启动预算：载入一个工具模块（不运行）所允许的最长时间（毫秒）
+STARTUP_BUDGET_MS = 1000
+
+IMPORT_TIME_LINE = re.compile(r"import time:\s*(\d+)\s*\|\s*(\d+)\s*\|( *)(\S.*)$")
+
+
+def tool_path(tool):
+    return os.path.join(SCRIPT_DIR, TOOLS[tool][0])
+
+
+def run_tool(tool, args=()):
+    """在当前进程中运行工具（与 python 脚本名.py 参数 相同），重量级依赖由工具自己在需要时载入"""
+    path = tool_path(tool)
+    sys.argv = [path, *args]
+    sys.path.insert(0, SCRIPT_DIR)
+    runpy.run_path(path, run_name="__main__")
+
+
+def open_tool(tool):
+    """从窗口打开工具：每个工具在单独的进程中运行，启动器窗口保持可用"""
+    flags = 0
+    if tool in CONSOLE_TOOLS and os.name == "nt":
+        flags = subprocess.CREATE_NEW_CONSOLE
+    return subprocess.Popen([sys.executable, tool_path(tool)], cwd=SCRIPT_DIR, creationflags=flags)
+
+
+def measure_import(tool):
+    """
+    用 python -X importtime 在新的解释器中载入工具模块（不运行 __main__ 部分），统计冷启动的载入时间。
+    同时检查模块在载入时没有弹窗、读取输入等副作用（标准输入已关闭，载入时调用 input() 会报错）。
+    :return: (总载入时间 ms, [(顶层模块, 累计时间 ms), ...] 按时间从大到小排列)
+    """
+    code = ("import importlib.util, sys; sys.path.insert(0, {folder!r}); "
+            "spec = importlib.util.spec_from_file_location('tool', {path!r}); "
+            "spec.loader.exec_module(importlib.util.module_from_spec(spec))").format(folder=SCRIPT_DIR,
+                                                                                  path=tool_path(tool))
+    env = dict(os.environ, MPLBACKEND="Agg")
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", code], cwd=SCRIPT_DIR, env=env,
+                            stdin=subprocess.DEVNULL, capture_output=True, text=True, encoding="utf-8")
+    modules = []
+    for line in result.stderr.splitlines():
+        match = IMPORT_TIME_LINE.match(line)
+        # 缩进为 1 个空格的是顶层导入（0 个空格的是 -X importtime 的表头）
+        if match and len(match.group(3)) == 1:
+            modules.append((match.group(4), int(match.group(2)) / 1000))
+    if result.returncode != 0:
+        raise RuntimeError(f"{TOOLS[tool][0]} 载入失败：\n{result.stderr.splitlines()[-1] if result.stderr else ''}")
+    # 工具模块本身以 spec 载入，不出现在 -X importtime 的输出中，总时间为所有顶层导入之和
+    return sum(ms for _, ms in modules), sorted(modules, key=lambda m: m[1], reverse=True)
+
+
+def report_import_times(tools, budget_ms=STARTUP_BUDGET_MS, top=5):
+    """
+    逐个测量工具的冷启动载入时间并打印最慢的几个顶层导入。
+    :return: 超出预算的工具列表
+    """
+    over_budget = []
+    for tool in tools:
+        total, modules = measure_import(tool)
+        status = "超出预算" if total > budget_ms else "正常"
+        print(f"{tool:<12}{TOOLS[tool][1]:<24}{total:8.0f} ms  {status}")
+        for name, ms in modules[:top]:
+            print(f"{'':16}{name:<40}{ms:8.0f} ms")
+        if total > budget_ms:
+            over_budget.append(tool)
+    return over_budget
+
+
+def launcher_window():
+    """工具选择窗口：每个按钮打开一个工具"""
+    from tkinter import Tk, Button, Label
+
+    root = Tk()
+    root.title("GC-MS 数据处理工具")
+    Label(root, text="选择要打开的工具：").pack(padx=20, pady=(15, 5))
+    for tool, (_, label, interactive) in TOOLS.items():
+        if interactive:
+            Button(root, text=label, width=30, command=lambda t=tool: open_tool(t)).pack(padx=20, pady=3)
+    Label(root, text="其他工具：python 启动器.py --list").pack(padx=20, pady=(5, 15))
+    root.mainloop()
+
+
+if __name__ == "__main__":
+    # 工具名之后的参数中，启动器自己的选项（--list、--importtime、--budget）由启动器处理，其余原样传给工具；
+    # 要把与启动器选项同名的参数传给工具时写在 -- 之后。-h 在指定了工具时显示该工具的帮助
+    parser = argparse.ArgumentParser(description="GC-MS 数据处理工具启动器：不带参数时打开工具选择窗口",
+                                     add_help=False, allow_abbrev=False)
+    parser.add_argument("tool", nargs="?", choices=list(TOOLS), help="直接运行的工具，其后的参数传给该工具")
+    parser.add_argument("-h", "--help", action="store_true", help="显示帮助（指定了工具时显示该工具的帮助）")
+    parser.add_argument("--list", action="store_true", help="列出全部工具")
+    parser.add_argument("--importtime", action="store_true",
+                        help="用 python -X importtime 测量工具（不指定时为全部工具）的冷启动载入时间")
+    parser.add_argument("--budget", type=float, default=STARTUP_BUDGET_MS, help="冷启动预算（毫秒），超出时返回非零退出码")
+    arguments, tool_args = parser.parse_known_args()
+
+    if arguments.list:
+        for key, (file_name, name, _) in TOOLS.items():
+            print(f"{key:<12}{name:<24}{file_name}")
+    elif arguments.importtime:
+        slow = report_import_times([arguments.tool] if arguments.tool else list(TOOLS), arguments.budget)
+        if slow:
+            print(f"以下工具的载入时间超出预算 {arguments.budget:.0f} ms：{', '.join(slow)}")
+            sys.exit(1)
+    elif arguments.tool:
+        run_tool(arguments.tool, tool_args + ["-h"] if arguments.help else tool_args)
+    elif arguments.help:
+        parser.print_help()
+    elif tool_args:
+        parser.error(f"无法识别的参数：{' '.join(tool_args)}")
+    else:
+        launcher_window()
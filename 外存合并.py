@@ -0,0 +1,166 @@
+import os
+import shutil
+import tempfile
+import numpy as np
+import pandas as pd
+from 合并工具 import COMPOUND_INFO_COLUMNS, CONCENTRATION_DTYPE, MISSING_PLACEHOLDER
+
+
+# 文件数超过该值时合并脚本自动改用外存合并
+OUT_OF_CORE_FILES = 1000
+
+# 默认的内存上限（MB），决定输出时每块包含多少个化合物
+DEFAULT_MEMORY_LIMIT_MB = 512
+
+# 生成输出时每个单元格占用内存的上限：一块宽表的 float32 值（4 字节）和读入的记录（每条 12 字节），
+# 分块时每条记录连同排序所需的下标约 60 字节。转换为字符串和 Python 浮点数逐行进行，不随块大小增加
+BYTES_PER_CELL = 64
+
+# 溢出到磁盘的浓度记录：化合物编号、样品编号、浓度，三列分别保存
+SPILL_COLUMNS = {"feature": np.int32, "sample": np.int32, "value": CONCENTRATION_DTYPE}
+
+
+class ColumnStore:
+    """
+    只追加的磁盘列存储：每列一个二进制文件（<列名>.bin），追加时直接写到文件末尾，
+    读取时以内存映射方式按块读取，整个存储不需要同时载入内存。
+    """
+
+    def __init__(self, folder, columns=SPILL_COLUMNS):
+        self.folder = folder
+        self.columns = {name: np.dtype(dtype) for name, dtype in columns.items()}
+        self.length = 0
+        if not os.path.exists(folder):
+            os.makedirs(folder)
+
+    def _path(self, name):
+        return os.path.join(self.folder, f"{name}.bin")
+
+    def __len__(self):
+        return self.length
+
+    def append(self, **arrays):
+        """追加一批记录，各列长度须相同"""
+        lengths = {len(values) for values in arrays.values()}
+        if len(lengths) != 1 or set(arrays) != set(self.columns):
+            raise ValueError(f"须同时追加长度相同的 {', '.join(self.columns)} 列")
+        for name, values in arrays.items():
+            with open(self._path(name), "ab") as f:
+                f.write(np.ascontiguousarray(values, dtype=self.columns[name]).tobytes())
+        self.length += lengths.pop()
+
+    def read(self, start=0, stop=None):
+        """读取 [start, stop) 范围内的记录，返回 {列名: 数组}"""
+        stop = self.length if stop is None else min(stop, self.length)
+        if stop <= start:
+            return {name: np.empty(0, dtype) for name, dtype in self.columns.items()}
+        return {name: np.array(np.memmap(self._path(name), dtype=dtype, mode="r", shape=(self.length,))[start:stop])
+                for name, dtype in self.columns.items()}
+
+    def chunks(self, size):
+        """按块依次读取全部记录"""
+        for start in range(0, self.length, size):
+            yield self.read(start, start + size)
+
+
+class OutOfCoreMerger:
+    """
+    外存合并：逐个文件把 (化合物编号, 样品编号, 浓度) 写入磁盘列存储，内存中只保留每个化合物第一次出现时的信息。
+    全部文件读完后按“组分 RI”排序，把记录按化合物分块，每次只在内存中构建一块 化合物×样品 的宽表，
+    以只写模式逐行写入 Excel。内存占用由 memory_limit_mb 控制，与文件数无关。
+    """
+
+    def __init__(self, work_dir=None, memory_limit_mb=DEFAULT_MEMORY_LIMIT_MB, info_columns=COMPOUND_INFO_COLUMNS):
+        self.work_dir = tempfile.mkdtemp(prefix="gcms_merge_", dir=work_dir)
+        self.memory_limit = memory_limit_mb * 1024 * 1024
+        self.info_columns = info_columns
+        self.store = ColumnStore(os.path.join(self.work_dir, "spill"))
+        self.feature_index = {}
+        self.info_frames = []
+        self.samples = []
+
+    def add(self, df, key_column, concentration_column=None):
+        """
+        加入一个文件的精简表格（compact_frame 的结果，含 key_column）。
+        同一文件内 key 相同的行浓度相加；没有浓度列的文件只贡献化合物信息。
+        """
+        keys = df[key_column]
+        new = keys.map(self.feature_index).isna() & ~keys.duplicated()
+        if new.any():
+            added = df.loc[new, [c for c in self.info_columns if c in df.columns] + [key_column]]
+            for key in added[key_column]:
+                self.feature_index[key] = len(self.feature_index)
+            self.info_frames.append(added)
+        if concentration_column is None or concentration_column not in df.columns:
+            return
+        values = df.groupby(key_column, sort=False)[concentration_column].sum(min_count=1).dropna()
+        sample = len(self.samples)
+        self.samples.append(concentration_column)
+        self.store.append(feature=values.index.map(self.feature_index).to_numpy(dtype=np.int32),
+                          sample=np.full(len(values), sample, dtype=np.int32), value=values.to_numpy())
+
+    def compound_info(self, key_column):
+        """全部化合物的信息（每个化合物第一次出现时的一行），按“组分 RI”排序"""
+        info = pd.concat(self.info_frames, ignore_index=True) if self.info_frames else pd.DataFrame(
+            columns=self.info_columns + [key_column])
+        return info.sort_values(by="组分 RI").reset_index(drop=True)
+
+    def block_rows(self):
+        """每块包含的化合物数，使一块宽表及其转换所需的内存不超过上限"""
+        return max(1, int(self.memory_limit // (max(1, len(self.samples)) * BYTES_PER_CELL)))
+
+    def write_excel(self, output_file, key_column, drop_key=True, report=None):
+        """
+        按块生成宽表并写入 Excel（openpyxl 只写模式，逐行写出），缺失的浓度写为 "--"。
+        :return: 输出的化合物数
+        """
+        from openpyxl import Workbook
+
+        info = self.compound_info(key_column)
+        position = np.empty(len(self.feature_index), dtype=np.int64)
+        position[info[key_column].map(self.feature_index).to_numpy(dtype=np.int64)] = np.arange(len(info))
+        if drop_key:
+            info = info.drop(columns=[key_column])
+
+        # 把记录按输出位置分到各块，每块一个列存储
+        rows_per_block = self.block_rows()
+        buckets = {}
+        # 每条记录连同排序所需的下标不超过 BYTES_PER_CELL 字节
+        chunk_size = max(1, int(self.memory_limit // BYTES_PER_CELL))
+        for chunk in self.store.chunks(chunk_size):
+            row = position[chunk["feature"]]
+            block = row // rows_per_block
+            order = np.argsort(block, kind="stable")
+            block, row = block[order], row[order]
+            starts = np.flatnonzero(np.r_[True, block[1:] != block[:-1]])
+            for start, stop in zip(starts, np.r_[starts[1:], len(block)]):
+                b = int(block[start])
+                if b not in buckets:
+                    buckets[b] = ColumnStore(os.path.join(self.work_dir, f"block_{b}"))
+                picked = order[start:stop]
+                buckets[b].append(feature=row[start:stop] - b * rows_per_block, sample=chunk["sample"][picked],
+                                  value=chunk["value"][picked])
+
+        workbook = Workbook(write_only=True)
+        sheet = workbook.create_sheet()
+        sheet.append(info.columns.tolist() + self.samples)
+        for b, start in enumerate(range(0, len(info), rows_per_block)):
+            block_info = info.iloc[start:start + rows_per_block]
+            values = np.full((len(block_info), len(self.samples)), np.nan, dtype=CONCENTRATION_DTYPE)
+            if b in buckets:
+                records = buckets[b].read()
+                values[records["feature"], records["sample"]] = records["value"]
+            info_rows = block_info.astype(object).where(block_info.notna(), None).to_numpy().tolist()
+            for info_row, value_row in zip(info_rows, values):
+                # 与 export_excel 相同：float32 先按最短十进制表示还原，再把缺失值写为占位符；
+                # 逐行转换，字符串和 float64 副本只占一行的内存
+                value_row = value_row.astype(str).astype(np.float64).tolist()
+                sheet.append(info_row + [v if v == v else MISSING_PLACEHOLDER for v in value_row])
+            if report is not None:
+                report.count("blocks")
+        workbook.save(output_file)
+        return len(info)
+
+    def close(self):
+        """删除临时文件"""
+        shutil.rmtree(self.work_dir, ignore_errors=True)
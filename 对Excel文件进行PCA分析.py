@@ -1,17 +1,22 @@
 import pandas as pd
 import numpy as np
-from sklearn.decomposition import PCA
-from sklearn.preprocessing import StandardScaler
 import tkinter as tk
 from tkinter import filedialog, messagebox, Listbox, Scrollbar, Button, simpledialog
-import matplotlib.pyplot as plt
-from matplotlib import font_manager
 import os
+from 运行报告 import RunReport
+from 稀疏矩阵 import SparseFeatureMatrix, should_use_sparse, EXCEL_MAX_COLUMNS
+from 模型缓存 import cached_pca, cached_sparse_pca
+from 数据预处理 import preprocess, is_default, preprocessing_dialog
+from 样品分组 import grouping_dialog
+from 样品档案库 import read_table, read_columns, FILE_TYPES
 
 
-# 设置中文字体（解决中文显示问题）
-plt.rcParams['font.sans-serif'] = ['SimHei']
-plt.rcParams['axes.unicode_minus'] = False
+def pyplot():
+    """按需载入 matplotlib.pyplot 并设置中文字体（解决中文显示问题）；pyplot 载入较慢，只在作图时调用"""
+    import matplotlib.pyplot as plt
+    plt.rcParams['font.sans-serif'] = ['SimHei']
+    plt.rcParams['axes.unicode_minus'] = False
+    return plt
 
 
 def select_file():
@@ -20,7 +25,7 @@ def select_file():
     root.withdraw()
     file_path = filedialog.askopenfilename(
         title="选择Excel文件",
-        filetypes=[("Excel files", "*.xlsx"), ("All files", "*.*")]
+        filetypes=FILE_TYPES
     )
     if not file_path:
         messagebox.showerror("错误", "未选择文件，程序终止。")
@@ -28,9 +33,13 @@ def select_file():
     return file_path
 
 
-def load_data(file_path):
-    """加载Excel文件数据"""
-    data = pd.read_excel(file_path)
+def load_data(file_path, sample_columns=None, compound_column=None):
+    """
+    加载Excel文件数据，也可以是样品档案库（样品档案库.json）。
+    给出样本列和化合物列时只读取这两部分，档案库不载入其余样品。
+    """
+    columns = None if compound_column is None else [compound_column]
+    data = read_table(file_path, samples=sample_columns, columns=columns)
     return data
 
 
@@ -96,9 +105,25 @@ def save_transformed_file(data, original_file_path):
     return save_path
 
 
-def group_samples(sample_names):
+def group_samples(sample_names, data_file=None):
+    """
+    为样本分组：可从元数据 CSV、正则表达式规则或已保存的分组中得到，也可选择手动逐个输入
+    :param sample_names: 样本名称列表
+    :param data_file: 数据文件路径，分组保存在其所在文件夹中供下次使用
+    :return: 样本分组字典
+    """
+    root = tk.Tk()
+    root.withdraw()
+    groups = grouping_dialog(root, sample_names, data_file)
+    root.destroy()
+    if groups is None:
+        groups = enter_groups_manually(sample_names)
+    return groups
+
+
+def enter_groups_manually(sample_names):
     """
-    可视化界面让用户为样本分组
+    可视化界面让用户为每个样本手动输入分组
     :param sample_names: 样本名称列表
     :return: 样本分组字典
     """
@@ -144,37 +169,47 @@ def group_samples(sample_names):
     return groups
 
 
-def pca_analysis(data, n_components, groups=None):
-    """主成分分析 (PCA)"""
-    # 标准化数据
-    scaler = StandardScaler()
-    X_scaled = scaler.fit_transform(data.iloc[:, 1:])
-
-    # PCA分析
-    pca = PCA(n_components=n_components)
-    principal_components = pca.fit_transform(X_scaled)
+def pca_analysis(data, n_components, groups=None, preprocessing=None):
+    """
+    主成分分析 (PCA)
+    data 可以是 transform_data 得到的 DataFrame，也可以是 SparseFeatureMatrix（化合物很多且大多未检出时）。
+    preprocessing 为数据预处理选项（见 数据预处理.DEFAULT_OPTIONS），稀疏矩阵只支持默认预处理。
+    分解结果按数据和预处理设置缓存（见 模型缓存），只改变主成分数量时不重新计算。
+    """
+    if isinstance(data, SparseFeatureMatrix):
+        # 稀疏矩阵：隐式标准化 + 截断 SVD，不展开为稠密矩阵
+        sample_names = data.samples
+        principal_components, explained_variance = cached_sparse_pca(data, n_components)
+    else:
+        sample_names = data["样品"]
+        # 缺失值填充、归一化、变换和标度
+        X_scaled = preprocess(data.iloc[:, 1:], preprocessing)
+
+        # PCA分析
+        principal_components, explained_variance = cached_pca(X_scaled, n_components, preprocessing)
 
     # 将主成分添加到DataFrame中
-    pca_result = pd.DataFrame(principal_components, index=data["样品"],
+    pca_result = pd.DataFrame(principal_components, index=sample_names,
                               columns=[f"主成分 {i+1}" for i in range(n_components)])
 
     # 方差解释比例
-    explained_variance = pca.explained_variance_ratio_
     print("\n主成分的方差解释比例：")
     for i, variance in enumerate(explained_variance, start=1):
         print(f"主成分 {i}: {variance:.2%}")
 
     # 可视化
     if n_components >= 2:
+        plt = pyplot()
         plt.figure(figsize=(10, 8))
         colors = None
         if groups:
             unique_groups = list(set(groups.values()))
             group_colors = {group: plt.cm.tab10(i) for i, group in enumerate(unique_groups)}
-            colors = [group_colors[groups[sample]] for sample in data["样品"]]
+            # 未分组的样品显示为灰色
+            colors = [group_colors[groups[sample]] if sample in groups else "lightgrey" for sample in sample_names]
 
         plt.scatter(principal_components[:, 0], principal_components[:, 1], alpha=0.7, edgecolor='k', c=colors)
-        for i, sample in enumerate(data["样品"]):
+        for i, sample in enumerate(sample_names):
             plt.annotate(sample, (principal_components[i, 0], principal_components[i, 1]), fontsize=8)
         plt.title('PCA 主成分分析 (2D)')
         plt.xlabel('主成分 1')
@@ -189,29 +224,71 @@ def main():
     # 文件选择与加载
     print("请选择用于PCA分析的Excel文件...")
     file_path = select_file()
-    data = load_data(file_path)
+    report = RunReport("PCA分析")
+    # 先只读取列名，选好列后只加载选中的样本列和化合物列（档案库不载入其余样品）
+    columns = read_columns(file_path)
 
     # 选择样本列
     print("\n请选择样本列（多选，代表不同样本浓度列）：")
-    sample_columns = select_columns_gui(data.columns.tolist(), title="选择样本列", select_mode="multiple")
+    sample_columns = select_columns_gui(columns, title="选择样本列", select_mode="multiple")
 
     # 选择化合物列
     print("\n请选择化合物列（单选，代表化合物信息）：")
-    compound_column = select_columns_gui(data.columns.tolist(), title="选择化合物列", select_mode="single")[0]
-
-    # 数据格式转换
-    transformed_data = transform_data(data, sample_columns, compound_column)
-    save_transformed_file(transformed_data, file_path)
+    compound_column = select_columns_gui(columns, title="选择化合物列", select_mode="single")[0]
+
+    with report.stage("读取", file=os.path.basename(file_path), samples=len(sample_columns)) as stage:
+        data = load_data(file_path, sample_columns, compound_column)
+        stage["rows_in"] = len(data)
+
+    # 数据预处理设置（缺失值填充、归一化、变换、标度）
+    preprocessing = preprocessing_dialog()
+
+    # 数据格式转换：使用默认预处理、化合物很多且大多未检出时直接从合并表构建稀疏矩阵
+    with report.stage("转置") as stage:
+        if is_default(preprocessing) and should_use_sparse(data, sample_columns):
+            transformed_data = SparseFeatureMatrix.from_merged(data, sample_columns, compound_column)
+            sample_names = transformed_data.samples
+            stage["sparse_density"] = round(transformed_data.density, 4)
+            print(f"化合物较多且大多未检出（非零比例 {transformed_data.density:.1%}），使用稀疏矩阵进行分析。")
+        else:
+            transformed_data = transform_data(data, sample_columns, compound_column)
+            sample_names = transformed_data["样品"].tolist()
+        stage["rows_out"] = len(sample_names)
+        stage["features"] = len(data)
+
+    if not isinstance(transformed_data, SparseFeatureMatrix):
+        save_transformed_file(transformed_data, file_path)
+    elif len(data) < EXCEL_MAX_COLUMNS:
+        save_transformed_file(transformed_data.to_frame(), file_path)
+    else:
+        print(f"化合物数量超过 Excel 的列数上限 {EXCEL_MAX_COLUMNS}，不保存转换后的表格。")
 
     # 样本分组
     print("\n开始样本分组...")
-    sample_groups = group_samples(transformed_data["样品"].tolist())
+    sample_groups = group_samples(sample_names, file_path)
 
     # 用户选择主成分数量
     n_components = simpledialog.askinteger("主成分数", "请输入主成分数量 n_components（建议2或3）：", initialvalue=2)
 
-    # PCA分析
-    pca_result = pca_analysis(transformed_data, n_components, groups=sample_groups)
+    # PCA分析；换主成分数量时直接使用缓存的分解结果重新绘图
+    while n_components:
+        with report.stage("PCA", n_components=n_components, preprocessing=preprocessing) as stage:
+            pca_result = pca_analysis(transformed_data, n_components, groups=sample_groups,
+                                      preprocessing=preprocessing)
+            stage["rows_out"] = len(pca_result)
+        if not messagebox.askyesno("主成分数", "是否换一个主成分数量重新查看？"):
+            break
+        n_components = simpledialog.askinteger("主成分数", "请输入主成分数量 n_components：", initialvalue=n_components)
+
+    # 聚类热图（样品和化合物双向层次聚类），直接保存为图片
+    if not isinstance(transformed_data, SparseFeatureMatrix) and messagebox.askyesno("聚类热图", "是否绘制聚类热图？"):
+        from 聚类热图 import clustered_heatmap
+
+        with report.stage("聚类热图") as stage:
+            heatmap_file = os.path.splitext(file_path)[0] + "_聚类热图.png"
+            ordered = clustered_heatmap(transformed_data, heatmap_file)
+            stage["features"] = ordered.shape[1]
+    report.save(os.path.dirname(file_path))
 
 
 if __name__ == "__main__":
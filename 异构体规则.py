@@ -0,0 +1,112 @@
+import os
+import json
+import pandas as pd
+
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_RULES_PATH = os.path.join(SCRIPT_DIR, "异构体规则.json")
+
+# 默认规则：巨豆三烯酮同分异构体按组分 RI 从小到大标注为 巨豆三烯酮A、B、C…
+# convert:   转换时的处理方式，label 按 RI 顺序分别标注，merge 合并为一行（浓度相加），exclude 直接剔除
+# cas_merge: 按 CAS 编号合并多个文件时的处理方式，exclude 剔除，keep 保留
+DEFAULT_RULES = [
+    {"cas": "38818-55-2", "prefix": "巨豆三烯酮", "order_by": "组分 RI", "convert": "label", "cas_merge": "exclude"},
+]
+
+CONVERT_ACTIONS = {"label", "merge", "exclude"}
+CAS_MERGE_ACTIONS = {"exclude", "keep"}
+
+
+def load_rules(path=DEFAULT_RULES_PATH):
+    """
+    读取异构体规则表（JSON 列表，字段同 DEFAULT_RULES），文件不存在时使用默认规则。
+    """
+    if not path or not os.path.exists(path):
+        rules = [dict(rule) for rule in DEFAULT_RULES]
+    else:
+        with open(path, encoding="utf-8") as f:
+            rules = json.load(f)
+
+    for rule in rules:
+        rule["cas"] = str(rule["cas"]).strip()
+        rule.setdefault("prefix", rule["cas"])
+        rule.setdefault("order_by", "组分 RI")
+        rule.setdefault("convert", "label")
+        rule.setdefault("cas_merge", "exclude")
+        if rule["convert"] not in CONVERT_ACTIONS:
+            raise ValueError(f"异构体规则 {rule['cas']} 的 convert 必须是 {sorted(CONVERT_ACTIONS)} 之一")
+        if rule["cas_merge"] not in CAS_MERGE_ACTIONS:
+            raise ValueError(f"异构体规则 {rule['cas']} 的 cas_merge 必须是 {sorted(CAS_MERGE_ACTIONS)} 之一")
+    return rules
+
+
+def isomer_label(n):
+    """第 n 个（从 1 开始）异构体的字母标签：A…Z, AA, AB…，不受 26 个的限制"""
+    label = ""
+    while n > 0:
+        n, remainder = divmod(n - 1, 26)
+        label = chr(ord("A") + remainder) + label
+    return label
+
+
+def labeled_cas(rules):
+    """需要按名称区分的同分异构体 CAS 编号（convert 为 label 的规则）"""
+    return {rule["cas"] for rule in rules if rule["convert"] == "label"}
+
+
+def cas_merge_excluded(rules):
+    """按 CAS 编号合并时需要剔除的 CAS 编号"""
+    return {rule["cas"] for rule in rules if rule["cas_merge"] == "exclude"}
+
+
+def split_isomers(df, rules, cas_column="CAS 编号", name_column="用户定义的谱库化合物",
+                  concentration_column="估计的浓度."):
+    """
+    按规则表把同分异构体的行从 df 中分离出来，并一次性完成标注/合并/剔除。
+    只读取参数、不修改 df，可在多个线程或进程中同时处理不同文件。
+    :return: (其余行, 处理后的同分异构体行)
+    """
+    if not rules:
+        return df, df.iloc[0:0]
+
+    cas = df[cas_column].astype(str).str.strip()
+    rule_table = pd.DataFrame(rules).set_index("cas")
+    is_isomer = cas.isin(rule_table.index)
+    rest = df[~is_isomer]
+    isomers = df[is_isomer].copy()
+    if isomers.empty:
+        return rest, isomers
+
+    isomer_cas = cas[is_isomer]
+    actions = isomer_cas.map(rule_table["convert"])
+    isomers = isomers[actions != "exclude"]
+    isomer_cas = isomer_cas[actions != "exclude"]
+    actions = actions[actions != "exclude"]
+    if isomers.empty:
+        return rest, isomers
+
+    # 每组同分异构体内按排序列（默认组分 RI）排名，一次分组排名完成全部标注
+    order_by = isomer_cas.map(rule_table["order_by"])
+    order_values = pd.Series(0.0, index=isomers.index)
+    for column in order_by.unique():
+        if column in isomers.columns:
+            in_rule = order_by == column
+            order_values[in_rule] = pd.to_numeric(isomers.loc[in_rule, column], errors="coerce")
+    ranks = order_values.groupby(isomer_cas).rank(method="first", na_option="bottom").astype(int)
+    prefixes = isomer_cas.map(rule_table["prefix"])
+
+    labeled = actions == "label"
+    labels = ranks.map({rank: isomer_label(rank) for rank in ranks.unique()})
+    isomers.loc[labeled, name_column] = prefixes[labeled] + labels[labeled]
+
+    merged = actions == "merge"
+    if merged.any():
+        # 合并：保留排序最靠前的一行，浓度为整组之和
+        group_totals = isomers.loc[merged, concentration_column].groupby(isomer_cas[merged]).sum()
+        first_rows = isomers[merged & (ranks == 1)].copy()
+        first_rows[concentration_column] = isomer_cas[first_rows.index].map(group_totals).values
+        first_rows[name_column] = prefixes[first_rows.index].values
+        isomers = pd.concat([isomers[labeled], first_rows])
+
+    isomers = isomers.loc[order_values[isomers.index].sort_values(kind="stable").index]
+    return rest, isomers
@@ -0,0 +1,212 @@
+import os
+import sys
+import json
+import time
+import shutil
+import platform
+import argparse
+import tempfile
+import tracemalloc
+import importlib.util
+from datetime import datetime
+
+# 基准测试在无界面环境下运行，绘图只渲染不弹窗
+os.environ.setdefault("MPLBACKEND", "Agg")
+# 测量的是模型拟合本身，不使用也不写入模型缓存
+os.environ.setdefault("GCMS_MODEL_CACHE", "off")
+
+import pandas as pd
+
+from 模拟数据生成 import generate_dataset
+from 化合物注册表 import CompoundRegistry
+from 运行报告 import peak_rss_mb
+from 样品分组 import groups_from_regex
+from 异构体规则 import load_rules
+from 转换核心 import convert_file
+
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+RESULT_DIR = os.path.join(SCRIPT_DIR, "基准结果")
+
+# 预设的数据规模：(样品数, 每个样品的峰数)
+SIZES = {
+    "small": (10, 100),
+    "medium": (40, 300),
+    "large": (150, 600),
+    "merge500": (500, 300),
+}
+
+
+def load_script(file_name):
+    """按文件路径加载脚本模块（脚本文件名含空格和连字符，无法直接 import）"""
+    path = os.path.join(SCRIPT_DIR, file_name)
+    spec = importlib.util.spec_from_file_location(os.path.splitext(file_name)[0].replace(" ", "_"), path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def measure(func, *args, **kwargs):
+    """执行一次 func，返回结果、耗时（秒）与 Python 内存分配峰值（MB）"""
+    tracemalloc.start()
+    start = time.perf_counter()
+    try:
+        result = func(*args, **kwargs)
+    finally:
+        elapsed = time.perf_counter() - start
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+    return result, elapsed, peak / 1024 / 1024
+
+
+def run_size(size_name, n_samples, n_peaks, work_dir, repeat=1):
+    """对一个数据规模依次测试 转换 → 合并 → 转置 → PCA → OPLS-DA"""
+    cas_merger = load_script("按CAS编号合并excel中的浓度列.py")
+    name_merger = load_script("按中文名合并excel的浓度列.py")
+    pca_script = load_script("对Excel文件进行PCA分析.py")
+    opls_script = load_script("原始excel经转换后进行OPLS-DA分析 自设vip值.py")
+    import matplotlib.pyplot as plt
+    # 分析脚本在第一次拟合时才载入 sklearn 和 scipy.stats，这里预先载入，计时只包含计算本身
+    # （冷启动的载入时间用 python 启动器.py --importtime 测量）
+    import sklearn.cross_decomposition
+    import sklearn.preprocessing
+    import scipy.stats
+
+    csv_folder = os.path.join(work_dir, size_name, "csv")
+    xlsx_folder = os.path.join(work_dir, size_name, "xlsx")
+    generate_dataset(csv_folder, n_samples=n_samples, n_peaks=n_peaks)
+    csv_files = [os.path.join(csv_folder, f) for f in sorted(os.listdir(csv_folder))]
+
+    stages = {}
+
+    def record(stage, func, *args, **kwargs):
+        timings, peaks = [], []
+        result = None
+        for _ in range(repeat):
+            result, elapsed, peak = measure(func, *args, **kwargs)
+            timings.append(elapsed)
+            peaks.append(peak)
+        stages[stage] = {
+            "seconds": min(timings),
+            "python_peak_mb": max(peaks),
+            "peak_rss_mb": peak_rss_mb(),
+        }
+        print(f"[{size_name}] {stage}: {min(timings):.3f} s, 内存峰值 {max(peaks):.1f} MB")
+        return result
+
+    def convert_all():
+        if os.path.exists(xlsx_folder):
+            shutil.rmtree(xlsx_folder)
+        os.makedirs(xlsx_folder)
+        rules = load_rules()
+        for file_path in csv_files:
+            convert_file(file_path, xlsx_folder, rules, 10.0)
+
+    def merge_copy(merger, name, **kwargs):
+        # 每个合并脚本会把结果写回输入文件夹，为避免互相干扰各用一份副本
+        folder = os.path.join(work_dir, size_name, name)
+        if os.path.exists(folder):
+            shutil.rmtree(folder)
+        shutil.copytree(xlsx_folder, folder)
+        return merger.merge_excel_files_in_folder(folder, **kwargs)
+
+    record("转换", convert_all)
+    record("合并(按CAS)", merge_copy, cas_merger, "merge_cas")
+    # 使用只在内存中的化合物注册表，不改动用户的注册表文件
+    merged = record("合并(按中文名)", merge_copy, name_merger, "merge_name", registry=CompoundRegistry(path=None))
+
+    merged_mb = merged.memory_usage(deep=True).sum() / 1024 / 1024
+    print(f"[{size_name}] 合并结果占用内存 {merged_mb:.1f} MB")
+
+    # 未检出的化合物记为 0，供后续多元分析使用
+    sample_columns = [c for c in merged.columns if str(c).endswith("_浓度")]
+    merged[sample_columns] = merged[sample_columns].fillna(0).astype(float)
+
+    transformed = record("转置", pca_script.transform_data, merged, sample_columns, "用户定义的谱库化合物")
+    groups, _ = groups_from_regex(transformed["样品"].tolist())
+
+    record("PCA", pca_script.pca_analysis, transformed, 2, groups=groups)
+    plt.close("all")
+
+    reshaped = transformed.copy()
+    reshaped["分组"] = reshaped["样品"].map(groups)
+    record("OPLS-DA", opls_script.OPLSDA_GUI.opls_da_analysis, None, reshaped, 1.0, 2)
+    plt.close("all")
+
+    return {
+        "samples": n_samples,
+        "peaks": n_peaks,
+        "compounds": int(len(merged)),
+        "merged_mb": round(merged_mb, 2),
+        "stages": stages,
+    }
+
+
+def compare_results(current, baseline, tolerance=1.2):
+    """对比两次基准结果，返回耗时超过 tolerance 倍的阶段"""
+    regressions = []
+    for size_name, size_result in current["sizes"].items():
+        base_size = baseline.get("sizes", {}).get(size_name)
+        if not base_size:
+            continue
+        for stage, metrics in size_result["stages"].items():
+            base_metrics = base_size["stages"].get(stage)
+            if not base_metrics or not base_metrics["seconds"]:
+                continue
+            ratio = metrics["seconds"] / base_metrics["seconds"]
+            flag = "  <-- 变慢" if ratio > tolerance else ""
+            print(f"[{size_name}] {stage}: {base_metrics['seconds']:.3f} s -> {metrics['seconds']:.3f} s "
+                  f"({ratio:.2f}x){flag}")
+            if ratio > tolerance:
+                regressions.append((size_name, stage, ratio))
+    return regressions
+
+
+def run_benchmark(size_names, repeat=1, work_dir=None, output_file=None):
+    """运行基准测试并把结果保存为 JSON，返回结果字典"""
+    keep_work_dir = work_dir is not None
+    work_dir = work_dir or tempfile.mkdtemp(prefix="gcms_bench_")
+
+    results = {
+        "time": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "pandas": pd.__version__,
+        "platform": platform.platform(),
+        "sizes": {},
+    }
+    try:
+        for size_name in size_names:
+            n_samples, n_peaks = SIZES[size_name]
+            results["sizes"][size_name] = run_size(size_name, n_samples, n_peaks, work_dir, repeat=repeat)
+    finally:
+        if not keep_work_dir:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    if output_file is None:
+        if not os.path.exists(RESULT_DIR):
+            os.makedirs(RESULT_DIR)
+        output_file = os.path.join(RESULT_DIR, f"benchmark_{datetime.now():%Y%m%d_%H%M%S}.json")
+    with open(output_file, "w", encoding="utf-8") as f:
+        json.dump(results, f, ensure_ascii=False, indent=2)
+    print(f"基准测试结果已保存到: {output_file}")
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="GC-MS 数据处理流程的性能基准测试")
+    parser.add_argument("--sizes", default="small,medium", help=f"数据规模，逗号分隔，可选 {', '.join(SIZES)}")
+    parser.add_argument("--repeat", type=int, default=1, help="每个阶段重复次数，取最短耗时")
+    parser.add_argument("--work-dir", default=None, help="保留模拟数据与中间文件的文件夹，默认使用临时文件夹")
+    parser.add_argument("--output", default=None, help="结果 JSON 文件路径")
+    parser.add_argument("--compare", default=None, help="与之对比的历史结果 JSON 文件")
+    parser.add_argument("--tolerance", type=float, default=1.2, help="判定变慢的耗时倍数")
+    args = parser.parse_args()
+
+    current = run_benchmark(args.sizes.split(","), repeat=args.repeat, work_dir=args.work_dir,
+                            output_file=args.output)
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            baseline = json.load(f)
+        if compare_results(current, baseline, tolerance=args.tolerance):
+            sys.exit(1)
@@ -0,0 +1,156 @@
+import os
+from itertools import combinations
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pandas as pd
+from 稀疏矩阵 import SparseFeatureMatrix, column_scaling, sparse_pls_vip, vip_from_weights
+from 共享矩阵 import publish_matrix, attach_matrix
+
+
+# 批量对比方式，键为保存在设置中的值，值为界面上显示的名称
+CONTRAST_MODES = {"all": "全部分组一起", "pairs": "两两对比", "one_vs_rest": "一对其余"}
+
+
+def build_contrasts(groups, mode="pairs"):
+    """
+    根据样品分组字典生成要比较的对比。
+    :param groups: {样品名称: 分组}
+    :param mode: pairs 每两个分组比较一次（6 个分组 15 个模型），one_vs_rest 每个分组与其余全部样品比较
+    :return: [(对比名称, 对比组样品列表, 参照组样品列表)]
+    """
+    group_names = list(dict.fromkeys(groups.values()))
+    members = {group: [s for s, g in groups.items() if g == group] for group in group_names}
+    if mode == "pairs":
+        return [(f"{a} vs {b}", members[a], members[b]) for a, b in combinations(group_names, 2)]
+    if mode == "one_vs_rest":
+        return [(f"{a} vs 其余", members[a], [s for s, g in groups.items() if g != a]) for a in group_names]
+    raise ValueError(f"对比方式必须是 pairs 或 one_vs_rest，而不是 {mode!r}")
+
+
+def pls_fit(X_scaled, y, n_components):
+    """
+    拟合 PLS-DA 模型。X_scaled 已按所选的预处理标度（见 数据预处理.preprocess），拟合时不再自动标度，
+    否则 Pareto 和仅中心化都会被重新标度为单位方差，与自动标度的结果相同。
+    :return: (得分 T 样品×n_components, 权重 W 化合物×n_components)
+    """
+    # sklearn 载入约需 1 秒，只在拟合时载入
+    from sklearn.cross_decomposition import PLSRegression
+
+    pls = PLSRegression(n_components=n_components, scale=False)
+    pls.fit(X_scaled, y)
+    return pls.x_scores_, pls.x_weights_
+
+
+def pls_vip(X_scaled, y, n_components):
+    """
+    PLS-DA 模型的得分与 VIP 值（与 OPLS-DA 分析脚本的计算方式相同）。
+    :return: (得分 T 样品×n_components, 每个化合物的 VIP 值)
+    """
+    T, W = pls_fit(X_scaled, y, n_components)
+    return T, vip_from_weights(T, W)
+
+
+# 工作进程中的共享矩阵和各对比的行号、分组标签：进程启动时由 _init_worker 连接共享内存，之后每个对比只传序号
+_shared = {}
+
+
+def _init_worker(handle, meta):
+    _shared["blocks"], _shared["matrix"], arrays = attach_matrix(handle, meta)
+    _shared.update(arrays)
+
+
+def _task_arrays(tasks, matrix):
+    """
+    把各对比的行号和分组标签首尾相接，第 i 个对比为 offsets[i]:offsets[i + 1]。
+    稀疏矩阵另附整批样品各列的标准差：稠密矩阵已按整批样品标度，各对比的稀疏子矩阵也按同样的标准差标度
+    """
+    arrays = {
+        "rows": np.concatenate([rows for _, rows, _ in tasks]).astype(np.int64),
+        "labels": np.concatenate([y for _, _, y in tasks]),
+        "offsets": np.cumsum([0] + [len(rows) for _, rows, _ in tasks]),
+    }
+    if isinstance(matrix, SparseFeatureMatrix):
+        arrays["std"] = column_scaling(matrix.matrix)[1]
+    return arrays
+
+
+def _fit_contrast(task, n_components, state=None):
+    """
+    在矩阵的部分样品上拟合第 task 个对比的模型，返回 (得分 T, 权重 W)。
+    :param state: 矩阵和 _task_arrays 的各数组；为 None 时使用工作进程中连接的共享内存（_shared）
+    """
+    state = _shared if state is None else state
+    matrix = state["matrix"]
+    start, stop = state["offsets"][task], state["offsets"][task + 1]
+    rows, y = state["rows"][start:stop], state["labels"][start:stop]
+    if isinstance(matrix, SparseFeatureMatrix):
+        subset = SparseFeatureMatrix(matrix.matrix[rows], [matrix.samples[i] for i in rows], matrix.features)
+        T, W, _ = sparse_pls_vip(subset, y, n_components, std=state["std"])
+        return T, W
+    return pls_fit(matrix[rows], y, n_components)
+
+
+def run_contrasts(matrix, sample_names, compound_names, groups, n_components, mode="pairs", max_workers=None,
+                  cache=None, settings=None):
+    """
+    对同一个预处理后的矩阵批量拟合所有对比，各对比在进程池中并行计算。
+    矩阵和各对比的行号、分组标签只放入共享内存一次（见 共享矩阵.py），工作进程直接读取，不复制。
+    :param matrix: 预处理后的样品×化合物矩阵（numpy 数组）或 SparseFeatureMatrix
+    :param sample_names: 与矩阵行对应的样品名称
+    :param compound_names: 与矩阵列对应的化合物名称
+    :param groups: {样品名称: 分组}
+    :param cache: 可选的 模型缓存.ModelCache。给出时按 MAX_COMPONENTS 个成分拟合并缓存各对比的得分和权重，
+                  同一数据和预处理设置（settings）再次分析时，换主成分数或 VIP 阈值都无需重新拟合
+    :return: (VIP 汇总表 化合物×对比, {对比名称: (样品名称列表, 得分 T, 分组标签 y)})
+    """
+    index = {sample: i for i, sample in enumerate(sample_names)}
+    tasks = []
+    for name, case, control in build_contrasts(groups, mode):
+        rows = [index[s] for s in case + control if s in index]
+        y = np.array([1.0 if s in case else 0.0 for s in case + control if s in index])
+        if 0 < y.sum() < len(y):
+            tasks.append((name, rows, y))
+        else:
+            print(f"对比 {name} 缺少样品，已跳过。")
+    if not tasks:
+        return pd.DataFrame(index=pd.Index(compound_names, name="化合物名称")), {}
+
+    fits = None
+    n_fit = n_components
+    if cache is not None:
+        # 样品最少的对比决定可拟合的成分数上限
+        n_fit = cache.components(n_components, min(matrix.shape[1], min(len(rows) for _, rows, _ in tasks) - 1))
+        key = cache.key("contrasts", matrix, [(rows, y) for _, rows, y in tasks], settings)
+        model = cache.get(key)
+        if model is not None and model["T0"].shape[1] >= n_components:
+            fits = [(model[f"T{i}"], model[f"W{i}"]) for i in range(len(tasks))]
+
+    if fits is None:
+        max_workers = min(max_workers or os.cpu_count() or 1, len(tasks))
+        if max_workers <= 1:
+            # 在当前进程中直接使用矩阵，不经过模块级的 _shared，多个线程同时调用也互不影响
+            state = dict(_task_arrays(tasks, matrix), matrix=matrix)
+            fits = [_fit_contrast(i, n_fit, state) for i in range(len(tasks))]
+        else:
+            # 矩阵只复制一次到共享内存，工作进程直接读取；每个对比只传序号，与矩阵大小无关
+            shared, meta = publish_matrix(matrix, **_task_arrays(tasks, matrix))
+            with shared, ProcessPoolExecutor(max_workers=max_workers, initializer=_init_worker,
+                                             initargs=(shared.handle, meta)) as executor:
+                fits = list(executor.map(_fit_contrast, range(len(tasks)), [n_fit] * len(tasks)))
+        if cache is not None:
+            cache.put(key, {f"{name}{i}": array for i, fit in enumerate(fits) for name, array in zip("TW", fit)})
+
+    # 取前 n_components 个成分计算 VIP
+    results = [(T[:, :n_components], vip_from_weights(T[:, :n_components], W[:, :n_components])) for T, W in fits]
+    vip_table = pd.DataFrame({name: vip for (name, _, _), (_, vip) in zip(tasks, results)},
+                             index=pd.Index(compound_names, name="化合物名称"))
+    scores = {name: ([sample_names[i] for i in rows], T, y) for (name, rows, y), (T, _) in zip(tasks, results)}
+    return vip_table, scores
+
+
+def summarize_vip(vip_table, vip_threshold):
+    """在 VIP 汇总表后加上 VIP 超过阈值的对比数，并按该数目和最大 VIP 值排序"""
+    summary = vip_table.copy()
+    summary["VIP>阈值的对比数"] = (vip_table > vip_threshold).sum(axis=1)
+    summary["最大 VIP 值"] = vip_table.max(axis=1)
+    return summary.sort_values(["VIP>阈值的对比数", "最大 VIP 值"], ascending=False)
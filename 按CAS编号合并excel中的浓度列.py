@@ -1,8 +1,21 @@
 import pandas as pd
 import os
+from 运行报告 import RunReport
+from 异构体规则 import load_rules, cas_merge_excluded
+from 合并工具 import COMPOUND_INFO_COLUMNS, KeyInterner, compact_frame, export_excel, excel_engine, read_workbooks
+
+
+def merge_excel_files_in_folder(folder_path, report=None, max_workers=None):
+    """
+    按 CAS 编号合并文件夹中各 Excel 文件的浓度列。
+    未传入 report 时自动新建运行报告，并在合并完成后保存到该文件夹。
+    各文件在进程池中并行读取（max_workers 默认为 CPU 数），只读取合并需要的列。
+    """
+    own_report = report is None
+    report = report if report is not None else RunReport("按CAS合并")
+    # 同分异构体共用 CAS 编号，按异构体规则表剔除（默认剔除 38818-55-2 巨豆三烯酮）
+    excluded_cas = cas_merge_excluded(load_rules())
 
-
-def merge_excel_files_in_folder(folder_path):
     # 获取指定文件夹内所有的 .xlsx 文件路径，排除以 ~$ 开头的临时文件
     excel_files = [os.path.join(folder_path, f) for f in os.listdir(folder_path) if
                    f.endswith('.xlsx') and not f.startswith('~$')]
@@ -12,24 +25,33 @@ def merge_excel_files_in_folder(folder_path):
         return
 
     # 定义包含基本化合物信息的列
-    compound_info_columns = ["CAS 编号", "化合物名称", "用户定义的谱库化合物", "组分 RI", "谱库 RI", "谱库化合物描述"]
+    compound_info_columns = COMPOUND_INFO_COLUMNS
 
-    # 用于存放数据的列表
+    # 用于存放数据的列表，各文件的字符串共用同一个字符串池
     dfs = []
+    interner = KeyInterner()
 
-    # 遍历每个 Excel 文件，加载数据并重命名浓度列
-    for file_path in excel_files:
+    # 并行读取各 Excel 文件，按文件顺序逐个重命名浓度列
+    engine = excel_engine()
+    for file_path, df, read_seconds in read_workbooks(excel_files, max_workers=max_workers):
         # 获取文件名（不带扩展名）作为列的前缀
         file_name = os.path.splitext(os.path.basename(file_path))[0]
 
-        df = pd.read_excel(file_path)
+        # read_seconds 为解析文件本身的耗时（在读取的进程中测得），阶段的 seconds 只是读取后的精简处理
+        with report.stage("读取", file=os.path.basename(file_path), engine=engine) as stage:
+            stage["read_seconds"] = round(read_seconds, 4)
+            stage["rows_in"] = len(df)
 
-        # 如果 "估计的浓度." 列存在，则重命名；否则跳过该列
-        if "估计的浓度." in df.columns:
-            df = df.rename(columns={"估计的浓度.": f"{file_name}_浓度"})
+            # 如果 "估计的浓度." 列存在，则重命名；否则跳过该列
+            if "估计的浓度." in df.columns:
+                df = df.rename(columns={"估计的浓度.": f"{file_name}_浓度"})
 
-        # 过滤掉 CAS 编号 为 "38818-55-2" 的记录
-        df = df[df["CAS 编号"] != "38818-55-2"]
+            # 过滤掉同分异构体的记录
+            df = df[~df["CAS 编号"].astype(str).str.strip().isin(excluded_cas)]
+            # 只保留需要的列，浓度转为 float32
+            df = compact_frame(df, [f"{file_name}_浓度"], interner)
+            stage["rows_out"] = len(df)
+            stage.count("isomer_rows_dropped", stage["rows_in"] - len(df))
 
         # 将 DataFrame 添加到列表
         dfs.append(df)
@@ -42,39 +64,45 @@ def merge_excel_files_in_folder(folder_path):
         print(f"列 {first_concentration_column} 在第一个文件中不存在。请检查文件内容。")
         return
 
-    # 初始化合并的浓度数据
-    concentration_merged = dfs[0][["CAS 编号", first_concentration_column]]
-
-    # 逐个合并其余文件的浓度数据
-    for df, file_path in zip(dfs[1:], excel_files[1:]):
-        file_name = os.path.splitext(os.path.basename(file_path))[0]
-        concentration_column = f"{file_name}_浓度"
+    with report.stage("合并", files=len(dfs)) as stage:
+        stage["rows_in"] = sum(len(df) for df in dfs)
+        # 初始化合并的浓度数据
+        concentration_merged = dfs[0][["CAS 编号", first_concentration_column]]
 
-        # 检查当前文件的浓度列是否存在，避免 KeyError
-        if concentration_column in df.columns:
-            concentration_merged = pd.merge(concentration_merged,
-                                            df[["CAS 编号", concentration_column]],
-                                            on="CAS 编号", how="outer")
+        # 逐个合并其余文件的浓度数据
+        for df, file_path in zip(dfs[1:], excel_files[1:]):
+            file_name = os.path.splitext(os.path.basename(file_path))[0]
+            concentration_column = f"{file_name}_浓度"
 
-    concentration_merged = concentration_merged.fillna("--")
+            # 检查当前文件的浓度列是否存在，避免 KeyError
+            if concentration_column in df.columns:
+                concentration_merged = pd.merge(concentration_merged,
+                                                df[["CAS 编号", concentration_column]],
+                                                on="CAS 编号", how="outer")
 
-    # 最终合并化合物信息与浓度数据，按 CAS 编号 和 用户定义的谱库化合物 去重
-    compound_info_priority = pd.concat([df[compound_info_columns] for df in dfs],
-                                       axis=0).drop_duplicates(subset=["CAS 编号", "用户定义的谱库化合物"]).reset_index(
-        drop=True)
+        # 最终合并化合物信息与浓度数据，按 CAS 编号 和 用户定义的谱库化合物 去重
+        compound_info_priority = pd.concat([df[compound_info_columns] for df in dfs],
+                                           axis=0).drop_duplicates(subset=["CAS 编号", "用户定义的谱库化合物"]).reset_index(
+            drop=True)
 
-    final_merged_df = pd.merge(compound_info_priority, concentration_merged, on="CAS 编号", how="left")
+        final_merged_df = pd.merge(compound_info_priority, concentration_merged, on="CAS 编号", how="left")
 
-    # 根据“组分 RI”列进行排序
-    final_sorted_df = final_merged_df.sort_values(by="组分 RI").reset_index(drop=True)
+        # 根据“组分 RI”列进行排序
+        final_sorted_df = interner.categorize(final_merged_df.sort_values(by="组分 RI").reset_index(drop=True))
+        stage["rows_out"] = len(final_sorted_df)
 
     # 设置输出文件路径和文件名
     output_file = os.path.join(folder_path, "化合物合并处理数据_按RI排序_剔除巨豆三烯酮.xlsx")
-    final_sorted_df.to_excel(output_file, index=False)
+    concentration_columns = [c for c in final_sorted_df.columns if c not in compound_info_columns]
+    export_excel(final_sorted_df, output_file, concentration_columns)
 
     print(f"合并后的数据已成功保存到 {output_file}")
+    if own_report:
+        report.save(folder_path)
+    return final_sorted_df
 
 
 # 使用示例：指定文件夹路径
-folder_path = input("请输入包含 Excel 文件的文件夹路径：")
-merge_excel_files_in_folder(folder_path)
\ No newline at end of file
+if __name__ == "__main__":
+    folder_path = input("请输入包含 Excel 文件的文件夹路径：")
+    merge_excel_files_in_folder(folder_path)
@@ -2,6 +2,10 @@ import pandas as pd
 import os
 from tkinter import Tk
 from tkinter.filedialog import askdirectory
+from 运行报告 import RunReport
+from 化合物注册表 import CompoundRegistry
+from 合并工具 import COMPOUND_INFO_COLUMNS, KeyInterner, compact_frame, export_excel, excel_engine, read_workbooks
+from 外存合并 import OUT_OF_CORE_FILES, DEFAULT_MEMORY_LIMIT_MB, OutOfCoreMerger
 
 def select_folder():
     """
@@ -13,11 +17,20 @@ def select_folder():
     folder_path = askdirectory(title="请选择包含 Excel 文件的文件夹")
     return folder_path
 
-def merge_excel_files_in_folder(folder_path):
+def merge_excel_files_in_folder(folder_path, report=None, registry=None, max_workers=None, memory_limit_mb=None):
     """
     合并指定文件夹中的多个 Excel 文件，根据 "用户定义的谱库化合物" 进行去重处理，
     并保存排序后的结果为新的 Excel 文件。
+    化合物通过化合物注册表（registry）统一为化合物 ID 后再合并，未传入时使用默认的注册表文件。
+    未传入 report 时自动新建运行报告，并在合并完成后保存到该文件夹。
+    各文件在进程池中并行读取（max_workers 默认为 CPU 数），只读取合并需要的列。
+    指定 memory_limit_mb 或文件数超过 OUT_OF_CORE_FILES 时使用外存合并（见 外存合并.OutOfCoreMerger），
+    结果相同，但不返回合并后的表格，只返回输出文件路径。
     """
+    own_report = report is None
+    report = report if report is not None else RunReport("按中文名合并")
+    registry = registry if registry is not None else CompoundRegistry()
+
     # 获取指定文件夹内所有的 .xlsx 文件路径
     excel_files = [os.path.join(folder_path, f) for f in os.listdir(folder_path) if
                    f.endswith('.xlsx') and not f.startswith('~$')]
@@ -28,26 +41,38 @@ def merge_excel_files_in_folder(folder_path):
         print("指定的文件夹中没有找到任何有效的 Excel 文件。")
         return
 
+    if memory_limit_mb is not None or len(excel_files) > OUT_OF_CORE_FILES:
+        return _merge_out_of_core(folder_path, excel_files, report, registry, max_workers, memory_limit_mb,
+                                  own_report)
+
     # 定义包含基本化合物信息的列
-    compound_info_columns = ["CAS 编号", "化合物名称", "用户定义的谱库化合物", "组分 RI", "谱库 RI", "谱库化合物描述"]
+    compound_info_columns = COMPOUND_INFO_COLUMNS
 
+    # 各文件的字符串共用同一个字符串池
     dfs = []
+    interner = KeyInterner()
 
-    # 遍历每个 Excel 文件，加载数据并重命名浓度列
-    for file_path in excel_files:
+    # 并行读取各 Excel 文件，按文件顺序逐个重命名浓度列
+    engine = excel_engine()
+    for file_path, df, read_seconds in read_workbooks(excel_files, max_workers=max_workers):
         print(f"正在处理文件：{file_path}")
-        df = pd.read_excel(file_path)
+        # read_seconds 为解析文件本身的耗时（在读取的进程中测得），阶段的 seconds 只是读取后的处理
+        with report.stage("读取", file=os.path.basename(file_path), engine=engine) as stage:
+            stage["read_seconds"] = round(read_seconds, 4)
+            stage["rows_in"] = len(df)
 
         print("文件内容预览：")
         print(df.head())  # 打印文件的前几行，方便调试
 
         # 如果 "估计的浓度." 列存在，则重命名
+        concentration_column = f"{os.path.splitext(os.path.basename(file_path))[0]}_浓度"
         if "估计的浓度." in df.columns:
-            df = df.rename(columns={"估计的浓度.": f"{os.path.splitext(os.path.basename(file_path))[0]}_浓度"})
+            df = df.rename(columns={"估计的浓度.": concentration_column})
         else:
             print(f"警告：文件 {file_path} 中缺少 '估计的浓度.' 列，跳过重命名。")
 
-        dfs.append(df)
+        # 只保留需要的列，浓度转为 float32
+        dfs.append(compact_frame(df, [concentration_column], interner))
 
     # 确保 DataFrame 列表非空
     if not dfs:
@@ -62,39 +87,92 @@ def merge_excel_files_in_folder(folder_path):
         print(f"列 {first_concentration_column} 在第一个文件中不存在。请检查文件内容。")
         return
 
-    concentration_merged = dfs[0][["用户定义的谱库化合物", first_concentration_column]]
+    with report.stage("合并", files=len(dfs)) as stage:
+        stage["rows_in"] = sum(len(df) for df in dfs)
 
-    # 逐个合并其余文件的浓度数据
-    for df, file_path in zip(dfs[1:], excel_files[1:]):
-        file_name = os.path.splitext(os.path.basename(file_path))[0]
-        concentration_column = f"{file_name}_浓度"
+        # 通过化合物注册表把每一行映射到统一的化合物 ID，消除空格、全角字符和同义名造成的拆分
+        for df in dfs:
+            df["化合物ID"] = registry.assign_ids(df)
+        # 名称和 CAS 编号都为空的行无法识别化合物，不参与合并
+        stage.count("unidentified_rows", sum(int(df["化合物ID"].isna().sum()) for df in dfs))
+        dfs = [df[df["化合物ID"].notna()] for df in dfs]
 
-        # 检查当前文件的浓度列是否存在，避免 KeyError
-        if concentration_column in df.columns:
-            concentration_merged = pd.merge(concentration_merged,
-                                            df[["用户定义的谱库化合物", concentration_column]],
-                                            on="用户定义的谱库化合物", how="outer")
+        # 每个文件的浓度列以化合物 ID 为索引，按索引做一次哈希连接
+        concentration_columns = []
+        for df, file_path in zip(dfs, excel_files):
+            file_name = os.path.splitext(os.path.basename(file_path))[0]
+            concentration_column = f"{file_name}_浓度"
 
-    concentration_merged = concentration_merged.fillna("--")
+            # 检查当前文件的浓度列是否存在，避免 KeyError
+            if concentration_column in df.columns:
+                # 同一文件内映射到同一化合物的行（同义名）浓度相加
+                concentration_columns.append(
+                    df.groupby("化合物ID", sort=False)[concentration_column].sum(min_count=1))
 
-    # 合并化合物信息，并根据 "用户定义的谱库化合物" 去重处理
-    compound_info_priority = pd.concat([df[compound_info_columns] for df in dfs], axis=0)
-    compound_info_priority = (
-        compound_info_priority.sort_values(by=["用户定义的谱库化合物"], na_position="last")
-        .drop_duplicates(subset=["用户定义的谱库化合物"], keep="first")  # 根据 用户定义的谱库化合物 去重
-    )
+        concentration_merged = pd.concat(concentration_columns, axis=1)
 
-    # 最终合并化合物信息与浓度数据
-    final_merged_df = pd.merge(compound_info_priority, concentration_merged, on="用户定义的谱库化合物", how="left")
+        # 合并化合物信息，同一化合物 ID 保留最先出现的一行
+        compound_info_priority = (
+            pd.concat([df[compound_info_columns + ["化合物ID"]] for df in dfs], axis=0)
+            .drop_duplicates(subset=["化合物ID"], keep="first")
+        )
+        stage["compounds"] = len(compound_info_priority)
 
-    # 根据“组分 RI”列进行排序
-    final_sorted_df = final_merged_df.sort_values(by="组分 RI").reset_index(drop=True)
+        # 最终合并化合物信息与浓度数据
+        final_merged_df = compound_info_priority.join(concentration_merged, on="化合物ID").drop(columns=["化合物ID"])
+
+        # 根据“组分 RI”列进行排序
+        final_sorted_df = interner.categorize(final_merged_df.sort_values(by="组分 RI").reset_index(drop=True))
+        stage["rows_out"] = len(final_sorted_df)
 
     # 设置输出文件路径和文件名
     output_file = os.path.join(folder_path, "化合物合并处理数据_按RI排序_用户定义谱库化合物匹配.xlsx")
-    final_sorted_df.to_excel(output_file, index=False)
+    export_excel(final_sorted_df, output_file, concentration_merged.columns)
+
+    print(f"合并后的数据已成功保存到 {output_file}")
+    registry.save()
+    if own_report:
+        report.save(folder_path)
+    return final_sorted_df
+
+
+def _merge_out_of_core(folder_path, excel_files, report, registry, max_workers, memory_limit_mb, own_report):
+    """外存合并：各文件的浓度逐个写入磁盘，不同时保留所有文件的表格，输出时按化合物分块生成宽表"""
+    output_file = os.path.join(folder_path, "化合物合并处理数据_按RI排序_用户定义谱库化合物匹配.xlsx")
+    merger = OutOfCoreMerger(memory_limit_mb=memory_limit_mb or DEFAULT_MEMORY_LIMIT_MB)
+    interner = KeyInterner()
+    engine = excel_engine()
+    try:
+        with report.stage("读取", files=len(excel_files), engine=engine, out_of_core=True) as stage:
+            read_seconds_total = 0.0
+            for file_path, df, read_seconds in read_workbooks(excel_files, max_workers=max_workers):
+                read_seconds_total += read_seconds
+                stage.count("rows_in", len(df))
+                concentration_column = f"{os.path.splitext(os.path.basename(file_path))[0]}_浓度"
+                if "估计的浓度." in df.columns:
+                    df = df.rename(columns={"估计的浓度.": concentration_column})
+                else:
+                    print(f"警告：文件 {file_path} 中缺少 '估计的浓度.' 列，跳过重命名。")
+                df = compact_frame(df, [concentration_column], interner)
+                df["化合物ID"] = registry.assign_ids(df)
+                # 名称和 CAS 编号都为空的行无法识别化合物，不参与合并
+                stage.count("unidentified_rows", int(df["化合物ID"].isna().sum()))
+                merger.add(df[df["化合物ID"].notna()], "化合物ID", concentration_column)
+            # 各文件解析耗时之和（在读取的进程中测得，并行读取时可能大于阶段的 seconds）
+            stage["read_seconds"] = round(read_seconds_total, 4)
+            stage["compounds"] = len(merger.feature_index)
+            stage["spilled_values"] = len(merger.store)
+
+        with report.stage("写出", samples=len(merger.samples), rows_per_block=merger.block_rows()) as stage:
+            stage["rows_out"] = merger.write_excel(output_file, "化合物ID", report=stage)
+    finally:
+        merger.close()
 
     print(f"合并后的数据已成功保存到 {output_file}")
+    registry.save()
+    if own_report:
+        report.save(folder_path)
+    return output_file
 
 # 主程序运行入口
 if __name__ == "__main__":
@@ -0,0 +1,253 @@
+import numpy as np
+import pandas as pd
+
+
+# 多元分析前的预处理方法，键为保存在选项中的值，值为界面上显示的名称
+IMPUTE_METHODS = {"zero": "记为 0", "half_min": "最小值的一半", "lod": "检出限 (LOD)", "knn": "KNN 近邻", "median": "中位数"}
+NORMALIZE_METHODS = {"none": "不归一化", "total": "总峰面积", "internal_standard": "内标"}
+TRANSFORM_METHODS = {"none": "不变换", "log": "log10"}
+SCALING_METHODS = {"auto": "自动标度 (UV)", "pareto": "Pareto", "none": "仅中心化"}
+
+# KNN 填充时一次计算的 样品×近邻×化合物 单元格数上限（每个单元格约占 20 字节）
+KNN_BLOCK_CELLS = 1 << 20
+
+# 默认选项：未检出记为 0、自动标度，与原来的 StandardScaler 以及稀疏矩阵分析一致
+DEFAULT_OPTIONS = {
+    "impute": "zero",
+    "normalize": "none",
+    "transform": "none",
+    "scaling": "auto",
+    "internal_standard": None,  # 内标化合物名称
+    "lod": None,                # 检出限，缺失值记为该值
+    "knn_k": 5,
+}
+
+
+def resolve_options(options=None):
+    """在默认选项的基础上应用 options，并检查取值"""
+    resolved = dict(DEFAULT_OPTIONS)
+    resolved.update({k: v for k, v in (options or {}).items() if v is not None})
+    for key, methods in (("impute", IMPUTE_METHODS), ("normalize", NORMALIZE_METHODS),
+                         ("transform", TRANSFORM_METHODS), ("scaling", SCALING_METHODS)):
+        if resolved[key] not in methods:
+            raise ValueError(f"预处理选项 {key} 必须是 {list(methods)} 之一，而不是 {resolved[key]!r}")
+    if resolved["impute"] == "lod" and resolved["lod"] is None:
+        raise ValueError("使用检出限填充缺失值时必须给出 lod")
+    if resolved["normalize"] == "internal_standard" and not resolved["internal_standard"]:
+        raise ValueError("内标归一化时必须给出内标化合物名称")
+    return resolved
+
+
+def is_default(options):
+    """是否为默认预处理（未检出记为 0、不归一化、不变换、自动标度），此时可以使用稀疏矩阵分析"""
+    options = resolve_options(options)
+    return all(options[key] == DEFAULT_OPTIONS[key] for key in ("impute", "normalize", "transform", "scaling"))
+
+
+def to_matrix(data):
+    """把浓度表（DataFrame 或数组）转为 float64 矩阵，"--" 等无法解析的值记为 NaN"""
+    if isinstance(data, pd.DataFrame):
+        # 全部为数值列时直接转换，只有含 "--" 等文本的列才逐列解析
+        if all(pd.api.types.is_numeric_dtype(dtype) for dtype in data.dtypes):
+            return data.to_numpy(dtype=np.float64)
+        return data.apply(pd.to_numeric, errors="coerce").to_numpy(dtype=np.float64)
+    return np.asarray(data, dtype=np.float64)
+
+
+def impute_half_min(X):
+    """缺失值记为该化合物最小检出浓度的一半，整列缺失时使用整个矩阵最小值的一半"""
+    positive = np.where(X > 0, X, np.nan)
+    with np.errstate(all="ignore"):
+        column_min = np.nanmin(positive, axis=0) if X.size else np.array([])
+    overall = np.nanmin(positive) if np.isfinite(positive).any() else 0.0
+    fill = np.where(np.isnan(column_min), overall, column_min) / 2
+    return np.where(np.isnan(X), fill, X)
+
+
+def impute_lod(X, lod):
+    """缺失值记为检出限（标量，或每个化合物一个值）"""
+    return np.where(np.isnan(X), np.broadcast_to(np.asarray(lod, dtype=np.float64), X.shape[1:]), X)
+
+
+def impute_median(X):
+    """缺失值记为该化合物的中位数，整列缺失时记为 0"""
+    with np.errstate(all="ignore"):
+        median = np.nanmedian(X, axis=0) if len(X) else np.zeros(X.shape[1])
+    return np.where(np.isnan(X), np.nan_to_num(median), X)
+
+
+def impute_knn(X, k=5):
+    """
+    KNN 填充（与 sklearn 的 KNNImputer 默认设置相同）：样品间按共同检出的化合物计算欧氏距离（nan_euclidean），
+    缺失值取 k 个最近且检出该化合物的样品的均值；没有这样的样品时使用该化合物检出值的均值，整列缺失时记为 0。
+    需要填充的样品按块一起计算，每块的 样品×近邻×化合物 单元格数不超过 KNN_BLOCK_CELLS。
+    """
+    observed = ~np.isnan(X)
+    if observed.all():
+        return X.copy()
+    n, p = X.shape
+    X0 = np.where(observed, X, 0.0)
+    M = observed.astype(np.float64)
+    squares = X0 ** 2
+
+    # 只在两个样品都检出的化合物上求平方距离，再按共同检出的比例放大
+    distance = squares @ M.T + M @ squares.T - 2 * X0 @ X0.T
+    common = M @ M.T
+    with np.errstate(divide="ignore", invalid="ignore"):
+        distance = np.maximum(distance, 0) * p / common
+    distance[common == 0] = np.inf
+    np.fill_diagonal(distance, np.inf)
+    order = np.argsort(distance, axis=1, kind="stable")
+    reachable = np.isfinite(np.take_along_axis(distance, order, axis=1))
+
+    detected = observed.sum(axis=0)
+    column_mean = np.divide(X0.sum(axis=0), detected, out=np.zeros(p), where=detected > 0)
+    result = np.where(observed, X, column_mean)
+    rows = np.flatnonzero(~observed.all(axis=1))
+    block = max(1, KNN_BLOCK_CELLS // max(1, n * p))
+    for start in range(0, len(rows), block):
+        receivers = rows[start:start + block]
+        neighbors = order[receivers]
+        # 按距离从近到远排列的近邻是否检出各化合物（距离无穷大的样品不算近邻），每个化合物只取前 k 个
+        neighbor_observed = observed[neighbors] & reachable[receivers][:, :, None]
+        take = neighbor_observed & (np.cumsum(neighbor_observed, axis=1, dtype=np.int32) <= k)
+        counts = take.sum(axis=1)
+        with np.errstate(invalid="ignore"):
+            means = np.einsum("rnp,rnp->rp", take, X0[neighbors]) / counts
+        fill = ~observed[receivers] & (counts > 0)
+        result[receivers[:, None], np.arange(p)] = np.where(fill, means, result[receivers])
+    return result
+
+
+def normalize_total(X):
+    """总峰面积归一化：每个样品除以其浓度总和，结果为相对含量（%）"""
+    totals = X.sum(axis=1, keepdims=True)
+    return X / np.where(totals == 0, 1, totals) * 100
+
+
+def normalize_internal_standard(X, index):
+    """内标归一化：每个样品除以其内标化合物（第 index 列）的浓度"""
+    reference = X[:, [index]]
+    if (reference <= 0).any():
+        raise ValueError("部分样品中内标化合物未检出，无法进行内标归一化")
+    return X / reference
+
+
+def log_transform(X):
+    """log10 变换，0 和负值先替换为矩阵中最小正值的一半"""
+    positive = X[X > 0]
+    floor = positive.min() / 2 if positive.size else 1.0
+    return np.log10(np.where(X > 0, X, floor))
+
+
+def autoscale(X):
+    """自动标度：中心化后除以标准差（ddof=0，与 StandardScaler 一致），常数列结果为 0"""
+    std = X.std(axis=0)
+    return (X - X.mean(axis=0)) / np.where(std == 0, 1, std)
+
+
+def pareto_scale(X):
+    """Pareto 标度：中心化后除以标准差的平方根"""
+    std = X.std(axis=0)
+    return (X - X.mean(axis=0)) / np.sqrt(np.where(std == 0, 1, std))
+
+
+def preprocess(data, options=None, features=None):
+    """
+    预处理流程：缺失值填充 → 归一化 → 变换 → 标度，每一步都是整个矩阵的向量化运算。
+    :param data: 样品×化合物的浓度表（DataFrame 或数组），"--" 和空值视为缺失
+    :param options: 预处理选项，未给出的键使用 DEFAULT_OPTIONS
+    :param features: 化合物名称列表，内标归一化时用于查找内标所在的列
+    :return: 预处理后的 float64 矩阵
+    """
+    options = resolve_options(options)
+    if features is None and isinstance(data, pd.DataFrame):
+        features = data.columns.tolist()
+    X = to_matrix(data)
+
+    impute = options["impute"]
+    if impute == "zero":
+        X = np.nan_to_num(X, nan=0.0)
+    elif impute == "half_min":
+        X = impute_half_min(X)
+    elif impute == "lod":
+        X = impute_lod(X, options["lod"])
+    elif impute == "knn":
+        X = impute_knn(X, int(options["knn_k"]))
+    elif impute == "median":
+        X = impute_median(X)
+
+    if options["normalize"] == "total":
+        X = normalize_total(X)
+    elif options["normalize"] == "internal_standard":
+        name = options["internal_standard"]
+        if features is None or name not in list(features):
+            raise ValueError(f"找不到内标化合物：{name}")
+        X = normalize_internal_standard(X, list(features).index(name))
+
+    if options["transform"] == "log":
+        X = log_transform(X)
+
+    if options["scaling"] == "auto":
+        X = autoscale(X)
+    elif options["scaling"] == "pareto":
+        X = pareto_scale(X)
+    return X
+
+
+def preprocessing_dialog(master=None, options=None):
+    """
+    弹出预处理设置窗口，返回选择的选项字典；关闭窗口时返回原选项。
+    master 为 None 时新建一个隐藏的主窗口。
+    """
+    import tkinter as tk
+    from tkinter import messagebox
+
+    options = resolve_options(options)
+    own_root = master is None
+    if own_root:
+        master = tk.Tk()
+        master.withdraw()
+
+    window = tk.Toplevel(master)
+    window.title("数据预处理设置")
+    result = {"options": options}
+    variables = {}
+
+    rows = (("impute", "缺失值填充：", IMPUTE_METHODS), ("normalize", "归一化：", NORMALIZE_METHODS),
+            ("transform", "数据变换：", TRANSFORM_METHODS), ("scaling", "标度：", SCALING_METHODS))
+    for row, (key, text, methods) in enumerate(rows):
+        tk.Label(window, text=text).grid(row=row, column=0, padx=5, pady=5, sticky="w")
+        labels = list(methods.values())
+        variables[key] = tk.StringVar(window, value=methods[options[key]])
+        tk.OptionMenu(window, variables[key], *labels).grid(row=row, column=1, padx=5, pady=5, sticky="w")
+
+    entries = {}
+    for row, (key, text) in enumerate((("internal_standard", "内标化合物名称："), ("lod", "检出限 LOD："),
+                                       ("knn_k", "KNN 近邻数 k：")), start=len(rows)):
+        tk.Label(window, text=text).grid(row=row, column=0, padx=5, pady=5, sticky="w")
+        entries[key] = tk.Entry(window, width=25)
+        entries[key].grid(row=row, column=1, padx=5, pady=5, sticky="w")
+        if options[key] is not None:
+            entries[key].insert(0, str(options[key]))
+
+    def confirm():
+        chosen = {}
+        for key, _, methods in rows:
+            chosen[key] = next(k for k, label in methods.items() if label == variables[key].get())
+        try:
+            chosen["internal_standard"] = entries["internal_standard"].get().strip() or None
+            chosen["lod"] = float(entries["lod"].get()) if entries["lod"].get().strip() else None
+            chosen["knn_k"] = int(entries["knn_k"].get() or DEFAULT_OPTIONS["knn_k"])
+            result["options"] = resolve_options(chosen)
+        except ValueError as e:
+            messagebox.showerror("错误", f"预处理设置有误：{e}", parent=window)
+            return
+        window.destroy()
+
+    tk.Button(window, text="确定", command=confirm).grid(row=len(rows) + 3, column=0, columnspan=2, pady=10)
+    window.grab_set()
+    master.wait_window(window)
+    if own_root:
+        master.destroy()
+    return result["options"]
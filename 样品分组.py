@@ -0,0 +1,202 @@
+import os
+import re
+import json
+import pandas as pd
+
+
+# 默认的分组规则：样品列名形如 A-1_浓度、产地2-15_浓度 时，取 "-" 前面的部分作为分组
+DEFAULT_PATTERN = r"^(\w+)-\d+_浓度$"
+
+# 保存分组的文件名，放在数据文件所在的文件夹中，PCA、OPLS-DA 和批量对比共用
+GROUPING_FILE_NAME = "样品分组.json"
+
+
+def grouping_path(data_file):
+    """数据文件对应的分组文件路径（同一文件夹下的 样品分组.json）"""
+    return os.path.join(os.path.dirname(os.path.abspath(data_file)), GROUPING_FILE_NAME)
+
+
+def strip_suffix(sample):
+    """去掉合并表中浓度列的 "_浓度" 后缀，得到原始样品名称"""
+    sample = str(sample)
+    return sample[:-len("_浓度")] if sample.endswith("_浓度") else sample
+
+
+def groups_from_regex(samples, pattern=DEFAULT_PATTERN):
+    """
+    用正则表达式从样品名称中提取分组，整列一次匹配。
+    有名为 group 的捕获组时取该组，否则取第一个捕获组，没有捕获组时取整个匹配。
+    :return: ({样品名称: 分组}, 未匹配的样品列表)
+    """
+    compiled = re.compile(pattern)
+    names = pd.Series([str(s) for s in samples], dtype=object)
+    if compiled.groups == 0:
+        extracted = names.str.extract(f"({pattern})", expand=True)[0]
+    else:
+        extracted = names.str.extract(compiled, expand=True)
+        extracted = extracted["group"] if "group" in compiled.groupindex else extracted.iloc[:, 0]
+    matched = extracted.notna()
+    groups = dict(zip([s for s, m in zip(samples, matched) if m], extracted[matched]))
+    unmatched = [s for s, m in zip(samples, matched) if not m]
+    return groups, unmatched
+
+
+def read_metadata(csv_path):
+    """读取样品元数据 CSV（先按 UTF-8 读取，失败时按 GBK 读取）"""
+    try:
+        return pd.read_csv(csv_path, encoding="utf-8-sig", dtype=str)
+    except UnicodeDecodeError:
+        return pd.read_csv(csv_path, encoding="gbk", dtype=str)
+
+
+def groups_from_metadata(samples, metadata, sample_column=None, group_column=None):
+    """
+    按样品元数据表为样品分组。元数据中的样品名称既可以是列名本身（A-1_浓度），
+    也可以是去掉 "_浓度" 后缀的名称（A-1）。
+    :param metadata: 元数据 DataFrame 或 CSV 文件路径
+    :param sample_column: 样品名称所在列，默认为“样品”列，没有时为第一列
+    :param group_column: 分组所在列，默认为“分组”列，没有时为第二列
+    :return: ({样品名称: 分组}, 未匹配的样品列表)
+    """
+    if not isinstance(metadata, pd.DataFrame):
+        metadata = read_metadata(metadata)
+    columns = metadata.columns.tolist()
+    sample_column = sample_column or ("样品" if "样品" in columns else columns[0])
+    group_column = group_column or ("分组" if "分组" in columns else columns[1])
+
+    table = metadata[[sample_column, group_column]].dropna()
+    lookup = dict(zip(table[sample_column].str.strip(), table[group_column].str.strip()))
+    groups, unmatched = {}, []
+    for sample in samples:
+        group = lookup.get(str(sample), lookup.get(strip_suffix(sample)))
+        if group is None:
+            unmatched.append(sample)
+        else:
+            groups[sample] = group
+    return groups, unmatched
+
+
+def save_grouping(groups, path):
+    """
+    保存分组（JSON：{样品名称: 分组}）。文件已存在时合并到其中：本次的样品更新为新的分组，
+    文件中其他样品的分组保留，同一文件夹下不同数据文件的分组不会互相覆盖。
+    """
+    saved = {}
+    if os.path.exists(path):
+        with open(path, encoding="utf-8") as f:
+            saved = json.load(f)
+    saved.update(groups)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(saved, f, ensure_ascii=False, indent=1)
+
+
+def load_grouping(path, samples=None):
+    """
+    读取保存的分组。给出 samples 时只返回这些样品的分组，并同样按去掉 "_浓度" 后缀的名称匹配。
+    :return: ({样品名称: 分组}, 未匹配的样品列表)
+    """
+    with open(path, encoding="utf-8") as f:
+        saved = json.load(f)
+    if samples is None:
+        return saved, []
+    stripped = {strip_suffix(k): v for k, v in saved.items()}
+    groups, unmatched = {}, []
+    for sample in samples:
+        group = saved.get(sample, stripped.get(strip_suffix(sample)))
+        if group is None:
+            unmatched.append(sample)
+        else:
+            groups[sample] = group
+    return groups, unmatched
+
+
+def summarize_groups(groups):
+    """每个分组的样品数，用于确认分组是否正确"""
+    counts = pd.Series(list(groups.values()), dtype=object).value_counts(sort=False)
+    return ", ".join(f"{group}: {n}" for group, n in counts.items())
+
+
+def grouping_dialog(master, samples, data_file=None):
+    """
+    样品分组窗口：可从元数据 CSV 导入、按正则表达式提取、载入已保存的分组，或选择手动逐个输入。
+    确认后分组保存到数据文件夹下的 样品分组.json，下次分析可直接载入。
+    :return: {样品名称: 分组}；选择手动输入时返回 None，由调用方弹出逐个输入的窗口
+    """
+    import tkinter as tk
+    from tkinter import filedialog, messagebox
+
+    window = tk.Toplevel(master)
+    window.title("样品分组")
+    saved_path = grouping_path(data_file) if data_file else None
+    result = {"groups": {}}
+    state = {"groups": {}, "unmatched": list(samples)}
+
+    status = tk.Label(window, text=f"共 {len(samples)} 个样品，尚未分组", justify="left", wraplength=420)
+
+    def show(groups, unmatched):
+        state["groups"], state["unmatched"] = groups, unmatched
+        text = f"已分组 {len(groups)} 个样品（{summarize_groups(groups)}）"
+        if unmatched:
+            preview = "、".join(str(s) for s in unmatched[:5])
+            text += f"\n未匹配 {len(unmatched)} 个：{preview}{'…' if len(unmatched) > 5 else ''}"
+        status.config(text=text)
+
+    def from_regex():
+        try:
+            show(*groups_from_regex(samples, pattern_entry.get().strip()))
+        except re.error as e:
+            messagebox.showerror("错误", f"正则表达式有误：{e}", parent=window)
+
+    def from_metadata():
+        path = filedialog.askopenfilename(parent=window, title="选择样品元数据 CSV",
+                                          filetypes=[("CSV 文件", "*.csv"), ("所有文件", "*.*")])
+        if path:
+            try:
+                show(*groups_from_metadata(samples, path))
+            except (IndexError, KeyError, ValueError) as e:
+                messagebox.showerror("错误", f"无法读取元数据：{e}", parent=window)
+
+    def from_saved():
+        path = saved_path if saved_path and os.path.exists(saved_path) else filedialog.askopenfilename(
+            parent=window, title="选择保存的分组", filetypes=[("JSON 文件", "*.json")])
+        if path:
+            show(*load_grouping(path, samples))
+
+    def manual():
+        result["groups"] = None
+        window.destroy()
+
+    def confirm():
+        if not state["groups"]:
+            messagebox.showwarning("警告", "还没有为任何样品分组！", parent=window)
+            return
+        if state["unmatched"] and not messagebox.askyesno(
+                "确认", f"有 {len(state['unmatched'])} 个样品未分组，这些样品将不参与分组着色/建模。是否继续？",
+                parent=window):
+            return
+        if saved_path:
+            save_grouping(state["groups"], saved_path)
+            print(f"样品分组已保存到: {saved_path}")
+        result["groups"] = state["groups"]
+        window.destroy()
+
+    tk.Label(window, text="正则表达式（第一个捕获组为分组）：").grid(row=0, column=0, columnspan=2, padx=5, pady=5, sticky="w")
+    pattern_entry = tk.Entry(window, width=40)
+    pattern_entry.insert(0, DEFAULT_PATTERN)
+    pattern_entry.grid(row=1, column=0, padx=5, pady=5, sticky="w")
+    tk.Button(window, text="按规则分组", command=from_regex).grid(row=1, column=1, padx=5, pady=5)
+    tk.Button(window, text="从元数据 CSV 导入", command=from_metadata).grid(row=2, column=0, padx=5, pady=5, sticky="w")
+    tk.Button(window, text="载入已保存的分组", command=from_saved).grid(row=2, column=1, padx=5, pady=5)
+    status.grid(row=3, column=0, columnspan=2, padx=5, pady=10, sticky="w")
+    tk.Button(window, text="手动逐个输入", command=manual).grid(row=4, column=0, padx=5, pady=10, sticky="w")
+    tk.Button(window, text="确认分组", command=confirm).grid(row=4, column=1, padx=5, pady=10)
+
+    # 已有保存的分组时直接载入，否则先按默认规则尝试
+    if saved_path and os.path.exists(saved_path):
+        show(*load_grouping(saved_path, samples))
+    else:
+        show(*groups_from_regex(samples))
+
+    window.grab_set()
+    master.wait_window(window)
+    return result["groups"]
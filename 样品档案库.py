@@ -0,0 +1,221 @@
+import os
+import json
+import argparse
+from datetime import datetime
+import numpy as np
+import pandas as pd
+
+
+MANIFEST_NAME = "样品档案库.json"
+ARCHIVE_DTYPE = np.float32
+
+
+class SampleArchive:
+    """
+    长期样品档案库：只追加的内存映射数值存储，用于跨批次的多元分析。
+    文件夹结构：
+        样品档案库.json   基本信息（对齐化合物所用的列）
+        features.csv      化合物索引（全局编号、化合物名称及 CAS 编号等信息）
+        samples.csv       样品元数据（样品名称、所在数据块和行号、来源文件、加入时间）
+        chunks/0001.npy   每次追加的一批样品（样品×化合物，float32，未检出为 NaN）
+        chunks/0001_features.npy  该数据块各列对应的全局化合物编号
+    读取时各数据块以 np.load(mmap_mode="r") 打开，只读取选中样品和化合物所在的行，不载入整个档案库。
+    """
+
+    def __init__(self, folder, key_column="用户定义的谱库化合物"):
+        self.folder = folder
+        self.manifest_path = os.path.join(folder, MANIFEST_NAME)
+        self.chunk_folder = os.path.join(folder, "chunks")
+        if os.path.exists(self.manifest_path):
+            with open(self.manifest_path, encoding="utf-8") as f:
+                self.manifest = json.load(f)
+            self.features = pd.read_csv(os.path.join(folder, "features.csv"), encoding="utf-8", dtype={"CAS 编号": str})
+            self.samples = pd.read_csv(os.path.join(folder, "samples.csv"), encoding="utf-8")
+        else:
+            self.manifest = {"key_column": key_column, "dtype": np.dtype(ARCHIVE_DTYPE).name,
+                             "created": datetime.now().isoformat(timespec="seconds")}
+            self.features = pd.DataFrame(columns=[key_column, "CAS 编号", "组分 RI"])
+            self.samples = pd.DataFrame(columns=["样品", "chunk", "row", "来源文件", "加入时间"])
+        self._chunks = {}
+
+    @property
+    def key_column(self):
+        return self.manifest["key_column"]
+
+    @property
+    def shape(self):
+        return len(self.samples), len(self.features)
+
+    def _chunk_path(self, chunk):
+        return os.path.join(self.chunk_folder, f"{int(chunk):04d}.npy")
+
+    def chunk(self, chunk):
+        """以内存映射方式打开一个数据块，返回 (数据, 各列的全局化合物编号)"""
+        if chunk not in self._chunks:
+            values = np.load(self._chunk_path(chunk), mmap_mode="r")
+            feature_ids = np.load(self._chunk_path(chunk).replace(".npy", "_features.npy"))
+            self._chunks[chunk] = (values, feature_ids)
+        return self._chunks[chunk]
+
+    def append(self, merged, sample_columns, source=None):
+        """
+        把合并表（每行一个化合物、每个样品一列浓度）中的样品追加到档案库，作为一个新的数据块。
+        化合物按 key_column 与已有的化合物索引对齐，新化合物追加到索引末尾。
+        已存在的样品名称不能重复追加。
+        :return: 追加的样品数
+        """
+        duplicated = set(sample_columns) & set(self.samples["样品"])
+        if duplicated:
+            raise ValueError(f"档案库中已有这些样品：{', '.join(sorted(map(str, duplicated))[:5])} 等 {len(duplicated)} 个")
+        keys = merged[self.key_column].astype(str)
+        if keys.duplicated().any():
+            raise ValueError(f"合并表中 {self.key_column} 列有重复值，无法对齐化合物")
+
+        # 对齐化合物：已有的取原编号，新的化合物追加到索引末尾
+        index = pd.Index(self.features[self.key_column].astype(str))
+        feature_ids = index.get_indexer(keys)
+        new = feature_ids < 0
+        if new.any():
+            info_columns = [c for c in self.features.columns if c in merged.columns]
+            added = merged.iloc[np.flatnonzero(new)][info_columns].copy()
+            added[self.key_column] = keys[new].values
+            feature_ids[new] = np.arange(len(self.features), len(self.features) + new.sum())
+            self.features = pd.concat([self.features, added], ignore_index=True)
+
+        values = merged[sample_columns].apply(pd.to_numeric, errors="coerce").to_numpy(dtype=ARCHIVE_DTYPE).T
+        chunk = int(self.samples["chunk"].max()) + 1 if len(self.samples) else 1
+        if not os.path.exists(self.chunk_folder):
+            os.makedirs(self.chunk_folder)
+        np.save(self._chunk_path(chunk), np.ascontiguousarray(values))
+        np.save(self._chunk_path(chunk).replace(".npy", "_features.npy"), feature_ids.astype(np.int32))
+
+        added_samples = pd.DataFrame({
+            "样品": list(sample_columns),
+            "chunk": chunk,
+            "row": np.arange(len(sample_columns)),
+            "来源文件": os.path.basename(source) if source else "",
+            "加入时间": datetime.now().isoformat(timespec="seconds"),
+        })
+        self.samples = pd.concat([self.samples, added_samples], ignore_index=True)
+        self.save()
+        return len(sample_columns)
+
+    def save(self):
+        """保存索引和元数据（数据块在追加时已写入）"""
+        if not os.path.exists(self.folder):
+            os.makedirs(self.folder)
+        with open(self.manifest_path, "w", encoding="utf-8") as f:
+            json.dump(self.manifest, f, ensure_ascii=False, indent=1)
+        self.features.to_csv(os.path.join(self.folder, "features.csv"), index=False, encoding="utf-8")
+        self.samples.to_csv(os.path.join(self.folder, "samples.csv"), index=False, encoding="utf-8")
+
+    def select(self, samples=None, features=None):
+        """
+        读取部分样品和化合物，只访问这些样品所在数据块的对应行。
+        :param samples: 样品名称列表，None 为全部样品
+        :param features: 化合物名称（key_column 的值）列表，None 为全部化合物
+        :return: (样品×化合物 float32 矩阵（未检出为 NaN）, 样品名称列表, 化合物名称列表)
+        """
+        sample_table = self.samples if samples is None else \
+            self.samples.set_index("样品").loc[list(samples)].reset_index()
+        feature_keys = self.features[self.key_column].astype(str)
+        if features is None:
+            feature_ids = np.arange(len(self.features))
+        else:
+            feature_ids = pd.Index(feature_keys).get_indexer([str(f) for f in features])
+            if (feature_ids < 0).any():
+                raise KeyError(f"档案库中没有这些化合物：{[f for f, i in zip(features, feature_ids) if i < 0][:5]}")
+
+        # 全局化合物编号 → 输出矩阵中的列号
+        column_of = np.full(len(self.features), -1, dtype=np.int64)
+        column_of[feature_ids] = np.arange(len(feature_ids))
+
+        result = np.full((len(sample_table), len(feature_ids)), np.nan, dtype=ARCHIVE_DTYPE)
+        positions = np.arange(len(sample_table))
+        for chunk, rows in sample_table.groupby("chunk").indices.items():
+            values, chunk_features = self.chunk(chunk)
+            target = column_of[chunk_features]
+            present = np.flatnonzero(target >= 0)
+            chunk_rows = sample_table["row"].to_numpy()[rows].astype(np.int64)
+            result[np.ix_(positions[rows], target[present])] = values[np.ix_(chunk_rows, present)]
+        return result, sample_table["样品"].tolist(), feature_keys.iloc[feature_ids].tolist()
+
+    def to_frame(self, samples=None, features=None):
+        """与 transform_data 相同格式的 样品×化合物 表（第一列为“样品”）"""
+        values, sample_names, feature_names = self.select(samples, features)
+        frame = pd.DataFrame(values, columns=feature_names)
+        frame.insert(0, "样品", sample_names)
+        return frame
+
+    def to_merged(self, samples=None, features=None, columns=None):
+        """
+        与合并脚本输出相同格式的表（每行一个化合物，化合物信息列后为各样品的浓度列）。
+        samples、features 同 select，只读取选中的样品和化合物；columns 为保留的化合物信息列，None 为全部。
+        """
+        values, sample_names, feature_names = self.select(samples, features)
+        info = self.features.set_index(self.features[self.key_column].astype(str)).loc[feature_names]
+        if columns is not None:
+            info = info[[c for c in self.features.columns if c in set(columns)]]
+        merged = info.reset_index(drop=True)
+        concentrations = pd.DataFrame(values.T, columns=sample_names)
+        return pd.concat([merged, concentrations], axis=1)
+
+
+def is_archive(path):
+    """path 是否为档案库文件夹或其中的 样品档案库.json"""
+    if os.path.isdir(path):
+        return os.path.exists(os.path.join(path, MANIFEST_NAME))
+    return os.path.basename(path) == MANIFEST_NAME
+
+
+def read_table(path, samples=None, features=None, columns=None):
+    """
+    读取分析用的合并表：Excel 文件直接读取；档案库（文件夹或其中的 样品档案库.json）转为合并表格式。
+    :param samples: 只读取这些样品（浓度列），None 为全部样品
+    :param features: 只读取这些化合物（档案库对齐化合物所用列的值），只对档案库有效
+    :param columns: 与 samples 一起保留的化合物信息列（如选择的化合物列），None 为全部
+    档案库只访问选中样品和化合物所在的数据块行；Excel 文件在给出 samples 和 columns 时只解析这些列。
+    """
+    if is_archive(path):
+        folder = path if os.path.isdir(path) else os.path.dirname(path)
+        return SampleArchive(folder).to_merged(samples, features, columns)
+    if samples is None or columns is None:
+        return pd.read_excel(path)
+    wanted = set(columns) | set(samples)
+    return pd.read_excel(path, usecols=lambda column: column in wanted)
+
+
+def read_columns(path):
+    """只读取列名（选择样品列和化合物列时使用），档案库不载入数值"""
+    if is_archive(path):
+        folder = path if os.path.isdir(path) else os.path.dirname(path)
+        archive = SampleArchive(folder)
+        return archive.features.columns.tolist() + archive.samples["样品"].tolist()
+    return pd.read_excel(path, nrows=0).columns.tolist()
+
+
+# 文件选择对话框中的文件类型，可直接选择档案库
+FILE_TYPES = [("Excel files", "*.xlsx"), ("样品档案库", MANIFEST_NAME), ("All files", "*.*")]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="长期样品档案库")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    add_parser = subparsers.add_parser("add", help="把合并后的 Excel 表中的样品追加到档案库")
+    add_parser.add_argument("archive", help="档案库文件夹")
+    add_parser.add_argument("file", help="合并脚本输出的 Excel 文件")
+    add_parser.add_argument("--key", default="用户定义的谱库化合物", help="对齐化合物所用的列（仅新建档案库时有效）")
+    info_parser = subparsers.add_parser("info", help="显示档案库的样品数和化合物数")
+    info_parser.add_argument("archive", help="档案库文件夹")
+    args = parser.parse_args()
+
+    if args.command == "add":
+        archive = SampleArchive(args.archive, key_column=args.key)
+        table = pd.read_excel(args.file)
+        columns = [c for c in table.columns if str(c).endswith("_浓度")]
+        n = archive.append(table, columns, source=args.file)
+        print(f"已追加 {n} 个样品，档案库现有 {archive.shape[0]} 个样品、{archive.shape[1]} 个化合物。")
+    else:
+        archive = SampleArchive(args.archive)
+        print(f"档案库共有 {archive.shape[0]} 个样品、{archive.shape[1]} 个化合物，"
+              f"{archive.samples['chunk'].nunique()} 个数据块。")
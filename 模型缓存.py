@@ -0,0 +1,249 @@
+import os
+import json
+import hashlib
+from collections import OrderedDict
+import numpy as np
+from scipy import sparse
+from 稀疏矩阵 import SparseFeatureMatrix, sparse_pca, sparse_pls_vip, vip_from_weights
+from 批量对比 import pls_fit
+
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_CACHE_FOLDER = os.path.join(SCRIPT_DIR, "模型缓存")
+
+# 第一次拟合时至少求出的成分数，之后换成不超过该数的主成分数只需取前几列
+MAX_COMPONENTS = 10
+
+# 拟合方式改变时加 1，旧版本写入的缓存文件不再被使用（2：PLS 拟合不再重复自动标度；3：批量对比的稀疏子矩阵按整批样品标度）
+CACHE_VERSION = 3
+
+
+def data_hash(*parts):
+    """
+    计算缓存键：依次对数组（形状、类型和数值）、稀疏矩阵和其他可 JSON 化的参数（如预处理设置）做 SHA-1。
+    """
+    digest = hashlib.sha1()
+    for part in parts:
+        if isinstance(part, SparseFeatureMatrix):
+            part = part.matrix
+        if sparse.issparse(part):
+            part = part.tocsr()
+            digest.update(repr(part.shape).encode())
+            for array in (part.data, part.indices, part.indptr):
+                digest.update(np.ascontiguousarray(array).tobytes())
+        elif isinstance(part, np.ndarray):
+            digest.update(f"{part.dtype.str}{part.shape}".encode())
+            digest.update(np.ascontiguousarray(part).tobytes())
+        else:
+            digest.update(json.dumps(part, sort_keys=True, ensure_ascii=False, default=_to_json).encode())
+    return digest.hexdigest()
+
+
+def _to_json(value):
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    if isinstance(value, np.generic):
+        return value.item()
+    return str(value)
+
+
+class ModelCache:
+    """
+    拟合结果缓存：键为数据和预处理设置的哈希，值为一组 numpy 数组（得分、权重、方差解释比例等）。
+    最近使用的结果保存在内存中，同时写入 folder 下的 <键>.npz，下次运行脚本仍可使用；
+    folder 中最多保留 max_entries 个文件，超出时删除最久未使用的。folder 为 None 时只缓存在内存中，
+    folder 为 None 且 memory_entries 为 0 时不缓存。
+    """
+
+    def __init__(self, folder=DEFAULT_CACHE_FOLDER, max_entries=50, memory_entries=8):
+        self.folder = folder
+        self.max_entries = max_entries
+        self.memory_entries = memory_entries
+        self._memory = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def enabled(self):
+        return bool(self.folder) or self.memory_entries > 0
+
+    def components(self, n_components, limit):
+        """
+        实际拟合的成分数：缓存时至少求 MAX_COMPONENTS 个（不超过 limit），以后换成更少的成分数只需取前几列；
+        不缓存时只求 n_components 个。
+        """
+        if not self.enabled:
+            return n_components
+        return max(n_components, min(MAX_COMPONENTS, limit))
+
+    def key(self, *parts):
+        """缓存键（见 data_hash），不缓存时返回 None，省去计算哈希"""
+        return data_hash(CACHE_VERSION, *parts) if self.enabled else None
+
+    def _path(self, key):
+        return os.path.join(self.folder, f"{key}.npz")
+
+    def get(self, key):
+        """读取缓存，没有时返回 None"""
+        if key is None:
+            return None
+        if key in self._memory:
+            self._memory.move_to_end(key)
+            self.hits += 1
+            return self._memory[key]
+        if self.folder and os.path.exists(self._path(key)):
+            try:
+                with np.load(self._path(key)) as stored:
+                    arrays = {name: stored[name] for name in stored.files}
+            except (OSError, ValueError):
+                # 写入中断等原因损坏的文件视为没有缓存
+                self.misses += 1
+                return None
+            os.utime(self._path(key))
+            self._remember(key, arrays)
+            self.hits += 1
+            return arrays
+        self.misses += 1
+        return None
+
+    def put(self, key, arrays):
+        """保存一组数组"""
+        if key is None:
+            return
+        self._remember(key, arrays)
+        if not self.folder:
+            return
+        if not os.path.exists(self.folder):
+            os.makedirs(self.folder)
+        # 先写临时文件再改名，避免中断时留下不完整的缓存
+        temp_path = self._path(key) + ".tmp.npz"
+        np.savez(temp_path, **arrays)
+        os.replace(temp_path, self._path(key))
+        self._evict()
+
+    def _remember(self, key, arrays):
+        self._memory[key] = arrays
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_entries:
+            self._memory.popitem(last=False)
+
+    def _evict(self):
+        files = [os.path.join(self.folder, f) for f in os.listdir(self.folder) if f.endswith(".npz")]
+        if len(files) > self.max_entries:
+            files.sort(key=os.path.getmtime)
+            for path in files[:len(files) - self.max_entries]:
+                os.remove(path)
+
+    def clear(self):
+        """清空内存和磁盘上的缓存"""
+        self._memory.clear()
+        if self.folder and os.path.exists(self.folder):
+            for file_name in os.listdir(self.folder):
+                if file_name.endswith(".npz"):
+                    os.remove(os.path.join(self.folder, file_name))
+
+
+_default = {}
+
+
+def default_cache():
+    """
+    各分析脚本共用的缓存，保存在脚本目录下的“模型缓存”文件夹。
+    可用环境变量 GCMS_MODEL_CACHE 指定其他文件夹，设为 off 时不缓存。
+    """
+    if "cache" not in _default:
+        folder = os.environ.get("GCMS_MODEL_CACHE") or DEFAULT_CACHE_FOLDER
+        _default["cache"] = ModelCache(None, memory_entries=0) if folder == "off" else ModelCache(folder)
+    return _default["cache"]
+
+
+def cached_pca(X_scaled, n_components, settings=None, cache=None):
+    """
+    PCA（与 sklearn PCA 相同：中心化后分解，载荷中绝对值最大的元素取正号）。
+    分解只计算一次，缓存至少 MAX_COMPONENTS 个主成分，换主成分数时直接取前几列。
+    :param settings: 预处理设置，作为缓存键的一部分
+    :return: (主成分得分 样品×n_components, 方差解释比例)
+    """
+    cache = cache or default_cache()
+    X_scaled = np.asarray(X_scaled, dtype=np.float64)
+    if n_components > min(X_scaled.shape):
+        raise ValueError(f"主成分数量 {n_components} 不能超过样品数和化合物数中的较小者 {min(X_scaled.shape)}")
+    key = cache.key("pca", X_scaled, settings)
+    model = cache.get(key)
+    if model is None or model["scores"].shape[1] < n_components:
+        centered = X_scaled - X_scaled.mean(axis=0)
+        k = cache.components(n_components, min(centered.shape))
+        vt, eigenvalues, total = _top_components(centered, k)
+        signs = np.sign(vt[np.arange(k), np.abs(vt).argmax(axis=1)])
+        signs[signs == 0] = 1
+        vt = vt * signs[:, None]
+        model = {"scores": centered @ vt.T,
+                 "explained_variance_ratio": eigenvalues / total if total > 0 else np.zeros(k)}
+        cache.put(key, model)
+    return model["scores"][:, :n_components], model["explained_variance_ratio"][:n_components]
+
+
+def _top_components(centered, k):
+    """
+    中心化矩阵的前 k 个主成分方向。对样品数和化合物数中较小的一边求 Gram 矩阵的特征分解
+    （化合物远多于样品时为 样品×样品），比完整 SVD 快得多。
+    :return: (载荷 k×化合物, 前 k 个特征值（奇异值的平方）, 总平方和)
+    """
+    n, p = centered.shape
+    gram = centered @ centered.T if n <= p else centered.T @ centered
+    eigenvalues, vectors = np.linalg.eigh(gram)
+    order = np.argsort(eigenvalues)[::-1][:k]
+    eigenvalues, vectors = np.clip(eigenvalues[order], 0, None), vectors[:, order]
+    if n <= p:
+        # 由左奇异向量 u 得到载荷 v = Xᵀu / s
+        singular = np.sqrt(eigenvalues)
+        vt = (vectors.T @ centered) / np.where(singular > 0, singular, 1)[:, None]
+    else:
+        vt = vectors.T
+    return vt, eigenvalues, np.trace(gram)
+
+
+def cached_sparse_pca(feature_matrix, n_components, cache=None):
+    """稀疏矩阵上的 PCA（见 稀疏矩阵.sparse_pca），缓存方式同 cached_pca"""
+    cache = cache or default_cache()
+    key = cache.key("sparse_pca", feature_matrix)
+    model = cache.get(key)
+    if model is None or model["scores"].shape[1] < n_components:
+        # svds 最多求 min(样品数, 化合物数) - 1 个成分
+        scores, ratio = sparse_pca(feature_matrix, cache.components(n_components, min(feature_matrix.shape) - 1))
+        model = {"scores": scores, "explained_variance_ratio": ratio}
+        cache.put(key, model)
+    return model["scores"][:, :n_components], model["explained_variance_ratio"][:n_components]
+
+
+def cached_pls_vip(X_scaled, y, n_components, settings=None, cache=None):
+    """
+    PLS-DA 的得分和 VIP 值（见 批量对比.pls_vip）。缓存至少 MAX_COMPONENTS 个成分的得分和权重，
+    换主成分数时由前几列重新计算 VIP，换 VIP 阈值时不涉及模型。
+    :return: (得分 T 样品×n_components, 每个化合物的 VIP 值)
+    """
+    cache = cache or default_cache()
+    X_scaled = np.asarray(X_scaled, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    key = cache.key("pls", X_scaled, y, settings)
+    model = cache.get(key)
+    if model is None or model["T"].shape[1] < n_components:
+        T, W = pls_fit(X_scaled, y, cache.components(n_components, min(X_scaled.shape[1], len(y) - 1)))
+        model = {"T": T, "W": W}
+        cache.put(key, model)
+    T, W = model["T"][:, :n_components], model["W"][:, :n_components]
+    return T, vip_from_weights(T, W)
+
+
+def cached_sparse_pls_vip(feature_matrix, y, n_components, cache=None):
+    """稀疏矩阵上的 PLS-DA（见 稀疏矩阵.sparse_pls_vip），缓存方式同 cached_pls_vip"""
+    cache = cache or default_cache()
+    y = np.asarray(y, dtype=np.float64)
+    key = cache.key("sparse_pls", feature_matrix, y)
+    model = cache.get(key)
+    if model is None or model["T"].shape[1] < n_components:
+        T, W, _ = sparse_pls_vip(feature_matrix, y, cache.components(n_components, min(feature_matrix.shape) - 1))
+        model = {"T": T, "W": W}
+        cache.put(key, model)
+    T, W = model["T"][:, :n_components], model["W"][:, :n_components]
+    return T, W, vip_from_weights(T, W)
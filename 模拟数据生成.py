@@ -0,0 +1,157 @@
+import os
+import zlib
+import argparse
+import numpy as np
+import pandas as pd
+
+
+# MassHunter 导出 csv 的列顺序（与各转换脚本使用的列名完全一致）
+MASSHUNTER_COLUMNS = ["组分 RT", "化合物名称", "CAS 编号", "用户定义的谱库化合物", "组分 RI", "谱库 RI",
+                      "匹配因子", "估计的浓度.", "谱库化合物描述"]
+
+# 巨豆三烯酮同分异构体，CAS 编号相同，只能按 RI 区分
+MEGASTIGMATRIENONE_CAS = "38818-55-2"
+MEGASTIGMATRIENONE_RIS = [1533.0, 1566.0, 1589.0, 1612.0]
+
+
+def cas_check_digit(body):
+    """计算 CAS 编号的校验位（从右往左依次乘以 1, 2, 3 ... 求和后对 10 取余）"""
+    digits = body.replace("-", "")
+    return sum(int(d) * (i + 1) for i, d in enumerate(reversed(digits))) % 10
+
+
+def make_compound_library(n_compounds, seed=0):
+    """
+    生成模拟谱库：每个化合物有合法的 CAS 编号、中英文名称和谱库 RI。
+    :param n_compounds: 化合物数量
+    :param seed: 随机种子
+    :return: 谱库 DataFrame
+    """
+    rng = np.random.default_rng(seed)
+    front = rng.choice(np.arange(100, 999999), size=n_compounds, replace=False)
+    middle = rng.integers(10, 100, size=n_compounds)
+    cas_numbers = []
+    for f, m in zip(front, middle):
+        body = f"{f}-{m:02d}"
+        cas_numbers.append(f"{body}-{cas_check_digit(body)}")
+
+    library = pd.DataFrame({
+        "CAS 编号": cas_numbers,
+        "化合物名称": [f"Compound {i + 1:05d}" for i in range(n_compounds)],
+        "用户定义的谱库化合物": [f"化合物{i + 1:05d}" for i in range(n_compounds)],
+        "谱库 RI": np.round(rng.uniform(800, 2500, size=n_compounds), 0),
+        "谱库化合物描述": rng.choice(["醇类", "醛类", "酮类", "酯类", "酸类", "萜烯类", "杂环类"], size=n_compounds),
+    })
+    # 每个化合物的“典型含量”服从对数正态分布，使不同样品间浓度有可比性
+    library["典型浓度"] = rng.lognormal(mean=0.0, sigma=1.5, size=n_compounds)
+    return library
+
+
+def make_sample(library, n_peaks, duplicate_rate=0.1, isomer_count=4, ri_noise=8.0, rng=None):
+    """
+    生成一个样品的 MassHunter 导出表。
+    :param library: make_compound_library 生成的谱库
+    :param n_peaks: 峰的数量（不含重复检出和巨豆三烯酮）
+    :param duplicate_rate: 同一 CAS 编号被重复检出的峰所占比例
+    :param isomer_count: 巨豆三烯酮同分异构体峰的数量，0 表示不生成
+    :param ri_noise: 组分 RI 相对谱库 RI 的偏差标准差
+    :param rng: numpy 随机数生成器
+    :return: 样品 DataFrame
+    """
+    rng = rng if rng is not None else np.random.default_rng()
+    n_peaks = min(n_peaks, len(library))
+    picked = library.iloc[rng.choice(len(library), size=n_peaks, replace=False)]
+
+    # 重复检出：同一化合物在相近的保留位置再次被识别
+    n_duplicates = int(round(n_peaks * duplicate_rate))
+    if n_duplicates:
+        picked = pd.concat([picked, picked.sample(n=n_duplicates, replace=True, random_state=rng)],
+                           ignore_index=True)
+
+    peaks = pd.DataFrame({
+        "化合物名称": picked["化合物名称"].values,
+        "CAS 编号": picked["CAS 编号"].values,
+        "用户定义的谱库化合物": picked["用户定义的谱库化合物"].values,
+        "谱库 RI": picked["谱库 RI"].values,
+        "谱库化合物描述": picked["谱库化合物描述"].values,
+    })
+    # 部分峰偏差较大，用于检验 RI 差值筛选
+    noise = rng.normal(0, ri_noise, size=len(peaks))
+    outliers = rng.random(len(peaks)) < 0.1
+    noise[outliers] *= 6
+    peaks["组分 RI"] = np.round(peaks["谱库 RI"] + noise, 0)
+    peaks["估计的浓度."] = np.round(picked["典型浓度"].values * rng.lognormal(0, 0.3, size=len(peaks)), 4)
+    peaks["匹配因子"] = np.round(rng.uniform(60, 99, size=len(peaks)), 1)
+
+    if isomer_count:
+        ris = np.array(MEGASTIGMATRIENONE_RIS * (isomer_count // len(MEGASTIGMATRIENONE_RIS) + 1))[:isomer_count]
+        isomers = pd.DataFrame({
+            "化合物名称": "Megastigmatrienone",
+            "CAS 编号": MEGASTIGMATRIENONE_CAS,
+            "用户定义的谱库化合物": "巨豆三烯酮",
+            "谱库 RI": 1570.0,
+            "谱库化合物描述": "酮类",
+            "组分 RI": np.round(ris + rng.normal(0, 2, size=isomer_count), 0),
+            "估计的浓度.": np.round(rng.lognormal(0, 1, size=isomer_count), 4),
+            "匹配因子": np.round(rng.uniform(80, 95, size=isomer_count), 1),
+        })
+        peaks = pd.concat([peaks, isomers], ignore_index=True)
+
+    # 保留时间与 RI 近似线性对应，导出表按保留时间排序
+    peaks["组分 RT"] = np.round((peaks["组分 RI"] - 700) / 60 + rng.normal(0, 0.01, size=len(peaks)), 3)
+    peaks = peaks.sort_values("组分 RT").reset_index(drop=True)
+    return peaks[MASSHUNTER_COLUMNS]
+
+
+def generate_dataset(output_folder, n_samples=10, n_peaks=200, n_compounds=None, duplicate_rate=0.1,
+                     isomer_count=4, encodings=("utf-8", "gbk"), groups=("A", "B"), seed=0):
+    """
+    生成一批模拟的 MassHunter csv 文件。
+    :param output_folder: 输出文件夹
+    :param n_samples: 样品数量
+    :param n_peaks: 每个样品的峰数量
+    :param n_compounds: 谱库中化合物的数量，默认为峰数量的 3 倍
+    :param duplicate_rate: 重复检出峰所占比例
+    :param isomer_count: 每个样品中巨豆三烯酮同分异构体峰的数量
+    :param encodings: 轮流使用的文件编码，模拟不同电脑导出的文件
+    :param groups: 样品分组名称，文件名形如 A-1.csv
+    :param seed: 随机种子
+    :return: 生成的文件路径列表
+    """
+    if not os.path.exists(output_folder):
+        os.makedirs(output_folder)
+
+    rng = np.random.default_rng(seed)
+    library = make_compound_library(n_compounds or n_peaks * 3, seed=seed)
+
+    file_paths = []
+    for i in range(n_samples):
+        group = groups[i % len(groups)]
+        sample = make_sample(library, n_peaks, duplicate_rate=duplicate_rate, isomer_count=isomer_count, rng=rng)
+        # 不同分组的部分化合物含量存在系统差异，使多元分析有可分的结构
+        shifted = sample["CAS 编号"].map(lambda cas: zlib.crc32(f"{cas}|{group}".encode()) % 5 == 0)
+        sample.loc[shifted, "估计的浓度."] = np.round(sample.loc[shifted, "估计的浓度."] * 2.5, 4)
+
+        file_path = os.path.join(output_folder, f"{group}-{i // len(groups) + 1}.csv")
+        sample.to_csv(file_path, index=False, encoding=encodings[i % len(encodings)])
+        file_paths.append(file_path)
+
+    print(f"已在 {output_folder} 生成 {len(file_paths)} 个模拟样品文件")
+    return file_paths
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="生成模拟的 MassHunter GC-MS 导出 csv 文件")
+    parser.add_argument("output_folder", help="输出文件夹")
+    parser.add_argument("--samples", type=int, default=10, help="样品数量")
+    parser.add_argument("--peaks", type=int, default=200, help="每个样品的峰数量")
+    parser.add_argument("--compounds", type=int, default=None, help="谱库化合物数量")
+    parser.add_argument("--duplicate-rate", type=float, default=0.1, help="重复检出峰所占比例")
+    parser.add_argument("--isomers", type=int, default=4, help="巨豆三烯酮同分异构体峰数量")
+    parser.add_argument("--encodings", default="utf-8,gbk", help="轮流使用的文件编码，逗号分隔")
+    parser.add_argument("--seed", type=int, default=0, help="随机种子")
+    args = parser.parse_args()
+
+    generate_dataset(args.output_folder, n_samples=args.samples, n_peaks=args.peaks, n_compounds=args.compounds,
+                     duplicate_rate=args.duplicate_rate, isomer_count=args.isomers,
+                     encodings=tuple(args.encodings.split(",")), seed=args.seed)
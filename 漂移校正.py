@@ -0,0 +1,210 @@
+import os
+import argparse
+import numpy as np
+import pandas as pd
+from 运行报告 import RunReport
+from 样品分组 import read_metadata, strip_suffix
+from 合并工具 import export_excel
+
+
+# 样品元数据中的列：样品名称、进样顺序、样品类型（QC 或其他）和批次（可选）
+ORDER_COLUMN = "进样顺序"
+TYPE_COLUMN = "类型"
+BATCH_COLUMN = "批次"
+
+# 元数据没有“类型”列时，样品名称中含有该文本（不区分大小写）的样品视为混合 QC
+DEFAULT_QC_PATTERN = "QC"
+
+# 一个化合物在同一批次中至少有这么多个 QC 检出值才做校正
+MIN_QC = 5
+
+
+def loess_matrix(x_fit, x_eval, span=0.75, degree=1):
+    """
+    LOESS 平滑矩阵 S：对任意一组观测值 y（与 x_fit 对应），S @ y 即 LOESS 曲线在 x_eval 处的值。
+    每个点取最近的 span 比例的观测点，按三次方权重 (1 - (d/h)³)³ 做 degree 次局部多项式回归。
+    S 只由进样顺序决定，与化合物无关，所有化合物的拟合因此只需一次矩阵乘法。
+    :return: len(x_eval)×len(x_fit) 矩阵
+    """
+    x_fit = np.asarray(x_fit, dtype=np.float64)
+    x_eval = np.asarray(x_eval, dtype=np.float64)
+    n = len(x_fit)
+    k = min(n, max(degree + 1, int(np.ceil(span * n))))
+    distance = np.abs(x_eval[:, None] - x_fit[None, :])
+    # 窗口半径为第 k 近的距离（span > 1 时按比例放大），稍微放大以免第 k 个点的权重为 0
+    h = np.partition(distance, k - 1, axis=1)[:, k - 1] * max(span, 1.0) * (1 + 1e-6)
+    h = np.where(h > 0, h, 1.0)
+    weights = np.clip(1 - (distance / h[:, None]) ** 3, 0, None) ** 3
+
+    # 以 x_eval 为中心的局部多项式设计矩阵：点×观测×(degree+1)
+    design = (x_fit[None, :] - x_eval[:, None])[..., None] ** np.arange(degree + 1)
+    weighted = design.transpose(0, 2, 1) * weights[:, None, :]
+    # 局部回归在 x_eval 处的值为截距，即 (XᵀWX)⁻¹XᵀW 的第一行；观测点太少时用伪逆
+    return (np.linalg.pinv(weighted @ design) @ weighted)[:, 0, :]
+
+
+def injection_design(samples, metadata, sample_column=None, qc_pattern=DEFAULT_QC_PATTERN):
+    """
+    从样品元数据中取每个样品的进样顺序、是否为 QC 和批次。
+    元数据中的样品名称既可以是列名本身（A-1_浓度），也可以是去掉 "_浓度" 后缀的名称（A-1）。
+    :param metadata: 元数据 DataFrame 或 CSV 文件路径，须含“进样顺序”列，可含“类型”和“批次”列
+    :return: 以样品（samples 中的名称）为索引的 DataFrame，列为 进样顺序、QC、批次
+    """
+    if not isinstance(metadata, pd.DataFrame):
+        metadata = read_metadata(metadata)
+    metadata = metadata.rename(columns=lambda c: str(c).strip())
+    sample_column = sample_column or ("样品" if "样品" in metadata.columns else metadata.columns[0])
+    if ORDER_COLUMN not in metadata.columns:
+        raise ValueError(f"样品元数据中没有“{ORDER_COLUMN}”列")
+    table = metadata.assign(**{sample_column: metadata[sample_column].astype(str).str.strip()})
+    table = table.drop_duplicates(sample_column).set_index(sample_column)
+
+    names = pd.Index([str(s) for s in samples])
+    keys = [s if s in table.index else strip_suffix(s) for s in names]
+    missing = [s for s, key in zip(names, keys) if key not in table.index]
+    if missing:
+        raise ValueError(f"样品元数据中没有这些样品：{', '.join(missing[:5])} 等 {len(missing)} 个")
+    table = table.loc[keys]
+
+    order = pd.to_numeric(table[ORDER_COLUMN], errors="coerce").to_numpy(dtype=np.float64)
+    if np.isnan(order).any():
+        raise ValueError(f"有样品的“{ORDER_COLUMN}”不是数字")
+    if TYPE_COLUMN in table.columns:
+        is_qc = table[TYPE_COLUMN].astype(str).str.strip().str.upper().eq("QC").to_numpy()
+    else:
+        is_qc = np.asarray(names.str.contains(qc_pattern, case=False, regex=False))
+    batch = table[BATCH_COLUMN].astype(str).to_numpy() if BATCH_COLUMN in table.columns else np.full(len(names), "1")
+    return pd.DataFrame({ORDER_COLUMN: order, "QC": is_qc, BATCH_COLUMN: batch}, index=names)
+
+
+def drift_correct(values, order, is_qc, batch=None, span=0.75, degree=1, min_qc=MIN_QC):
+    """
+    用混合 QC 校正信号漂移（QC-RLSC）：每个批次内对每个化合物的 QC 值随进样顺序拟合 LOESS 曲线，
+    校正值 = 原值 × 全部 QC 的中位数 / 曲线在该样品进样顺序处的值，批次间的差异同时消除。
+    QC 检出情况相同的化合物共用一个平滑矩阵，数千个化合物只需几次矩阵乘法。
+    第一个 QC 之前和最后一个 QC 之后的样品取最近 QC 处的曲线值，不外推。
+    :param values: 化合物×样品 浓度矩阵，未检出为 NaN
+    :return: (校正后的矩阵, 每个化合物是否已校正（布尔数组）)
+    """
+    values = np.asarray(values, dtype=np.float64)
+    order = np.asarray(order, dtype=np.float64)
+    is_qc = np.asarray(is_qc, dtype=bool)
+    batch = np.zeros(len(order)) if batch is None else np.asarray(batch)
+    corrected = values.copy()
+    fitted_any = np.zeros(len(values), dtype=bool)
+    with np.errstate(all="ignore"):
+        target = np.nanmedian(np.where(is_qc, values, np.nan), axis=1)
+
+    for batch_value in pd.unique(batch):
+        columns = np.flatnonzero(batch == batch_value)
+        qc_columns = columns[is_qc[columns]]
+        if len(qc_columns) < min_qc:
+            continue
+        qc_order = order[qc_columns]
+        eval_order = np.clip(order[columns], qc_order.min(), qc_order.max())
+        qc_values = values[:, qc_columns]
+        detected = ~np.isnan(qc_values)
+
+        # 按 QC 检出情况分组：检出情况相同的化合物用同一个平滑矩阵（通常只有少数几种情况）
+        patterns, pattern_of = np.unique(detected, axis=0, return_inverse=True)
+        fitted = np.full((len(values), len(columns)), np.nan)
+        for p, pattern in enumerate(patterns):
+            if pattern.sum() < min_qc:
+                continue
+            rows = np.flatnonzero(pattern_of.ravel() == p)
+            smoother = loess_matrix(qc_order[pattern], eval_order, span, degree)
+            fitted[rows] = qc_values[np.ix_(rows, np.flatnonzero(pattern))] @ smoother.T
+
+        usable = fitted > 0
+        with np.errstate(all="ignore"):
+            scaled = values[:, columns] * target[:, None] / fitted
+        corrected[:, columns] = np.where(usable & ~np.isnan(target)[:, None], scaled, values[:, columns])
+        fitted_any |= usable.any(axis=1)
+    return corrected, fitted_any
+
+
+def qc_rsd(values, is_qc):
+    """每个化合物在 QC 样品中的相对标准偏差（%），检出的 QC 少于 2 个时为 NaN"""
+    qc_values = np.asarray(values, dtype=np.float64)[:, np.asarray(is_qc, dtype=bool)]
+    with np.errstate(all="ignore"):
+        mean = np.nanmean(qc_values, axis=1)
+        std = np.nanstd(qc_values, axis=1, ddof=1)
+        return np.where(mean > 0, std / mean * 100, np.nan)
+
+
+def correct_merged(merged, sample_columns, metadata, span=0.75, degree=1, min_qc=MIN_QC,
+                   qc_pattern=DEFAULT_QC_PATTERN, report=None):
+    """
+    对合并表（每行一个化合物，每个样品一列浓度）做漂移校正，位于合并之后、转置和多元分析之前。
+    :return: (校正后的合并表, 每个化合物的 QC RSD 表)
+    """
+    report = RunReport.ensure(report)
+    with report.stage("漂移校正", span=span, degree=degree) as stage:
+        design = injection_design(sample_columns, metadata, qc_pattern=qc_pattern)
+        values = merged[sample_columns].apply(pd.to_numeric, errors="coerce").to_numpy(dtype=np.float64)
+        corrected, fitted = drift_correct(values, design[ORDER_COLUMN], design["QC"], design[BATCH_COLUMN],
+                                          span, degree, min_qc)
+        stage["features"] = len(merged)
+        stage["qc_samples"] = int(design["QC"].sum())
+        stage["batches"] = int(design[BATCH_COLUMN].nunique())
+        stage.count("compounds_corrected", int(fitted.sum()))
+
+    result = merged.copy()
+    result[sample_columns] = corrected
+    info_columns = [c for c in ("CAS 编号", "化合物名称", "用户定义的谱库化合物", "组分 RI") if c in merged.columns]
+    rsd = merged[info_columns].copy()
+    rsd["QC 检出数"] = (~np.isnan(values[:, design["QC"].to_numpy()])).sum(axis=1)
+    rsd["已校正"] = np.where(fitted, "是", "否")
+    rsd["校正前 RSD%"] = qc_rsd(values, design["QC"])
+    rsd["校正后 RSD%"] = qc_rsd(corrected, design["QC"])
+    return result, rsd
+
+
+def rsd_summary(rsd, limits=(20, 30)):
+    """QC RSD 汇总：校正前后的中位 RSD 以及 RSD 低于各限值的化合物数"""
+    rows = [("化合物数", len(rsd), len(rsd)),
+            ("已校正的化合物数", int((rsd["已校正"] == "是").sum()), int((rsd["已校正"] == "是").sum())),
+            ("中位 RSD%", round(rsd["校正前 RSD%"].median(), 2), round(rsd["校正后 RSD%"].median(), 2))]
+    for limit in limits:
+        rows.append((f"RSD < {limit}% 的化合物数", int((rsd["校正前 RSD%"] < limit).sum()),
+                     int((rsd["校正后 RSD%"] < limit).sum())))
+    return pd.DataFrame(rows, columns=["指标", "校正前", "校正后"], dtype=object)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="用混合 QC 样品和进样顺序校正长序列的信号漂移（LOESS）")
+    parser.add_argument("file", help="合并脚本输出的 Excel 文件")
+    parser.add_argument("--metadata", required=True,
+                        help="样品元数据 CSV：“样品”“进样顺序”列，可含“类型”（QC 样品填 QC）和“批次”列")
+    parser.add_argument("--span", type=float, default=0.75, help="LOESS 窗口占 QC 数的比例")
+    parser.add_argument("--degree", type=int, default=1, choices=(1, 2), help="局部多项式的次数")
+    parser.add_argument("--min-qc", type=int, default=MIN_QC, help="每批次至少检出的 QC 数，不足时不校正该化合物")
+    parser.add_argument("--qc-pattern", default=DEFAULT_QC_PATTERN, help="元数据没有“类型”列时识别 QC 样品的名称文本")
+    parser.add_argument("--max-rsd", type=float, default=None, help="剔除校正后 QC RSD 超过该值（%%）的化合物")
+    parser.add_argument("--drop-qc", action="store_true", help="输出中去掉 QC 样品的浓度列")
+    args = parser.parse_args()
+
+    merged_table = pd.read_excel(args.file)
+    samples = [c for c in merged_table.columns if str(c).endswith("_浓度")]
+    run_report = RunReport("漂移校正")
+    result_table, rsd_table = correct_merged(merged_table, samples, args.metadata, args.span, args.degree,
+                                             args.min_qc, args.qc_pattern, report=run_report)
+    if args.max_rsd is not None:
+        keep = ~(rsd_table["校正后 RSD%"] > args.max_rsd).to_numpy()
+        print(f"剔除校正后 QC RSD 超过 {args.max_rsd}% 的化合物 {int((~keep).sum())} 个")
+        result_table = result_table[keep]
+    if args.drop_qc:
+        design_table = injection_design(samples, args.metadata, qc_pattern=args.qc_pattern)
+        qc_columns = design_table.index[design_table["QC"]].tolist()
+        result_table = result_table.drop(columns=qc_columns)
+        samples = [c for c in samples if c not in qc_columns]
+
+    base_name = os.path.splitext(args.file)[0]
+    export_excel(result_table, base_name + "_漂移校正.xlsx", samples)
+    summary = rsd_summary(rsd_table)
+    with pd.ExcelWriter(base_name + "_QC_RSD.xlsx") as writer:
+        summary.to_excel(writer, sheet_name="汇总", index=False)
+        rsd_table.to_excel(writer, sheet_name="化合物", index=False)
+    print(summary.to_string(index=False))
+    print(f"校正后的合并表已保存到: {base_name}_漂移校正.xlsx，QC RSD 已保存到: {base_name}_QC_RSD.xlsx")
+    run_report.save(os.path.dirname(os.path.abspath(args.file)))
@@ -0,0 +1,167 @@
+import numpy as np
+import pandas as pd
+from scipy import sparse
+
+
+# Excel 单个工作表最多 16384 列，特征数超过时无法保存转置后的表
+EXCEL_MAX_COLUMNS = 16384
+
+
+class SparseFeatureMatrix:
+    """
+    样品×化合物的稀疏浓度矩阵（CSR），未检出的化合物记为 0 且不占用内存。
+    samples 为样品名称，features 为化合物名称，顺序与矩阵的行、列一致。
+    """
+
+    def __init__(self, matrix, samples, features):
+        self.matrix = sparse.csr_matrix(matrix, dtype=np.float64)
+        self.samples = list(samples)
+        self.features = list(features)
+
+    @property
+    def shape(self):
+        return self.matrix.shape
+
+    @property
+    def density(self):
+        rows, cols = self.matrix.shape
+        return self.matrix.nnz / (rows * cols) if rows and cols else 0.0
+
+    @classmethod
+    def from_merged(cls, data, sample_columns, compound_column):
+        """
+        由合并后的大表（每行一个化合物、每个样品一列浓度）直接构建样品×化合物的稀疏矩阵，
+        不经过稠密的转置表。"--"、空值和 0 都视为未检出。
+        """
+        rows, cols, values = [], [], []
+        for i, column in enumerate(sample_columns):
+            concentration = pd.to_numeric(data[column], errors="coerce").to_numpy(dtype=np.float64)
+            detected = np.flatnonzero(np.nan_to_num(concentration) != 0)
+            rows.append(np.full(len(detected), i, dtype=np.int32))
+            cols.append(detected.astype(np.int32))
+            values.append(concentration[detected])
+        matrix = sparse.csr_matrix(
+            (np.concatenate(values), (np.concatenate(rows), np.concatenate(cols))),
+            shape=(len(sample_columns), len(data)))
+        return cls(matrix, sample_columns, data[compound_column].tolist())
+
+    def to_frame(self):
+        """转换为与 transform_data 相同格式的稠密 DataFrame（第一列为“样品”）"""
+        frame = pd.DataFrame(self.matrix.toarray(), columns=self.features)
+        frame.insert(0, "样品", self.samples)
+        return frame
+
+
+def should_use_sparse(data, sample_columns, min_features=2000, max_density=0.3):
+    """化合物数量较多且大部分为未检出时使用稀疏矩阵"""
+    if len(data) < min_features:
+        return False
+    values = data[sample_columns].apply(pd.to_numeric, errors="coerce")
+    density = (values.fillna(0) != 0).to_numpy().mean()
+    return density <= max_density
+
+
+def column_scaling(matrix):
+    """
+    不展开稀疏矩阵，直接求每列的均值和标准差（与 StandardScaler 一致，ddof=0）。
+    方差为 0 的列（常数列）标准差记为 1。
+    :return: (均值, 标准差, 是否为非常数列)
+    """
+    n = matrix.shape[0]
+    mean = np.asarray(matrix.sum(axis=0)).ravel() / n
+    mean_square = np.asarray(matrix.multiply(matrix).sum(axis=0)).ravel() / n
+    variance = np.maximum(mean_square - mean ** 2, 0)
+    # E[x²] - E[x]² 存在舍入误差，相对误差范围内的视为常数列
+    non_constant = variance > 1e-10 * mean_square
+    std = np.where(non_constant, np.sqrt(variance), 1.0)
+    return mean, std, non_constant
+
+
+def scaled_operator(matrix, mean, std):
+    """
+    标准化矩阵 Z = (X - 1·mean) / std 的线性算子。
+    只在矩阵乘法时隐式地减均值、除标准差，X 始终保持稀疏。
+    """
+    from scipy.sparse.linalg import LinearOperator
+
+    n, p = matrix.shape
+    matrix_t = matrix.T.tocsr()
+
+    def matvec(v):
+        v = np.asarray(v).reshape(p, -1) / std[:, None]
+        return matrix @ v - np.outer(np.ones(n), mean @ v)
+
+    def rmatvec(u):
+        u = np.asarray(u).reshape(n, -1)
+        return (matrix_t @ u - np.outer(mean, u.sum(axis=0))) / std[:, None]
+
+    return LinearOperator((n, p), matvec=matvec, rmatvec=rmatvec, matmat=matvec, rmatmat=rmatvec,
+                          dtype=np.float64)
+
+
+def sparse_pca(feature_matrix, n_components):
+    """
+    稀疏矩阵上的 PCA：标准化后截断 SVD，只求前 n_components 个主成分。
+    :return: (主成分得分 样品×n_components, 方差解释比例)
+    """
+    from scipy.sparse.linalg import svds
+
+    matrix = feature_matrix.matrix
+    mean, std, non_constant = column_scaling(matrix)
+    operator = scaled_operator(matrix, mean, std)
+
+    u, s, vt = svds(operator, k=n_components)
+    order = np.argsort(s)[::-1]
+    u, s, vt = u[:, order], s[order], vt[order]
+    # 与 sklearn 一致：每个载荷向量中绝对值最大的元素取正号
+    signs = np.sign(vt[np.arange(len(s)), np.abs(vt).argmax(axis=1)])
+    u, vt = u * signs, vt * signs[:, None]
+
+    # 标准化后非常数列的方差均为 1，总平方和 = 样品数 × 非常数列数
+    total = matrix.shape[0] * np.count_nonzero(non_constant)
+    return u * s, s ** 2 / total
+
+
+def sparse_pls_vip(feature_matrix, y, n_components, std=None):
+    """
+    稀疏矩阵上的 PLS（NIPALS，单响应变量），X 的逐成分扣除以低秩修正的方式隐式完成。
+    VIP 的计算方式与 opls_da_analysis 相同。
+    :param std: 各列的标准差；为 None 时取本矩阵的标准差（自动标度）。对部分样品建模时传入整批样品的标准差，
+                与先对整批样品自动标度、再取出这些样品拟合的稠密矩阵结果相同（均值总是取本矩阵的，即拟合前的中心化）
+    :return: (得分 T 样品×n_components, 权重 W 化合物×n_components, 每个化合物的 VIP 值)
+    """
+    matrix = feature_matrix.matrix
+    mean, own_std, _ = column_scaling(matrix)
+    std = own_std if std is None else std
+    operator = scaled_operator(matrix, mean, std)
+    n, p = matrix.shape
+
+    y = np.asarray(y, dtype=np.float64)
+    y = y - y.mean()
+    T = np.zeros((n, n_components))
+    P = np.zeros((p, n_components))
+    W = np.zeros((p, n_components))
+
+    for k in range(n_components):
+        # Z_k = Z - T P^T，Z_k^T u = Z^T u - P (T^T u)
+        w = operator.rmatvec(y).ravel() - P[:, :k] @ (T[:, :k].T @ y)
+        norm = np.linalg.norm(w)
+        if norm == 0:
+            break
+        w /= norm
+        t = operator.matvec(w).ravel() - T[:, :k] @ (P[:, :k].T @ w)
+        tt = t @ t
+        p_k = (operator.rmatvec(t).ravel() - P[:, :k] @ (T[:, :k].T @ t)) / tt
+        y = y - t * (y @ t) / tt
+        T[:, k], P[:, k], W[:, k] = t, p_k, w
+
+    return T, W, vip_from_weights(T, W)
+
+
+def vip_from_weights(T, W):
+    """
+    由 PLS 得分 T（样品×成分）和权重 W（化合物×成分）计算 VIP 值，各成分按得分方差加权。
+    NIPALS 的成分逐个求出，前 k 个成分与只拟合 k 个成分时相同，取 T、W 的前 k 列即得 k 个成分的 VIP。
+    """
+    explained_variance = np.var(T, axis=0)
+    return np.sqrt(W.shape[0] * np.sum(np.square(W) * explained_variance / explained_variance.sum(), axis=1))
@@ -0,0 +1,158 @@
+import os
+import argparse
+import numpy as np
+import pandas as pd
+from scipy.cluster.hierarchy import linkage, leaves_list, dendrogram
+from scipy.spatial.distance import pdist
+from 数据预处理 import to_matrix
+
+
+# 可选的距离和聚类方法（ward 只能与 euclidean 距离一起使用）
+DISTANCE_METRICS = ["euclidean", "correlation", "cosine", "cityblock", "braycurtis"]
+LINKAGE_METHODS = ["average", "complete", "single", "ward"]
+
+# 超过该数量时不再在坐标轴上逐个显示名称
+MAX_TICK_LABELS = 80
+
+
+def cluster_order(X, metric="euclidean", method="average"):
+    """
+    对 X 的行做层次聚类，返回 (linkage 矩阵, 叶节点顺序)。
+    距离用 pdist 计算压缩形式（n(n-1)/2 个值），不生成 n×n 的方阵。
+    """
+    if len(X) < 2:
+        return None, np.arange(len(X))
+    if method == "ward" and metric != "euclidean":
+        raise ValueError("ward 聚类只能使用 euclidean 距离")
+    Z = linkage(pdist(X, metric=metric), method=method)
+    return Z, leaves_list(Z)
+
+
+def select_top_vip(data, vip, top_n):
+    """
+    只保留 VIP 值最高的 top_n 个化合物。
+    :param data: transform_data 格式的 DataFrame（第一列为“样品”）
+    :param vip: 以化合物名称为索引的 VIP 值 Series，或含“化合物名称”“VIP 值”列的 DataFrame
+    """
+    if isinstance(vip, pd.DataFrame):
+        vip = vip.set_index("化合物名称")["VIP 值"]
+    top = vip[vip.index.isin(data.columns)].nlargest(top_n).index
+    return data[["样品"] + list(top)]
+
+
+def clustered_heatmap(data, output_file=None, sample_metric="euclidean", compound_metric="correlation",
+                      method="average", vip=None, top_n=None, title="聚类热图"):
+    """
+    对 transform_data 得到的 样品×化合物 表同时按样品和化合物做层次聚类，绘制带树状图的热图。
+    化合物先做 z-score 标准化（方差为 0 的化合物不参与聚类），未检出和 "--" 记为 0。
+    直接使用 Agg 画布渲染，不依赖图形界面，可在服务器上运行。
+    :param vip: 可选，VIP 值（见 select_top_vip），与 top_n 一起使用时只保留 VIP 最高的化合物
+    :param output_file: 图片保存路径，为 None 时只返回结果
+    :return: 按聚类顺序排列的 z-score 矩阵（DataFrame，行为样品，列为化合物）
+    """
+    if vip is not None and top_n:
+        data = select_top_vip(data, vip, top_n)
+
+    samples = data["样品"].astype(str).tolist()
+    values = data.drop(columns=["样品"])
+    X = np.nan_to_num(to_matrix(values), nan=0.0)
+    std = X.std(axis=0)
+    keep = std > 0
+    X = (X[:, keep] - X[:, keep].mean(axis=0)) / std[keep]
+    compounds = [str(c) for c, k in zip(values.columns, keep) if k]
+
+    if method == "ward":
+        sample_metric = compound_metric = "euclidean"
+    sample_Z, sample_order = cluster_order(X, sample_metric, method)
+    compound_Z, compound_order = cluster_order(X.T, compound_metric, method)
+    ordered = pd.DataFrame(X[np.ix_(sample_order, compound_order)],
+                           index=[samples[i] for i in sample_order],
+                           columns=[compounds[i] for i in compound_order])
+
+    if output_file:
+        render_heatmap(ordered, sample_Z, compound_Z, output_file, title)
+    return ordered
+
+
+def draw_dendrogram(ax, Z, orientation="top"):
+    """
+    在 ax 上画树状图。所有连线放在一个 LineCollection 中，
+    而不是像 scipy 的 dendrogram 那样每条连线一个 Line2D，几千个叶节点时也能很快渲染。
+    """
+    from matplotlib.collections import LineCollection
+
+    tree = dendrogram(Z, no_plot=True, no_labels=True)
+    icoord, dcoord = np.asarray(tree["icoord"]), np.asarray(tree["dcoord"])
+    # 叶节点位于 5, 15, 25…，换算为热图的行列坐标 0, 1, 2…
+    position = (icoord - 5) / 10
+    if orientation == "left":
+        segments = np.stack([dcoord, position], axis=-1)
+    else:
+        segments = np.stack([position, dcoord], axis=-1)
+    ax.add_collection(LineCollection(segments, colors="k", linewidths=0.6))
+    n_leaves = len(tree["leaves"])
+    height = dcoord.max() if dcoord.size else 1
+    if orientation == "left":
+        ax.set_xlim(height * 1.05, 0)
+        ax.set_ylim(n_leaves - 0.5, -0.5)
+    else:
+        ax.set_xlim(-0.5, n_leaves - 0.5)
+        ax.set_ylim(0, height * 1.05)
+    ax.axis("off")
+
+
+def render_heatmap(ordered, sample_Z, compound_Z, output_file, title="聚类热图"):
+    """把聚类后的矩阵画成热图，左侧为样品树状图，上方为化合物树状图"""
+    # matplotlib 载入较慢，只在作图时载入（只计算聚类顺序时不需要）
+    from matplotlib.figure import Figure
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+
+    n_samples, n_compounds = ordered.shape
+    fig = Figure(figsize=(min(4 + 0.15 * n_compounds, 30), min(3 + 0.25 * n_samples, 30)))
+    FigureCanvasAgg(fig)
+    # 第 3 列留给热图右侧的样品名称，第 4 列为色标
+    grid = fig.add_gridspec(2, 4, width_ratios=[1.5, 10, 1.5, 0.3], height_ratios=[1.5, 10], wspace=0.02,
+                            hspace=0.02)
+
+    if sample_Z is not None:
+        draw_dendrogram(fig.add_subplot(grid[1, 0]), sample_Z, orientation="left")
+    if compound_Z is not None:
+        draw_dendrogram(fig.add_subplot(grid[0, 1]), compound_Z)
+
+    ax = fig.add_subplot(grid[1, 1])
+    # z-score 超过 ±3 的按 ±3 着色，避免个别极端值压缩色阶
+    image = ax.imshow(ordered.to_numpy(), aspect="auto", cmap="RdBu_r", vmin=-3, vmax=3, interpolation="nearest")
+    ax.yaxis.tick_right()
+    if n_samples <= MAX_TICK_LABELS:
+        ax.set_yticks(range(n_samples))
+        ax.set_yticklabels(ordered.index, fontsize=7)
+    else:
+        ax.set_yticks([])
+    if n_compounds <= MAX_TICK_LABELS:
+        ax.set_xticks(range(n_compounds))
+        ax.set_xticklabels(ordered.columns, fontsize=7, rotation=90)
+    else:
+        ax.set_xticks([])
+    fig.colorbar(image, cax=fig.add_subplot(grid[1, 3]), label="z-score")
+    fig.suptitle(title)
+    fig.savefig(output_file, dpi=150, bbox_inches="tight")
+    print(f"聚类热图已保存到: {output_file}")
+    return output_file
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="对转置后的 样品×化合物 表绘制层次聚类热图")
+    parser.add_argument("file", help="转置后的 Excel 文件（第一列为“样品”，例如 PCA 脚本生成的 *_转换后.xlsx）")
+    parser.add_argument("--output", default=None, help="图片保存路径，默认与输入文件同目录")
+    parser.add_argument("--sample-metric", default="euclidean", choices=DISTANCE_METRICS, help="样品间距离")
+    parser.add_argument("--compound-metric", default="correlation", choices=DISTANCE_METRICS, help="化合物间距离")
+    parser.add_argument("--method", default="average", choices=LINKAGE_METHODS, help="聚类方法")
+    parser.add_argument("--vip", default=None, help="OPLS-DA 分析结果（含“化合物名称”“VIP 值”列），用于筛选化合物")
+    parser.add_argument("--top", type=int, default=None, help="只保留 VIP 值最高的化合物数量")
+    args = parser.parse_args()
+
+    table = pd.read_excel(args.file)
+    vip_table = pd.read_excel(args.vip) if args.vip else None
+    output = args.output or os.path.splitext(args.file)[0] + "_聚类热图.png"
+    clustered_heatmap(table, output, sample_metric=args.sample_metric, compound_metric=args.compound_metric,
+                      method=args.method, vip=vip_table, top_n=args.top)
@@ -1,40 +1,59 @@
-import requests
-from bs4 import BeautifulSoup
-from deep_translator import GoogleTranslator
 import pandas as pd
 import time
-from tqdm import tqdm
 import os
+from 运行报告 import RunReport
+from 香气知识库 import AromaKnowledgeBase
 
 
 # 进行网络请求时，捕获可能的SSL错误并自动重试
-def make_request_with_retry(url, data=None, retries=3, delay=5):
+def make_request_with_retry(url, data=None, retries=3, delay=5, report=None):
+    import requests
+
+    report = RunReport.ensure(report)
     for attempt in range(retries):
+        start = time.perf_counter()
         try:
+            report.count("http_requests")
             if data:
                 response = requests.post(url, data=data)
             else:
                 response = requests.get(url)
+            report.observe("http_latency", time.perf_counter() - start)
 
             response.raise_for_status()  # 如果响应码不是200会抛出异常
             return response
         except requests.exceptions.SSLError as ssl_error:
+            report.count("http_ssl_retries")
             print(f"SSL错误发生，正在尝试第 {attempt + 1} 次重试...")
             time.sleep(delay)  # 延迟后重新尝试
         except requests.exceptions.RequestException as e:
+            report.count("http_errors")
             print(f"请求错误: {e}")
             return None
     print("多次尝试后仍无法连接，跳过该请求。")
     return None
 
 
-def search_cas_odor(cas_number):
+def translate(text, report=None):
+    """英译中，并记录翻译请求的耗时"""
+    from deep_translator import GoogleTranslator
+
+    report = RunReport.ensure(report)
+    start = time.perf_counter()
+    translated = GoogleTranslator(source='en', target='zh-CN').translate(text)
+    report.observe("translate_latency", time.perf_counter() - start)
+    return translated
+
+
+def search_cas_odor(cas_number, report=None):
+    from bs4 import BeautifulSoup
+
     # 使用POST请求并将CAS号填入qName字段
     url = 'http://www.perflavory.com/search.php'
     data = {'qName': cas_number}
 
     # 调用带重试机制的请求函数
-    response = make_request_with_retry(url, data)
+    response = make_request_with_retry(url, data, report=report)
 
     if not response:
         return {
@@ -73,13 +92,12 @@ def search_cas_odor(cas_number):
             # 获取化合物英文名称的<a>标签
             compound_name_tag = soup.find('a', onclick=True)
             compound_name = compound_name_tag.text.strip() if compound_name_tag else "请求失败"
-            translated_compound_name = GoogleTranslator(source='en', target='zh-CN').translate(
-                compound_name) if compound_name_tag else "请求失败"
+            translated_compound_name = translate(compound_name, report) if compound_name_tag else "请求失败"
 
             if odor_info:
                 # 获取香气描述的英文内容
                 odor_description = odor_info.get_text(strip=True)
-                translated_odor = GoogleTranslator(source='en', target='zh-CN').translate(odor_description)
+                translated_odor = translate(odor_description, report)
 
                 return {
                     'CAS 编号': cas_number,
@@ -107,57 +125,86 @@ def search_cas_odor(cas_number):
     }
 
 
-# 动态获取Excel文件路径
-input_file = input("请输入Excel文件的路径（例如：C:\\Users\\ymx20\\Desktop\\化合物数据.xlsx）：").strip()
-
-# 打开文件并获取列名
-df = pd.read_excel(input_file)
-
-# 显示所有列名，并让用户选择需要查询的列
-print(f"Excel 文件中包含的列为：{list(df.columns)}")
-column_to_query = input("请输入要爬取数据的列名称（例如：'CAS 编号'）：")
-
-if column_to_query not in df.columns:
-    print(f"列 {column_to_query} 不存在，请检查列名。")
-    exit(1)
-
-# 确定输出文件路径
-output_dir = os.path.dirname(input_file)
-
-# 获取输入文件的文件名（不带扩展名）
-file_name_without_extension = os.path.splitext(os.path.basename(input_file))[0]
-
-# 修改输出文件名称
-output_file = os.path.join(output_dir, f"{file_name_without_extension}_香气描述爬虫.xlsx")
-
-# 获取CAS编号列数据
-total_cas_numbers = len(df[column_to_query])
-results = []
-
-# 循环遍历CAS号并显示进度条
-for index, cas_number in tqdm(enumerate(df[column_to_query]), total=total_cas_numbers, desc="进度", unit="CAS"):
-    print(f"进度: {((index + 1) / total_cas_numbers) * 100:.2f}% 完成")
-    print(f"正在处理 {index + 1}/{total_cas_numbers}：{cas_number}")
-
-    # 获取查询结果
-    result = search_cas_odor(cas_number)
-
-    # 打印查询结果中的详细信息
-    print(f"CAS 编号: {result['CAS 编号']}")
-    print(f"化合物名称 (英文): {result['化合物名称 (英文)']}")
-    print(f"化合物名称 (中文): {result['化合物名称 (中文)']}")
-    print(f"香气描述 (英文): {result['香气描述 (英文)']}")
-    print(f"香气描述 (中文): {result['香气描述 (中文)']}")
-
-    # 将查询结果添加到结果列表
-    results.append(result)
-
-    # 请求间隔5秒
-    time.sleep(5)
-
-# 将结果保存为新的Excel文件，按指定列顺序排列
-output_df = pd.DataFrame(results, columns=[
-    'CAS 编号', '化合物名称 (英文)', '化合物名称 (中文)', '香气描述 (中文)', '香气描述 (英文)'
-])
-output_df.to_excel(output_file, index=False)
-print("已成功保存到:", output_file)
+def main():
+    """交互式检索：输入 Excel 文件和 CAS 编号列，结果保存为 *_香气描述爬虫.xlsx"""
+    # 只在检索时载入进度条，导入本模块（例如从启动器调用）时不加载
+    from tqdm import tqdm
+
+    # 动态获取Excel文件路径
+    input_file = input("请输入Excel文件的路径（例如：C:\\Users\\ymx20\\Desktop\\化合物数据.xlsx）：").strip()
+
+    # 打开文件并获取列名
+    df = pd.read_excel(input_file)
+
+    # 显示所有列名，并让用户选择需要查询的列
+    print(f"Excel 文件中包含的列为：{list(df.columns)}")
+    column_to_query = input("请输入要爬取数据的列名称（例如：'CAS 编号'）：")
+
+    if column_to_query not in df.columns:
+        print(f"列 {column_to_query} 不存在，请检查列名。")
+        return
+
+    # 确定输出文件路径
+    output_dir = os.path.dirname(input_file)
+
+    # 获取输入文件的文件名（不带扩展名）
+    file_name_without_extension = os.path.splitext(os.path.basename(input_file))[0]
+
+    # 修改输出文件名称
+    output_file = os.path.join(output_dir, f"{file_name_without_extension}_香气描述爬虫.xlsx")
+
+    # 获取CAS编号列数据
+    total_cas_numbers = len(df[column_to_query])
+    results = []
+    cache = {}  # 同一 CAS 编号只检索一次
+    report = RunReport("香气描述检索")
+    # 本地香气知识库中描述完整的 CAS 编号直接读取，不再联网；缺少描述的记录仍联网检索，结果写回知识库供下次使用
+    knowledge_base = AromaKnowledgeBase()
+
+    # 循环遍历CAS号并显示进度条
+    for index, cas_number in tqdm(enumerate(df[column_to_query]), total=total_cas_numbers, desc="进度", unit="CAS"):
+        print(f"进度: {((index + 1) / total_cas_numbers) * 100:.2f}% 完成")
+        print(f"正在处理 {index + 1}/{total_cas_numbers}：{cas_number}")
+
+        # 获取查询结果，重复的 CAS 编号直接使用已检索到的结果
+        cached = cas_number in cache
+        if cached:
+            report.count("cache_hits")
+            result = cache[cas_number]
+        else:
+            result = knowledge_base.lookup(cas_number)
+            if result is not None:
+                report.count("knowledge_base_hits")
+                cached = True
+            else:
+                report.count("cache_misses")
+                result = search_cas_odor(cas_number, report=report)
+                knowledge_base.add_records([result], source="perflavory")
+            cache[cas_number] = result
+
+        # 打印查询结果中的详细信息
+        print(f"CAS 编号: {result['CAS 编号']}")
+        print(f"化合物名称 (英文): {result['化合物名称 (英文)']}")
+        print(f"化合物名称 (中文): {result['化合物名称 (中文)']}")
+        print(f"香气描述 (英文): {result['香气描述 (英文)']}")
+        print(f"香气描述 (中文): {result['香气描述 (中文)']}")
+
+        # 将查询结果添加到结果列表
+        results.append(result)
+
+        # 请求间隔5秒，命中缓存或知识库时没有发出请求，无需等待
+        if not cached:
+            time.sleep(5)
+
+    # 将结果保存为新的Excel文件，按指定列顺序排列
+    output_df = pd.DataFrame(results, columns=[
+        'CAS 编号', '化合物名称 (英文)', '化合物名称 (中文)', '香气描述 (中文)', '香气描述 (英文)'
+    ])
+    output_df.to_excel(output_file, index=False)
+    print("已成功保存到:", output_file)
+    knowledge_base.close()
+    report.save(output_dir)
+
+
+if __name__ == "__main__":
+    main()
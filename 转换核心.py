@@ -0,0 +1,180 @@
+import os
+import numpy as np
+import pandas as pd
+from 运行报告 import StageRecord
+from 异构体规则 import split_isomers
+from 保留指数校准 import recalibrate
+
+
+# 转换的核心逻辑：读取 → 准备 → 去重 → 写出，全部为普通函数，不弹窗、不使用模块级变量、不修改传入的 DataFrame，
+# 可在多个线程或进程中同时处理不同文件。图形界面、命令行、任务服务器和基准测试都只是在外面包一层。
+
+
+def read_peak_table(file_path):
+    """读取 MassHunter 导出的 CSV 峰表（utf-8 失败时改用 gbk），并去掉列名两端的空格"""
+    try:
+        df = pd.read_csv(file_path, encoding='utf-8')
+    except UnicodeDecodeError:
+        df = pd.read_csv(file_path, encoding='gbk')
+    df.columns = df.columns.str.strip()
+    return df
+
+
+def record_diagnostics(stage, diagnostics):
+    """把诊断信息合并到运行报告的阶段记录中（计数器累加，其余字段直接写入）"""
+    for key, value in diagnostics.items():
+        if key == "counters":
+            for name, n in value.items():
+                stage.count(name, n)
+        elif isinstance(value, dict):
+            stage.count_by(key, value)
+        else:
+            stage[key] = value
+
+
+def prepare_table(df, rules, diagnostics, alkanes=None, filtering=True):
+    """
+    去重前的准备：（筛选时）填充浓度空值、（可选）校准保留指数、分离同分异构体、（筛选时）计算“RI 差值”。
+    缺少必要的列时在 diagnostics["skipped"] 中记下原因并返回 None。
+    :param diagnostics: 记录诊断信息的 StageRecord（也可以直接传入运行报告的阶段记录）
+    :param filtering: 是否做 RI 差值筛选；不筛选时只要求有“CAS 编号”列
+    :return: (待去重的 DataFrame, 同分异构体行) 或 None
+    """
+    diagnostics["rows_in"] = len(df)
+
+    # 填充“估计的浓度.”中的空值为 0，确保后续计算不会报错
+    if filtering:
+        if '估计的浓度.' not in df.columns:
+            diagnostics["skipped"] = "缺少 '估计的浓度.' 列"
+            return None
+        df = df.assign(**{'估计的浓度.': df['估计的浓度.'].fillna(0)})
+
+    # 用正构烷烃标准重新校准保留指数（同分异构体按 RI 排序，需在分离前完成）
+    if alkanes is not None:
+        if '组分 RT' not in df.columns:
+            diagnostics["skipped"] = "缺少 '组分 RT' 列"
+            return None
+        df, out_of_range = recalibrate(df, *alkanes)
+        diagnostics.count("ri_out_of_range", out_of_range)
+
+    # 按异构体规则表分离同分异构体（如 38818-55-2 巨豆三烯酮），按 RI 顺序标注后单独保留
+    if 'CAS 编号' not in df.columns:
+        diagnostics["skipped"] = "缺少 'CAS 编号' 列"
+        return None
+    df, isomer_rows = split_isomers(df, rules)
+    diagnostics["isomer_rows"] = len(isomer_rows)
+
+    # 计算“组分 RI”和“谱库 RI”的差值，并创建新列“RI 差值”
+    if filtering:
+        if '组分 RI' not in df.columns or '谱库 RI' not in df.columns:
+            diagnostics["skipped"] = "缺少 '组分 RI' 或 '谱库 RI' 列"
+            return None
+        df = df.assign(**{'RI 差值': (df['组分 RI'] - df['谱库 RI']).abs()})
+    return df, isomer_rows
+
+
+def merge_duplicates(df, diagnostics):
+    """
+    同一 CAS 编号有多行时只保留“RI 差值”最小的一行（相同时取最前面的一行），浓度改为这些行之和。
+    结果按 CAS 编号第一次出现的顺序排列，没有 CAS 编号的行不保留。
+    一次分组排序完成全部 CAS 编号，与逐个 CAS 编号筛选、拼接的结果相同。
+    df 中没有“RI 差值”列时（不筛选的转换）只为有重复的行计算差值，其余行为空。
+    :return: (结果 DataFrame, 每行是否由重复行合并而来的布尔数组)
+    """
+    df = df[df['CAS 编号'].notna()]
+    codes = df.groupby('CAS 编号', sort=False).ngroup().to_numpy()
+    sizes = np.bincount(codes, minlength=codes.max() + 1 if len(codes) else 0)
+
+    if 'RI 差值' in df.columns:
+        diff = pd.to_numeric(df['RI 差值'], errors='coerce')
+    elif '组分 RI' in df.columns and '谱库 RI' in df.columns:
+        diff = (pd.to_numeric(df['组分 RI'], errors='coerce') - pd.to_numeric(df['谱库 RI'], errors='coerce')).abs()
+    else:
+        diff = pd.Series(np.nan, index=df.index)
+    # 按 (CAS 编号, RI 差值, 原顺序) 排序，每组第一行即保留的行；没有差值的行排在组内最后
+    keys = diff.to_numpy(dtype=np.float64, na_value=np.nan)
+    order = np.lexsort((np.where(np.isnan(keys), np.inf, keys), codes))
+    first = order[np.r_[True, codes[order][1:] != codes[order][:-1]]] if len(order) else order
+
+    result = df.iloc[first].reset_index(drop=True)
+    duplicated = sizes > 1
+    if duplicated.any():
+        totals = df['估计的浓度.'].groupby(codes).sum().to_numpy()
+        result['估计的浓度.'] = result['估计的浓度.'].where(~duplicated, totals)
+        if 'RI 差值' not in df.columns and '组分 RI' in df.columns and '谱库 RI' in df.columns:
+            result['RI 差值'] = np.where(duplicated, keys[first], np.nan)
+
+    merged = dict(zip(result.loc[duplicated, 'CAS 编号'], sizes[duplicated] - 1))
+    diagnostics.count("duplicates_merged", sum(merged.values()))
+    diagnostics.count_by("duplicates_by_cas", merged)
+    return result, duplicated
+
+
+def convert_table(df, rules, ri_threshold=None, alkanes=None):
+    """
+    转换一个峰表：准备 →（可选）按 RI 差值阈值筛选 → 同 CAS 编号去重 → 追加同分异构体行。
+    不修改 df，不读写文件。
+    :param ri_threshold: RI 差值阈值，None 时不筛选（csv转化为xlsx格式.py 的转换方式）
+    :param alkanes: 正构烷烃标准 (碳数, 保留时间)，传入时先重新计算“组分 RI”
+    :return: (结果 DataFrame, 高亮行的布尔数组, 诊断信息 StageRecord)；
+             缺少必要的列时前两项为 None，诊断信息的 "skipped" 为原因
+    """
+    diagnostics = StageRecord()
+    prepared = prepare_table(df, rules, diagnostics, alkanes, filtering=ri_threshold is not None)
+    if prepared is None:
+        return None, None, diagnostics
+    df, isomer_rows = prepared
+
+    # 根据 RI 差值阈值过滤数据
+    if ri_threshold is not None:
+        rows_before_filter = len(df)
+        df = df[df['RI 差值'] <= ri_threshold]
+        diagnostics.count("ri_dropped", rows_before_filter - len(df))
+
+    result, highlight = merge_duplicates(df, diagnostics)
+    # 将标注后的同分异构体追加到结果
+    result = pd.concat([result, isomer_rows], ignore_index=True)
+    highlight = np.r_[highlight, np.zeros(len(isomer_rows), dtype=bool)]
+    diagnostics["rows_out"] = len(result)
+    return result, highlight, diagnostics
+
+
+def write_result(result, output_path, highlight=None):
+    """
+    保存转换结果。传入 highlight 时写入“结果”工作表，并把合并了重复行的“RI 差值”单元格标为黄色。
+    """
+    if highlight is None:
+        result.to_excel(output_path, index=False)
+        return
+    from openpyxl.styles import PatternFill
+
+    with pd.ExcelWriter(output_path, engine='openpyxl') as writer:
+        result.to_excel(writer, index=False, sheet_name='结果')
+        if 'RI 差值' not in result.columns:
+            return
+        worksheet = writer.sheets['结果']
+        fill = PatternFill(start_color="FFFF00", end_color="FFFF00", fill_type="solid")
+        column = result.columns.get_loc('RI 差值') + 1
+        for row_idx in np.flatnonzero(highlight):
+            # DataFrame 的行索引对应 Excel 的行，需加 2（表头占一行）
+            worksheet.cell(row=int(row_idx) + 2, column=column).fill = fill
+
+
+def convert_file(file_path, output_folder, rules, ri_threshold=None, alkanes=None, stage=None):
+    """
+    转换一个 CSV 文件并保存为输出文件夹中的“转换后_<原文件名>.xlsx”。
+    筛选时高亮合并了重复行的“RI 差值”，不筛选时与原来的转换一样不做高亮。
+    :param stage: 运行报告的阶段记录，传入时把诊断信息写入其中
+    :return: (输出文件路径, 诊断信息)；文件被跳过时输出路径为 None
+    """
+    result, highlight, diagnostics = convert_table(read_peak_table(file_path), rules, ri_threshold, alkanes)
+    if stage is not None:
+        record_diagnostics(stage, diagnostics)
+    if result is None:
+        return None, diagnostics
+
+    # 保存结果为 XLSX 文件，保持原文件名，仅更改后缀
+    base_name = os.path.splitext(os.path.basename(file_path))[0]
+    output_path = os.path.join(output_folder, f"转换后_{base_name}.xlsx")
+    write_result(result, output_path, highlight if ri_threshold is not None else None)
+    return output_path, diagnostics
@@ -0,0 +1,176 @@
+import os
+import sys
+import json
+import time
+import shutil
+import signal
+import platform
+import tempfile
+import subprocess
+from contextlib import contextmanager
+from datetime import datetime
+
+try:
+    import resource
+except ImportError:  # Windows 下没有 resource 模块
+    resource = None
+
+
+def peak_rss_mb():
+    """进程的峰值常驻内存（MB），无法获取时返回 None"""
+    if resource is None:
+        return None
+    usage = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # macOS 下单位为字节，Linux 下为 KB
+    return round(usage / 1024 / 1024 if sys.platform == "darwin" else usage / 1024, 1)
+
+
+def summarize(values):
+    """把一组观测值（例如请求耗时）汇总为 次数/均值/中位数/P95/最大值"""
+    if not values:
+        return {"count": 0}
+    ordered = sorted(values)
+    n = len(ordered)
+    return {
+        "count": n,
+        "total": round(sum(ordered), 4),
+        "mean": round(sum(ordered) / n, 4),
+        "p50": round(ordered[n // 2], 4),
+        "p95": round(ordered[min(n - 1, int(n * 0.95))], 4),
+        "max": round(ordered[-1], 4),
+    }
+
+
+class StageRecord(dict):
+    """单个处理阶段的记录，本身就是可直接写入 JSON 的字典"""
+
+    def count(self, key, n=1):
+        """累加计数器，例如被 RI 差值筛选剔除的行数"""
+        counters = self.setdefault("counters", {})
+        counters[key] = counters.get(key, 0) + int(n)
+
+    def count_by(self, key, mapping):
+        """按键累加计数，例如每个 CAS 编号合并掉的重复行数"""
+        table = self.setdefault(key, {})
+        for k, n in mapping.items():
+            table[str(k)] = table.get(str(k), 0) + int(n)
+
+
+class RunReport:
+    """
+    一次运行的结构化记录：每个阶段的耗时、峰值内存、输入输出行数和自定义计数，
+    以及请求耗时等观测值，最后保存为 JSON。
+    enabled=False 时所有方法都不做任何事，调用方无需判断。
+    profile 可选 "cprofile" 或 "py-spy"，也可用环境变量 GCMS_PROFILE 指定。
+    """
+
+    def __init__(self, name, enabled=True, profile=None):
+        self.name = name
+        self.enabled = enabled
+        self.profile = profile or os.environ.get("GCMS_PROFILE") or None
+        self.stages = []
+        self.counters = {}
+        self.observations = {}
+        self.started = datetime.now()
+        self._start = time.perf_counter()
+        self._profiler = None
+        self._py_spy = None
+        self._py_spy_output = None
+        self._profile_output = None
+        if self.enabled and self.profile:
+            self._start_profile()
+
+    @classmethod
+    def ensure(cls, report):
+        """函数参数 report 为 None 时返回一个不记录任何内容的空报告"""
+        return report if report is not None else cls("", enabled=False)
+
+    @contextmanager
+    def stage(self, name, **info):
+        """
+        记录一个处理阶段：
+            with report.stage("转换", file=path) as st:
+                st["rows_in"] = len(df)
+        """
+        record = StageRecord(stage=name, **info)
+        if not self.enabled:
+            yield record
+            return
+        start = time.perf_counter()
+        try:
+            yield record
+        except Exception as e:
+            record["error"] = f"{type(e).__name__}: {e}"
+            raise
+        finally:
+            record["seconds"] = round(time.perf_counter() - start, 4)
+            record["peak_rss_mb"] = peak_rss_mb()
+            self.stages.append(record)
+
+    def count(self, key, n=1):
+        """累加整个运行级别的计数器，例如香气检索的缓存命中次数"""
+        if self.enabled:
+            self.counters[key] = self.counters.get(key, 0) + int(n)
+
+    def observe(self, key, value):
+        """记录一次观测值，例如一次 HTTP 请求的耗时（秒）"""
+        if self.enabled:
+            self.observations.setdefault(key, []).append(float(value))
+
+    def _start_profile(self):
+        """按 self.profile 开启热点分析，结果在 save() 时写到报告旁边"""
+        if self.profile == "cprofile":
+            import cProfile
+            self._profiler = cProfile.Profile()
+            self._profiler.enable()
+        elif self.profile == "py-spy":
+            if shutil.which("py-spy") is None:
+                print("未找到 py-spy 命令，跳过热点分析。可通过 pip install py-spy 安装。")
+                return
+            fd, self._py_spy_output = tempfile.mkstemp(suffix=".svg")
+            os.close(fd)
+            self._py_spy = subprocess.Popen(["py-spy", "record", "-o", self._py_spy_output,
+                                             "--pid", str(os.getpid())])
+        else:
+            print(f"未知的热点分析方式：{self.profile}，可选 cprofile 或 py-spy")
+
+    def _stop_profile(self, output_base):
+        if self._profiler is not None:
+            self._profiler.disable()
+            self._profile_output = output_base + ".prof"
+            self._profiler.dump_stats(self._profile_output)
+            self._profiler = None
+        if self._py_spy is not None:
+            # py-spy 收到 SIGINT 后才会写出火焰图
+            self._py_spy.send_signal(signal.SIGINT if os.name != "nt" else signal.CTRL_C_EVENT)
+            self._py_spy.wait(timeout=30)
+            self._py_spy = None
+            self._profile_output = output_base + ".svg"
+            shutil.move(self._py_spy_output, self._profile_output)
+
+    def to_dict(self):
+        return {
+            "name": self.name,
+            "started": self.started.isoformat(timespec="seconds"),
+            "seconds": round(time.perf_counter() - self._start, 4),
+            "peak_rss_mb": peak_rss_mb(),
+            "python": platform.python_version(),
+            "stages": self.stages,
+            "counters": self.counters,
+            "observations": {key: summarize(values) for key, values in self.observations.items()},
+            "profile": self._profile_output,
+        }
+
+    def save(self, folder):
+        """把报告保存到 folder 下的 运行报告_<名称>_<时间>.json，返回文件路径"""
+        if not self.enabled:
+            return None
+        if not os.path.exists(folder):
+            os.makedirs(folder)
+        base = os.path.join(folder, f"运行报告_{self.name}_{self.started:%Y%m%d_%H%M%S}")
+        self._stop_profile(base)
+        path = base + ".json"
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.to_dict(), f, ensure_ascii=False, indent=2, default=str)
+        print(f"运行报告已保存到: {path}")
+        return path
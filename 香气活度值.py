@@ -0,0 +1,127 @@
+import os
+import argparse
+import numpy as np
+import pandas as pd
+from 化合物注册表 import normalize_cas
+from 香气知识库 import AromaKnowledgeBase, DEFAULT_DB_PATH
+
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_THRESHOLDS_PATH = os.path.join(SCRIPT_DIR, "香气阈值.csv")
+
+# 香气描述列，可来自阈值表本身或香气检索脚本的输出（*_香气描述爬虫.xlsx）
+DESCRIPTOR_COLUMNS = ["化合物名称 (中文)", "香气描述 (中文)", "香气描述 (英文)"]
+
+
+def read_any(path):
+    """读取 CSV（UTF-8 或 GBK）或 Excel 表格"""
+    if os.path.splitext(path)[1].lower() in (".xlsx", ".xls"):
+        return pd.read_excel(path, dtype={"CAS 编号": str})
+    try:
+        return pd.read_csv(path, encoding="utf-8-sig", dtype={"CAS 编号": str})
+    except UnicodeDecodeError:
+        return pd.read_csv(path, encoding="gbk", dtype={"CAS 编号": str})
+
+
+def load_thresholds(path=DEFAULT_THRESHOLDS_PATH):
+    """
+    读取本地香气阈值表：必须包含“CAS 编号”和“阈值”两列，阈值单位须与合并表中的浓度单位一致。
+    可另含香气描述列（见 DESCRIPTOR_COLUMNS）。同一 CAS 编号有多个阈值时取最小值。
+    :return: 以规范化 CAS 编号为索引的 DataFrame
+    """
+    table = read_any(path)
+    table.columns = table.columns.astype(str).str.strip()
+    missing = {"CAS 编号", "阈值"} - set(table.columns)
+    if missing:
+        raise ValueError(f"香气阈值表 {path} 缺少列：{', '.join(sorted(missing))}")
+    table["CAS 编号"] = table["CAS 编号"].map(normalize_cas)
+    table["阈值"] = pd.to_numeric(table["阈值"], errors="coerce")
+    table = table[(table["CAS 编号"] != "") & (table["阈值"] > 0)]
+    return table.sort_values("阈值").drop_duplicates("CAS 编号").set_index("CAS 编号")
+
+
+def load_descriptors(path):
+    """读取香气描述表（例如香气检索脚本的输出），以规范化 CAS 编号为索引，检索失败的描述视为空"""
+    table = read_any(path)
+    table["CAS 编号"] = table["CAS 编号"].map(normalize_cas)
+    table = table[table["CAS 编号"] != ""].drop_duplicates("CAS 编号").set_index("CAS 编号")
+    columns = [c for c in DESCRIPTOR_COLUMNS if c in table.columns]
+    return table[columns].replace("请求失败", np.nan)
+
+
+def compute_oav(merged, sample_columns, thresholds, cas_column="CAS 编号"):
+    """
+    计算香气活度值 OAV = 浓度 / 阈值，整个 化合物×样品 矩阵一次相除。
+    没有阈值的化合物 OAV 为 NaN，未检出（"--" 或空值）的 OAV 也为 NaN。
+    :return: (OAV 矩阵 DataFrame，与 merged 同索引、列为样品；每个化合物的阈值 Series)
+    """
+    cas = merged[cas_column].map(normalize_cas)
+    threshold = cas.map(thresholds["阈值"]).astype(np.float64)
+    concentrations = merged[sample_columns].apply(pd.to_numeric, errors="coerce").to_numpy(dtype=np.float64)
+    oav = concentrations / threshold.to_numpy()[:, None]
+    return pd.DataFrame(oav, index=merged.index, columns=sample_columns), threshold
+
+
+def oav_table(merged, sample_columns, thresholds, descriptors=None, info_columns=None, cas_column="CAS 编号"):
+    """
+    合并化合物信息、香气描述、阈值和各样品的 OAV，并标记关键香气化合物（任一样品 OAV > 1）。
+    香气描述优先取自 descriptors，缺少时取阈值表中的描述，不进行任何网络检索。
+    """
+    info_columns = info_columns or [c for c in ("CAS 编号", "化合物名称", "用户定义的谱库化合物", "组分 RI")
+                                    if c in merged.columns]
+    oav, threshold = compute_oav(merged, sample_columns, thresholds, cas_column)
+    cas = merged[cas_column].map(normalize_cas)
+
+    table = merged[info_columns].copy()
+    for column in DESCRIPTOR_COLUMNS:
+        values = pd.Series(np.nan, index=merged.index, dtype=object)
+        if descriptors is not None and column in descriptors.columns:
+            values = cas.map(descriptors[column])
+        if column in thresholds.columns:
+            values = values.fillna(cas.map(thresholds[column]))
+        if values.notna().any():
+            table[column] = values
+    table["阈值"] = threshold
+    table["OAV>1 样品数"] = (oav > 1).sum(axis=1)
+    table["最大 OAV"] = oav.max(axis=1)
+    table["关键香气化合物"] = np.where(table["OAV>1 样品数"] > 0, "是", "否")
+    oav.columns = [f"{c}_OAV" if not str(c).endswith("_OAV") else c for c in oav.columns]
+    return pd.concat([table, oav], axis=1)
+
+
+def export_oav_workbook(table, output_file):
+    """
+    把 OAV 结果保存为一个工作簿：全部化合物、关键香气化合物（OAV>1，按最大 OAV 排序）、缺少阈值的化合物。
+    """
+    key_compounds = table[table["关键香气化合物"] == "是"].sort_values("最大 OAV", ascending=False)
+    no_threshold = table[table["阈值"].isna()].drop(columns=["阈值", "OAV>1 样品数", "最大 OAV", "关键香气化合物"])
+    no_threshold = no_threshold[[c for c in no_threshold.columns if not str(c).endswith("_OAV")]]
+    with pd.ExcelWriter(output_file) as writer:
+        table.to_excel(writer, sheet_name="OAV", index=False)
+        key_compounds.to_excel(writer, sheet_name="关键香气化合物", index=False)
+        no_threshold.to_excel(writer, sheet_name="缺少阈值", index=False)
+    print(f"OAV 结果已保存到: {output_file}（关键香气化合物 {len(key_compounds)} 个，缺少阈值 {len(no_threshold)} 个）")
+    return output_file
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="按本地香气阈值表计算香气活度值（OAV）")
+    parser.add_argument("file", help="合并脚本输出的 Excel 文件（每行一个化合物，含“CAS 编号”和各样品的浓度列）")
+    parser.add_argument("--thresholds", default=DEFAULT_THRESHOLDS_PATH, help="香气阈值表（CSV 或 Excel，含“CAS 编号”“阈值”列）")
+    parser.add_argument("--descriptors", default=None,
+                        help="香气描述表，例如香气检索脚本输出的 *_香气描述爬虫.xlsx；不指定时使用本地香气知识库（如果有）")
+    parser.add_argument("--output", default=None, help="输出文件，默认为 输入文件名_OAV.xlsx")
+    args = parser.parse_args()
+
+    merged_table = pd.read_excel(args.file, dtype={"CAS 编号": str})
+    samples = [c for c in merged_table.columns if str(c).endswith("_浓度")]
+    if args.descriptors:
+        descriptor_table = load_descriptors(args.descriptors)
+    elif os.path.exists(DEFAULT_DB_PATH):
+        kb = AromaKnowledgeBase(DEFAULT_DB_PATH)
+        descriptor_table = kb.descriptor_table(merged_table["CAS 编号"])
+        kb.close()
+    else:
+        descriptor_table = None
+    result = oav_table(merged_table, samples, load_thresholds(args.thresholds), descriptor_table)
+    export_oav_workbook(result, args.output or os.path.splitext(args.file)[0] + "_OAV.xlsx")
@@ -0,0 +1,239 @@
+import os
+import re
+import json
+import sqlite3
+import argparse
+import pandas as pd
+from 化合物注册表 import normalize_cas
+
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_DB_PATH = os.path.join(SCRIPT_DIR, "香气知识库.sqlite")
+
+# 与香气检索脚本输出相同的列
+RECORD_COLUMNS = ["CAS 编号", "化合物名称 (英文)", "化合物名称 (中文)", "香气描述 (中文)", "香气描述 (英文)"]
+
+# 导入时可识别的其他列名（小写），映射到上面的标准列
+COLUMN_ALIASES = {
+    "cas": "CAS 编号", "cas_number": "CAS 编号", "cas no": "CAS 编号", "cas号": "CAS 编号", "cas 编号": "CAS 编号",
+    "name": "化合物名称 (英文)", "name_en": "化合物名称 (英文)", "英文名称": "化合物名称 (英文)",
+    "name_cn": "化合物名称 (中文)", "中文名称": "化合物名称 (中文)",
+    "odor": "香气描述 (英文)", "odor_en": "香气描述 (英文)", "odour": "香气描述 (英文)", "descriptors": "香气描述 (英文)",
+    "odor_cn": "香气描述 (中文)", "香气描述": "香气描述 (中文)",
+}
+
+# 香气描述的分隔符：中英文逗号、分号、顿号、斜杠、空白等
+DESCRIPTOR_SPLIT = re.compile(r"[\s,;，；、/|:：()（）\[\]]+")
+
+# 香气检索失败时写入的占位文本
+FAILED = "请求失败"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS compounds (
+    cas TEXT PRIMARY KEY,
+    name_en TEXT,
+    name_cn TEXT,
+    odor_cn TEXT,
+    odor_en TEXT,
+    source TEXT
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS descriptors (
+    term TEXT NOT NULL,
+    cas TEXT NOT NULL,
+    PRIMARY KEY (term, cas)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS descriptors_cas ON descriptors (cas);
+"""
+
+
+def tokenize_descriptors(*texts):
+    """
+    把香气描述拆成检索词：按标点和空白分割，英文统一小写，中文描述按顿号、逗号等分割。
+    英文短语（如 green apple）同时保留整个短语和其中的每个单词。
+    """
+    terms = set()
+    for text in texts:
+        if not isinstance(text, str) or not text.strip() or text == FAILED:
+            continue
+        text = text.casefold()
+        for phrase in re.split(r"[,;，；、/|]+", text):
+            phrase = phrase.strip()
+            if phrase:
+                terms.add(phrase)
+                terms.update(word for word in DESCRIPTOR_SPLIT.split(phrase) if len(word) > 1)
+    return terms
+
+
+def read_dump(path):
+    """
+    读取香气参考数据（CSV、Excel 或 JSON，JSON 为记录列表），列名统一为 RECORD_COLUMNS。
+    香气检索脚本输出的 *_香气描述爬虫.xlsx 可直接导入。
+    """
+    extension = os.path.splitext(path)[1].lower()
+    if extension == ".json":
+        with open(path, encoding="utf-8") as f:
+            table = pd.DataFrame(json.load(f))
+    elif extension in (".xlsx", ".xls"):
+        table = pd.read_excel(path, dtype=str)
+    else:
+        try:
+            table = pd.read_csv(path, encoding="utf-8-sig", dtype=str)
+        except UnicodeDecodeError:
+            table = pd.read_csv(path, encoding="gbk", dtype=str)
+    table = table.rename(columns=lambda c: COLUMN_ALIASES.get(str(c).strip().casefold(), str(c).strip()))
+    if "CAS 编号" not in table.columns:
+        raise ValueError(f"香气参考数据 {path} 中没有 CAS 编号列")
+    for column in RECORD_COLUMNS:
+        if column not in table.columns:
+            table[column] = None
+    return table[RECORD_COLUMNS]
+
+
+class AromaKnowledgeBase:
+    """
+    本地香气知识库（SQLite）：compounds 表以 CAS 编号为主键，descriptors 表为 检索词→CAS 编号 的倒排索引。
+    按 CAS 编号查询和按香气描述检索都走 B 树索引，不需要联网。
+    """
+
+    def __init__(self, path=DEFAULT_DB_PATH):
+        self.path = path
+        self.connection = sqlite3.connect(path)
+        self.connection.executescript(SCHEMA)
+
+    def __len__(self):
+        return self.connection.execute("SELECT COUNT(*) FROM compounds").fetchone()[0]
+
+    def close(self):
+        self.connection.close()
+
+    def add_records(self, records, source=None):
+        """
+        批量写入记录（字典列表或 DataFrame，列为 RECORD_COLUMNS），同一 CAS 编号以新记录为准。
+        检索失败（“请求失败”）的字段不写入，不会覆盖已有的描述。
+        :return: 写入的化合物数
+        """
+        if isinstance(records, pd.DataFrame):
+            records = records.to_dict("records")
+        rows = []
+        for record in records:
+            cas = normalize_cas(record.get("CAS 编号"))
+            if not cas:
+                continue
+            values = [record.get(c) if isinstance(record.get(c), str) and record.get(c) != FAILED else None
+                      for c in RECORD_COLUMNS[1:]]
+            if not any(values):
+                continue
+            rows.append((cas, *values, source))
+
+        with self.connection:
+            self.connection.executemany(
+                "INSERT INTO compounds (cas, name_en, name_cn, odor_cn, odor_en, source) VALUES (?, ?, ?, ?, ?, ?) "
+                "ON CONFLICT (cas) DO UPDATE SET name_en = COALESCE(excluded.name_en, name_en), "
+                "name_cn = COALESCE(excluded.name_cn, name_cn), odor_cn = COALESCE(excluded.odor_cn, odor_cn), "
+                "odor_en = COALESCE(excluded.odor_en, odor_en), source = excluded.source", rows)
+            # 按合并后的描述重建这些化合物的倒排索引，旧描述中的检索词一并删除
+            updated = [(row[0],) for row in rows]
+            self.connection.executemany("DELETE FROM descriptors WHERE cas = ?", updated)
+            terms = []
+            for (cas,) in updated:
+                odor_cn, odor_en = self.connection.execute(
+                    "SELECT odor_cn, odor_en FROM compounds WHERE cas = ?", (cas,)).fetchone()
+                terms.extend((term, cas) for term in tokenize_descriptors(odor_cn, odor_en))
+            self.connection.executemany("INSERT OR IGNORE INTO descriptors (term, cas) VALUES (?, ?)", terms)
+        return len(rows)
+
+    def import_dump(self, path):
+        """从 CSV/Excel/JSON 文件批量导入，见 read_dump"""
+        return self.add_records(read_dump(path), source=os.path.basename(path))
+
+    def lookup(self, cas, complete=True):
+        """
+        按 CAS 编号查询，返回与 search_cas_odor 相同格式的字典；没有记录时返回 None。
+        缺少的字段填“请求失败”，与联网检索的输出保持一致。
+        :param complete: 为 True 时缺少中文或英文香气描述的记录也返回 None，由调用方联网补全
+        """
+        key = normalize_cas(cas)
+        row = self.connection.execute(
+            "SELECT name_en, name_cn, odor_cn, odor_en FROM compounds WHERE cas = ?", (key,)).fetchone()
+        if row is None or (complete and not all(row[2:])):
+            return None
+        return dict(zip(RECORD_COLUMNS, [cas] + [value or FAILED for value in row]))
+
+    def search(self, term, prefix=True):
+        """
+        按香气描述检索 CAS 编号，例如 "fruity"、"烟熏"。
+        prefix 为 True 时按前缀匹配（"fruit" 可匹配 fruity），仍走索引的范围扫描。
+        :return: CAS 编号的集合
+        """
+        term = term.strip().casefold()
+        if prefix:
+            rows = self.connection.execute(
+                "SELECT DISTINCT cas FROM descriptors WHERE term >= ? AND term < ?", (term, term + "\uffff"))
+        else:
+            rows = self.connection.execute("SELECT cas FROM descriptors WHERE term = ?", (term,))
+        return {cas for (cas,) in rows}
+
+    def descriptor_table(self, cas_numbers=None):
+        """
+        把知识库（或其中部分 CAS 编号）导出为以规范化 CAS 编号为索引的 DataFrame，
+        可直接作为 香气活度值.oav_table 的 descriptors 参数。
+        """
+        table = pd.read_sql_query("SELECT cas, name_en, name_cn, odor_cn, odor_en FROM compounds", self.connection)
+        table.columns = RECORD_COLUMNS
+        table = table.set_index("CAS 编号")
+        if cas_numbers is not None:
+            table = table[table.index.isin({normalize_cas(c) for c in cas_numbers})]
+        return table
+
+
+def find_compounds(merged, knowledge_base, terms, sample_columns=None, cas_column="CAS 编号"):
+    """
+    在合并表中找出香气描述包含 terms 中任一检索词的已检出化合物（例如哪些化合物有果香、烟熏味）。
+    :param sample_columns: 浓度列，至少一个样品浓度大于 0 才算检出；为 None 时不按浓度筛选
+    :return: 合并表中符合条件的行，增加“匹配的香气描述”列
+    """
+    if isinstance(terms, str):
+        terms = [terms]
+    cas = merged[cas_column].map(normalize_cas)
+    hits = pd.DataFrame({term: cas.isin(knowledge_base.search(term)) for term in terms}, index=merged.index)
+    mask = hits.any(axis=1)
+    if sample_columns:
+        concentrations = merged[sample_columns].apply(pd.to_numeric, errors="coerce")
+        mask &= (concentrations > 0).any(axis=1)
+    result = merged[mask].copy()
+    result.insert(0, "匹配的香气描述", hits[mask].apply(lambda row: "、".join(row.index[row]), axis=1))
+    return result
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="本地香气知识库")
+    parser.add_argument("--db", default=DEFAULT_DB_PATH, help="知识库文件")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    import_parser = subparsers.add_parser("import", help="导入香气参考数据（CSV、Excel 或 JSON）")
+    import_parser.add_argument("files", nargs="+", help="参考数据文件，可以是香气检索脚本输出的 *_香气描述爬虫.xlsx")
+    lookup_parser = subparsers.add_parser("lookup", help="按 CAS 编号查询")
+    lookup_parser.add_argument("cas", nargs="+")
+    search_parser = subparsers.add_parser("search", help="按香气描述检索化合物")
+    search_parser.add_argument("terms", nargs="+", help="香气描述，例如 fruity smoky 果香")
+    search_parser.add_argument("--merged", default=None, help="合并脚本输出的 Excel 文件，只列出其中已检出的化合物")
+    args = parser.parse_args()
+
+    kb = AromaKnowledgeBase(args.db)
+    if args.command == "import":
+        for file in args.files:
+            print(f"{file}: 导入 {kb.import_dump(file)} 个化合物")
+        print(f"知识库共有 {len(kb)} 个化合物")
+    elif args.command == "lookup":
+        for cas_number in args.cas:
+            print(kb.lookup(cas_number, complete=False) or f"{cas_number}: 知识库中没有记录")
+    elif args.merged:
+        table = pd.read_excel(args.merged, dtype={"CAS 编号": str})
+        samples = [c for c in table.columns if str(c).endswith("_浓度")]
+        found = find_compounds(table, kb, args.terms, samples)
+        output = os.path.splitext(args.merged)[0] + "_香气检索.xlsx"
+        found.to_excel(output, index=False)
+        print(f"找到 {len(found)} 个已检出的化合物，已保存到: {output}")
+    else:
+        for term in args.terms:
+            print(f"{term}: {', '.join(sorted(kb.search(term))) or '没有匹配的化合物'}")
+    kb.close()
@@ -0,0 +1,230 @@
+import os
+import argparse
+import numpy as np
+import pandas as pd
+import scipy.sparse as sp
+from 化合物注册表 import normalize_cas
+from 样品分组 import strip_suffix
+from 香气知识库 import tokenize_descriptors, AromaKnowledgeBase, DEFAULT_DB_PATH, DESCRIPTOR_SPLIT
+from 香气活度值 import load_descriptors
+
+
+# 香气类别及其关键词（英文小写和中文），一个化合物可以属于多个类别。
+# 英文关键词匹配以它开头、后缀不超过 MAX_SUFFIX 个字母的单词（smok 匹配 smoky、smoked，pine 不匹配 pineapple），
+# PREFIX_EXCLUDED 中的单词只匹配与它完全相同的关键词（nut 不匹配 nutmeg）；中文关键词只要出现在描述中即匹配。
+# 复合词和词形变化不同的单词需单独列出词干（strawberr 匹配 strawberry、strawberries，chees 匹配 cheese、cheesy）
+DEFAULT_CATEGORIES = {
+    "果香": ["fruit", "apple", "banana", "pear", "berr", "strawberr", "raspberr", "blackberr", "blueberr", "cranberr",
+           "peach", "apricot", "pineapple", "plum", "grape", "cherr",
+           "果香", "水果", "苹果", "香蕉", "梨", "莓", "桃子", "蜜桃", "菠萝", "葡萄", "樱桃"],
+    "柑橘": ["citrus", "orange", "lemon", "lime", "grapefruit", "bergamot", "柑橘", "橙", "柠檬", "西柚", "佛手柑"],
+    "花香": ["floral", "flower", "rose", "rosy", "jasmine", "violet", "lily", "lavender", "orris",
+           "花香", "玫瑰", "茉莉", "紫罗兰", "薰衣草"],
+    "青香": ["green", "grass", "leafy", "leaf", "herbal", "herbaceous", "cucumber", "青香", "青草", "草香", "叶香", "绿叶", "黄瓜"],
+    "木香": ["wood", "cedar", "cedarwood", "sandal", "pine", "resin", "balsam", "木香", "雪松", "檀香", "松香", "树脂", "香脂"],
+    "烟熏": ["smok", "burnt", "phenol", "tarry", "ash", "烟熏", "焦糊", "烧焦", "酚"],
+    "烟草": ["tobacco", "hay", "烟草", "干草"],
+    "甜香": ["sweet", "honey", "vanill", "caramel", "甜", "蜜", "香草", "焦糖"],
+    "坚果烘烤": ["nut", "almond", "roast", "toast", "coffee", "cocoa", "chocolate", "bread", "popcorn",
+             "坚果", "杏仁", "烘烤", "烤", "咖啡", "可可", "巧克力", "面包"],
+    "辛香": ["spic", "clove", "cinnamon", "pepper", "anise", "nutmeg", "辛香", "辛辣", "丁香", "肉桂", "胡椒", "茴香", "肉豆蔻"],
+    "脂肪蜡质": ["fat", "wax", "oily", "tallow", "soap", "脂肪", "油脂", "蜡", "皂"],
+    "土壤霉味": ["earth", "must", "mushroom", "moss", "土壤", "泥土", "土腥", "霉", "蘑菇", "苔"],
+    "硫化物": ["sulfur", "sulfurous", "onion", "garlic", "meat", "cabbage", "硫", "洋葱", "大蒜", "肉香", "卷心菜"],
+    "酸味": ["acid", "sour", "vinegar", "chees", "酸", "醋", "奶酪"],
+}
+
+MAX_SUFFIX = 4
+
+# 以某个关键词开头、但属于其他香气的单词，不按前缀匹配
+PREFIX_EXCLUDED = {"nutmeg", "rosemary", "peppermint", "mustard"}
+
+# 香气描述所在的列，中英文描述一起拆分
+DESCRIPTOR_COLUMNS = ["香气描述 (英文)", "香气描述 (中文)"]
+
+
+def load_categories(path):
+    """
+    读取自定义的香气类别表（CSV 或 Excel，“类别”“关键词”两列，每行一个关键词）。
+    :return: {类别: [关键词, ...]}
+    """
+    if os.path.splitext(path)[1].lower() in (".xlsx", ".xls"):
+        table = pd.read_excel(path, dtype=str)
+    else:
+        try:
+            table = pd.read_csv(path, encoding="utf-8-sig", dtype=str)
+        except UnicodeDecodeError:
+            table = pd.read_csv(path, encoding="gbk", dtype=str)
+    table = table.dropna(subset=["类别", "关键词"])
+    categories = {}
+    for category, keyword in zip(table["类别"].str.strip(), table["关键词"].str.strip().str.casefold()):
+        categories.setdefault(category, []).append(keyword)
+    return categories
+
+
+def keyword_matches(term, keyword):
+    """检索词 term 是否匹配类别关键词 keyword，规则见 DEFAULT_CATEGORIES 的说明"""
+    if keyword.isascii():
+        return any(word == keyword or (word not in PREFIX_EXCLUDED and word.startswith(keyword)
+                                       and len(word) - len(keyword) <= MAX_SUFFIX)
+                   for word in DESCRIPTOR_SPLIT.split(term))
+    return keyword in term
+
+
+def incidence_matrix(descriptions, categories=None):
+    """
+    把每个化合物的香气描述拆成检索词并归入香气类别，得到 化合物×类别 的 0/1 稀疏矩阵。
+    相同的检索词只匹配一次关键词，几千个化合物的描述大多重复，匹配很快。
+    :param descriptions: 每个化合物的香气描述（字符串或字符串元组，例如中英文描述），空值为无描述
+    :return: (CSR 稀疏矩阵, 类别名称列表)
+    """
+    categories = categories or DEFAULT_CATEGORIES
+    names = list(categories)
+    term_categories = {}
+    rows, columns = [], []
+    for i, description in enumerate(descriptions):
+        texts = description if isinstance(description, tuple) else (description,)
+        matched = set()
+        for term in tokenize_descriptors(*texts):
+            if term not in term_categories:
+                term_categories[term] = {j for j, name in enumerate(names)
+                                         if any(keyword_matches(term, keyword) for keyword in categories[name])}
+            matched |= term_categories[term]
+        rows.extend([i] * len(matched))
+        columns.extend(sorted(matched))
+    data = np.ones(len(rows), dtype=np.float64)
+    matrix = sp.csr_matrix((data, (rows, columns)), shape=(len(descriptions), len(names)))
+    return matrix, names
+
+
+def aroma_profile(values, incidence, sample_names, category_names):
+    """
+    样品×类别 香气轮廓 = 样品×化合物 矩阵（浓度或 OAV）× 化合物×类别 关联矩阵，一次稀疏矩阵乘法。
+    :param values: 化合物×样品 的数值矩阵（合并表的方向），未检出为 NaN 或 0
+    """
+    values = np.nan_to_num(np.asarray(values, dtype=np.float64), nan=0.0)
+    profile = (incidence.T @ values).T
+    return pd.DataFrame(profile, index=sample_names, columns=category_names)
+
+
+def compound_descriptions(merged, descriptors=None, cas_column="CAS 编号"):
+    """
+    取每个化合物的中英文香气描述：合并表（例如香气活度值输出）中已有描述列时直接使用，
+    否则按 CAS 编号从 descriptors（以 CAS 编号为索引的 DataFrame，见 香气知识库.descriptor_table）中查找。
+    """
+    cas = merged[cas_column].map(normalize_cas) if cas_column in merged.columns else None
+    columns = []
+    for column in DESCRIPTOR_COLUMNS:
+        if column in merged.columns:
+            values = merged[column]
+        elif descriptors is not None and cas is not None and column in descriptors.columns:
+            values = cas.map(descriptors[column])
+        else:
+            values = pd.Series(None, index=merged.index, dtype=object)
+        columns.append(values.astype(object).where(values.notna(), None).tolist())
+    return list(zip(*columns))
+
+
+def profile_from_merged(merged, value_columns, descriptors=None, categories=None):
+    """
+    从合并表计算整批样品的香气轮廓。
+    :param value_columns: 参与计算的列（各样品的浓度列，或香气活度值输出中的 *_OAV 列）
+    :return: (样品×类别 香气轮廓 DataFrame, 化合物×类别 关联表 DataFrame)
+    """
+    descriptions = compound_descriptions(merged, descriptors)
+    incidence, names = incidence_matrix(descriptions, categories)
+    values = merged[value_columns].apply(pd.to_numeric, errors="coerce").to_numpy(dtype=np.float64)
+    samples = [strip_suffix(c[:-len("_OAV")] if str(c).endswith("_OAV") else c) for c in value_columns]
+    profile = aroma_profile(values, incidence, samples, names)
+
+    info_columns = [c for c in ("CAS 编号", "化合物名称", "用户定义的谱库化合物") if c in merged.columns]
+    assignment = merged[info_columns].copy()
+    assignment["香气描述"] = ["；".join(t for t in texts if t) for texts in descriptions]
+    membership = incidence.toarray().astype(bool)
+    assignment["香气类别"] = ["、".join(n for n, m in zip(names, row) if m) for row in membership]
+    return profile, assignment
+
+
+def render_radar_charts(profile, output_file, per_page=24, columns=6, title="香气轮廓"):
+    """
+    为每个样品画一个雷达图，整批样品排在同一张图中（超过 per_page 个样品时分成多张图，文件名加序号）。
+    所有雷达图使用相同的径向刻度，便于样品间比较。
+    :return: 保存的图片路径列表
+    """
+    # matplotlib 载入较慢，只在作图时载入（只计算香气轮廓时不需要）
+    import matplotlib
+    from matplotlib.figure import Figure
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+
+    # 设置中文字体（解决中文显示问题）
+    matplotlib.rcParams['font.sans-serif'] = ['SimHei']
+    matplotlib.rcParams['axes.unicode_minus'] = False
+
+    categories = profile.columns.tolist()
+    angles = np.linspace(0, 2 * np.pi, len(categories), endpoint=False)
+    closed_angles = np.append(angles, angles[0])
+    top = float(np.nanmax(profile.to_numpy())) if profile.size else 0
+    top = top if top > 0 else 1
+
+    pages = [profile.iloc[i:i + per_page] for i in range(0, len(profile), per_page)]
+    base, extension = os.path.splitext(output_file)
+    saved = []
+    for page_number, page in enumerate(pages, start=1):
+        rows = int(np.ceil(len(page) / columns))
+        n_columns = min(columns, len(page))
+        fig = Figure(figsize=(3.2 * n_columns, 3.4 * rows))
+        FigureCanvasAgg(fig)
+        for k, (sample, values) in enumerate(page.iterrows()):
+            ax = fig.add_subplot(rows, n_columns, k + 1, projection="polar")
+            closed = np.append(values.to_numpy(), values.iloc[0])
+            ax.plot(closed_angles, closed, linewidth=1)
+            ax.fill(closed_angles, closed, alpha=0.25)
+            ax.set_xticks(angles)
+            ax.set_xticklabels(categories, fontsize=6)
+            ax.set_ylim(0, top)
+            ax.tick_params(axis="y", labelsize=5)
+            ax.set_title(str(sample), fontsize=8, pad=12)
+        fig.suptitle(title if len(pages) == 1 else f"{title}（{page_number}/{len(pages)}）")
+        fig.subplots_adjust(left=0.05, right=0.95, bottom=0.05, top=0.9, wspace=0.5, hspace=0.6)
+        path = output_file if len(pages) == 1 else f"{base}_{page_number}{extension}"
+        fig.savefig(path, dpi=150)
+        saved.append(path)
+    print(f"香气轮廓雷达图已保存到: {', '.join(saved)}")
+    return saved
+
+
+def export_profile(profile, assignment, output_file):
+    """把香气轮廓和化合物的类别归属保存为一个工作簿"""
+    with pd.ExcelWriter(output_file) as writer:
+        profile.rename_axis("样品").reset_index().to_excel(writer, sheet_name="香气轮廓", index=False)
+        assignment.to_excel(writer, sheet_name="化合物类别", index=False)
+    print(f"香气轮廓已保存到: {output_file}")
+    return output_file
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="按香气描述类别汇总每个样品的香气轮廓，并绘制雷达图")
+    parser.add_argument("file", help="合并脚本输出的 Excel 文件，或香气活度值脚本输出的 *_OAV.xlsx")
+    parser.add_argument("--oav", action="store_true", help="按 OAV（*_OAV 列）而不是浓度（*_浓度 列）汇总")
+    parser.add_argument("--descriptors", default=None, help="香气描述表（*_香气描述爬虫.xlsx），默认使用本地香气知识库")
+    parser.add_argument("--categories", default=None, help="自定义香气类别表（“类别”“关键词”两列）")
+    args = parser.parse_args()
+
+    merged_table = pd.read_excel(args.file, dtype={"CAS 编号": str})
+    suffix = "_OAV" if args.oav else "_浓度"
+    value_columns = [c for c in merged_table.columns if str(c).endswith(suffix)]
+    if args.descriptors:
+        descriptor_table = load_descriptors(args.descriptors)
+    elif os.path.exists(DEFAULT_DB_PATH):
+        kb = AromaKnowledgeBase(DEFAULT_DB_PATH)
+        descriptor_table = kb.descriptor_table(merged_table["CAS 编号"])
+        kb.close()
+    else:
+        descriptor_table = None
+
+    result, compounds = profile_from_merged(merged_table, value_columns, descriptor_table,
+                                            load_categories(args.categories) if args.categories else None)
+    base_name = os.path.splitext(args.file)[0]
+    export_profile(result, compounds, base_name + "_香气轮廓.xlsx")
+    render_radar_charts(result, base_name + "_香气轮廓雷达图.png",
+                        title="香气轮廓（OAV）" if args.oav else "香气轮廓（浓度）")